@@ -0,0 +1,64 @@
+"""benchmarks/bench_plaintext.py - Compare parsa's plain-text fast path with textract
+
+For each plain-text format and file size, time:
+    fast path - txt.get_text, which reads plain-text formats directly
+    textract  - textract.process followed by txt._process_text (parsa's previous path)
+
+Usage:
+    python benchmarks/bench_plaintext.py [--repeat N]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import textract
+from parsa.utils import text as txt
+
+# File sizes to benchmark, in bytes
+SIZES = [1024, 1024 ** 2, 16 * 1024 ** 2]
+
+def generate_content(extension, size):
+    """Return about size bytes of UTF-8 content in the given plain-text format."""
+    if extension == '.csv':
+        row = u'résumé,42,"quoted, field",lorem ipsum dolor sit amet\n'
+    elif extension == '.json':
+        row = u'{"name": "résumé", "count": 42, "tags": ["lorem", "ipsum"]},\n'
+    else:
+        row = u'2019-01-01 00:00:00 INFO résumé lorem ipsum dolor sit amet\n'
+    content = row * (size // len(row.encode('utf-8')) + 1)
+    if extension == '.json':
+        content = u'[' + content.rstrip(u',\n') + u']'
+    return content.encode('utf-8')
+
+def textract_path(infile):
+    extension = os.path.splitext(infile)[1]
+    return txt._process_text(textract.process(infile), extension)
+
+def main():
+    argparser = argparse.ArgumentParser(description='Compare the plain-text fast path with textract.')
+    argparser.add_argument('--repeat', type=int, default=5, help='timed runs per measurement (best is reported)')
+    args = argparser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print('{:<6} {:>10} {:>14} {:>14} {:>9}'.format('format', 'size', 'fast path (s)', 'textract (s)', 'speedup'))
+        for extension in ['.txt', '.csv', '.json']:
+            for size in SIZES:
+                infile = os.path.join(tmpdir, 'bench' + extension)
+                with open(infile, 'wb') as fout:
+                    fout.write(generate_content(extension, size))
+                # Both paths must produce the same text
+                assert txt.get_text(infile) == textract_path(infile)
+                fast = min(timeit.repeat(lambda: txt.get_text(infile), number=1, repeat=args.repeat))
+                slow = min(timeit.repeat(lambda: textract_path(infile), number=1, repeat=args.repeat))
+                print('{:<6} {:>10} {:>14.5f} {:>14.5f} {:>8.1f}x'.format(extension, size, fast, slow, slow / fast))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""benchmarks/bench_startup.py - Measure parsa's startup time
+
+Time, in fresh interpreters:
+    python     - an empty Python process (the baseline)
+    --help     - python -m parsa.parsa --help
+    bad input  - python -m parsa.parsa with an input path that doesn't exist
+    3 txt -j 4 - python -m parsa.parsa on a folder of three small .txt files, extracted by 4 worker processes
+    3 txt -j 1 - the same, extracting the files in-line
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat N]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def commands(folder, outdir):
+    """Return the (name, command) pairs to time, extracting folder to outdir."""
+    parsa = [sys.executable, '-m', 'parsa.parsa', '--noprompt']
+    return [
+        ('python', [sys.executable, '-c', 'pass']),
+        ('--help', parsa + ['--help']),
+        ('bad input', parsa + [os.path.join(REPO_ROOT, 'does-not-exist')]),
+        ('3 txt -j 4', parsa + ['-j', '4', '--output', outdir, folder]),
+        ('3 txt -j 1', parsa + ['-j', '1', '--output', outdir, folder]),
+    ]
+
+def make_folder():
+    """Return a temporary folder holding three small .txt files."""
+    folder = tempfile.mkdtemp()
+    for i in range(3):
+        with open(os.path.join(folder, 'foo{}.txt'.format(i)), 'w') as fout:
+            fout.write('foo {}\n'.format(i))
+    return folder
+
+def run(command):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.call(command, cwd=REPO_ROOT, stdout=devnull, stderr=devnull)
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure parsa's startup time.")
+    argparser.add_argument('--repeat', type=int, default=20, help='timed runs per measurement (best is reported)')
+    args = argparser.parse_args()
+
+    folder = make_folder()
+    outdir = tempfile.mkdtemp()
+    try:
+        print('{:<10} {:>10} {:>16}'.format('command', 'time (s)', 'over python (s)'))
+        baseline = None
+        for name, command in commands(folder, outdir):
+            best = min(timeit.repeat(lambda: run(command), number=1, repeat=args.repeat))
+            if baseline is None:
+                baseline = best
+            print('{:<10} {:>10.4f} {:>16.4f}'.format(name, best, best - baseline))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+        shutil.rmtree(outdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""benchmarks/bench_suite.py - Benchmark suite for parsa, with regression detection
+
+Benchmarks (each run on corpora generated by benchmarks/corpus.py, so results are reproducible):
+    get_filelist/<layout>            - listing every file of a flat, deep, wide and colliding tree
+    compose_unique_filepath/<layout> - composing (and creating) an output name for every file of a tree,
+                                       with compose_unique_filepath and with OutputNameIndex
+    get_text/<format>                - extracting text from a single file of each format
+                                       (formats whose extraction tools are missing are skipped)
+    main/<layout>                    - running parsa end to end on a tree of mixed formats
+
+Results are saved as JSON; comparing two results files flags every benchmark that got slower
+by more than the threshold, and exits with status 1 if there is any.
+
+Usage:
+    python benchmarks/bench_suite.py run [--output FILE] [--baseline FILE] [--threshold T] [--repeat N] [--quick]
+    python benchmarks/bench_suite.py compare BASELINE CURRENT [--threshold T]
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import parsa
+from parsa import parsa as parsa_main
+from parsa.utils import filesystem as fs
+from parsa.utils import text as txt
+
+import corpus
+
+# Bumped whenever the layout of the results file changes
+RESULTS_VERSION = 1
+# Default relative slowdown above which a benchmark is flagged as a regression
+DEFAULT_THRESHOLD = 0.2
+
+# Files per corpus, in full and quick mode
+_CORPUS_FILES = 5000
+_QUICK_CORPUS_FILES = 500
+# Files in the corpus run end to end, in full and quick mode
+_MAIN_FILES = 200
+_QUICK_MAIN_FILES = 40
+# Size of the text of each file, in bytes
+_FILE_SIZE = 4096
+
+def best_of(repeat, func, setup=None):
+    """Run setup (untimed) then func repeat times, returning the best time of func in seconds."""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def run_benchmarks(workdir, repeat, quick=False):
+    """Run every benchmark inside workdir, returning a dict mapping each benchmark's name to its result."""
+    results = {}
+    files = _QUICK_CORPUS_FILES if quick else _CORPUS_FILES
+    main_files = _QUICK_MAIN_FILES if quick else _MAIN_FILES
+
+    for layout in corpus.LAYOUTS:
+        indir = os.path.join(workdir, layout)
+        infiles = corpus.generate_corpus(indir, layout, files, seed=0, size=16)
+        outdir = os.path.join(workdir, layout + '-out')
+
+        seconds = best_of(repeat, lambda: fs.get_filelist(indir))
+        _record(results, 'get_filelist/' + layout, seconds, files)
+
+        def reset_outdir():
+            shutil.rmtree(outdir, ignore_errors=True)
+            os.makedirs(outdir)
+
+        def compose_all():
+            for infile in infiles:
+                # compose_unique_filepath probes outdir, so the names it returns have to be taken
+                open(fs.compose_unique_filepath(infile, outdir), 'w').close()
+
+        def allocate_all():
+            outnames = fs.OutputNameIndex(outdir)
+            for infile in infiles:
+                outnames.allocate(infile)
+
+        seconds = best_of(repeat, compose_all, reset_outdir)
+        _record(results, 'compose_unique_filepath/' + layout, seconds, files)
+        seconds = best_of(repeat, allocate_all, reset_outdir)
+        _record(results, 'OutputNameIndex/' + layout, seconds, files)
+
+    available_formats = []
+    for extension in corpus.FORMATS:
+        infile = os.path.join(workdir, 'single' + extension)
+        corpus.generate_file(infile, extension, size=_FILE_SIZE)
+        # parsa reports extraction failures (e.g. a missing pdftotext or tesseract) and returns no text
+        with _quiet():
+            text = txt.get_text(infile, disable_no_ext_prompt=True)
+        if not text.strip():
+            results['get_text/' + extension] = {'skipped': 'no text extracted (is its extraction tool installed?)'}
+            print('{:<36} {:>12}'.format('get_text/' + extension, 'skipped'))
+            continue
+        available_formats.append(extension)
+        with _quiet():
+            seconds = best_of(repeat, lambda: txt.get_text(infile, disable_no_ext_prompt=True))
+        _record(results, 'get_text/' + extension, seconds, 1)
+
+    for layout in corpus.LAYOUTS:
+        indir = os.path.join(workdir, 'main-' + layout)
+        corpus.generate_corpus(indir, layout, main_files, formats=available_formats, seed=0, size=_FILE_SIZE)
+        outdir = os.path.join(workdir, 'main-' + layout + '-out')
+        argv = ['parsa', '--noprompt', '-o', outdir, indir]
+
+        def run_main():
+            with _quiet(), _patched_argv(argv):
+                parsa_main.main()
+
+        seconds = best_of(repeat, run_main, lambda: shutil.rmtree(outdir, ignore_errors=True))
+        _record(results, 'main/' + layout, seconds, main_files)
+
+    return results
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Compare two results dicts, printing a table of every benchmark present in both.
+    Return the names of the benchmarks that are more than threshold (relative) slower in current.
+    """
+    regressions = []
+    print('{:<36} {:>12} {:>12} {:>9}'.format('benchmark', 'baseline (s)', 'current (s)', 'change'))
+    for name in sorted(set(baseline) & set(current)):
+        old = baseline[name].get('seconds')
+        new = current[name].get('seconds')
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('{:<36} {:>12.5f} {:>12.5f} {:>+8.1%}{}'.format(name, old, new, change, flag))
+    return regressions
+
+def save_results(path, results):
+    """Save results to path as JSON, along with a description of the environment they were measured in."""
+    with open(path, 'w') as fout:
+        json.dump({
+            'version': RESULTS_VERSION,
+            'date': datetime.datetime.now().isoformat(),
+            'parsa': parsa.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, fout, indent=2, sort_keys=True)
+
+def load_results(path):
+    """Load the results saved in path by save_results."""
+    with open(path, 'r') as fin:
+        data = json.load(fin)
+    if data.get('version') != RESULTS_VERSION:
+        sys.exit('Error: {} was written by an incompatible version of the benchmark suite'.format(path))
+    return data['results']
+
+def _record(results, name, seconds, files):
+    results[name] = {'seconds': seconds, 'files': files}
+    print('{:<36} {:>10.5f} s'.format(name, seconds))
+
+@contextlib.contextmanager
+def _quiet():
+    """Silence parsa's and textract's output on stdout."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+@contextlib.contextmanager
+def _patched_argv(argv):
+    saved = sys.argv
+    sys.argv = argv
+    try:
+        yield
+    finally:
+        sys.argv = saved
+
+def main():
+    argparser = argparse.ArgumentParser(description="Run parsa's benchmark suite, or compare two of its runs.")
+    subparsers = argparser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='run the benchmarks and save their results')
+    run_parser.add_argument('--output', default='bench_results.json', help='file the results are saved to')
+    run_parser.add_argument('--baseline', help='results file to compare the new results with')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='relative slowdown flagged as a regression (default: %(default)s)')
+    run_parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark (best is reported)')
+    run_parser.add_argument('--quick', action='store_true', help='use smaller corpora')
+    compare_parser = subparsers.add_parser('compare', help='compare two results files')
+    compare_parser.add_argument('baseline', help='results file of the reference run')
+    compare_parser.add_argument('current', help='results file of the run being checked')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help='relative slowdown flagged as a regression (default: %(default)s)')
+    args = argparser.parse_args()
+
+    if args.command == 'compare':
+        baseline = load_results(args.baseline)
+        current = load_results(args.current)
+    elif args.command == 'run':
+        baseline = load_results(args.baseline) if args.baseline else None
+        workdir = tempfile.mkdtemp()
+        try:
+            current = run_benchmarks(workdir, args.repeat, args.quick)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        save_results(args.output, current)
+        print('Results saved to ' + args.output)
+        if baseline is None:
+            return
+    else:
+        argparser.print_help()
+        sys.exit(2)
+
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print('{} benchmark(s) regressed by more than {:.0%}'.format(len(regressions), args.threshold))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""benchmarks/corpus.py - Reproducible synthetic corpora for parsa's benchmarks
+
+Every corpus is generated from a seed, so the same arguments always produce the same tree.
+
+Layouts:
+    flat      - every file in the root folder
+    deep      - a single chain of nested folders, a few files per level
+    wide      - many sibling folders, a few files each
+    colliding - files spread across folders, sharing a handful of names (so output names collide)
+
+Functions:
+    generate_corpus - generate a corpus of a given layout, size and file type mix
+    generate_file - write a single file of a given format
+    make_txt, make_pdf, make_docx, make_png - return the content of a file of each format
+"""
+
+import io
+import os
+import random
+import struct
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+LAYOUTS = ['flat', 'deep', 'wide', 'colliding']
+FORMATS = ['.txt', '.pdf', '.docx', '.png']
+
+# Files per folder in the deep and wide layouts
+_FILES_PER_FOLDER = 10
+# Number of distinct names used by the colliding layout
+_COLLIDING_NAMES = 5
+
+_WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do',
+          'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua', 'résumé']
+
+def generate_corpus(root, layout='flat', files=1000, formats=('.txt',), seed=0, size=1024):
+    """Generate files (each about size bytes of text) under root, laid out as layout,
+    cycling through formats. Return the list of generated filepaths.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError('unknown layout: ' + layout)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(files):
+        if layout == 'flat':
+            folder = root
+            name = 'file{}'.format(i)
+        elif layout == 'deep':
+            folder = os.path.join(root, *['level{}'.format(level) for level in range(i // _FILES_PER_FOLDER)])
+            name = 'file{}'.format(i)
+        elif layout == 'wide':
+            folder = os.path.join(root, 'folder{}'.format(i // _FILES_PER_FOLDER))
+            name = 'file{}'.format(i)
+        else:
+            folder = os.path.join(root, 'folder{}'.format(i // _COLLIDING_NAMES))
+            name = 'file{}'.format(i % _COLLIDING_NAMES)
+        extension = formats[i % len(formats)]
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        path = os.path.join(folder, name + extension)
+        generate_file(path, extension, rng, size)
+        paths.append(path)
+    return paths
+
+def generate_file(path, extension, rng=None, size=1024):
+    """Write about size bytes of pseudo-random text to path, in the format given by extension."""
+    if rng is None:
+        rng = random.Random(0)
+    makers = {'.txt': make_txt, '.pdf': make_pdf, '.docx': make_docx, '.png': make_png}
+    if extension not in makers:
+        raise ValueError('unsupported format: ' + extension)
+    with open(path, 'wb') as fout:
+        fout.write(makers[extension](_random_text(rng, size)))
+
+def make_txt(text):
+    """Return text as the content of a UTF-8 text file."""
+    return text.encode('utf-8')
+
+def make_pdf(text):
+    """Return the content of a single-page PDF showing text (ASCII only, one line per 80 characters)."""
+    lines = [text[i:i + 80] for i in range(0, len(text), 80)]
+    stream = b'BT /F1 10 Tf 12 TL 36 806 Td\n'
+    for line in lines:
+        escaped = line.encode('ascii', 'replace').replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+        stream += b'(' + escaped + b') Tj T*\n'
+    stream += b'ET'
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length ' + str(len(stream)).encode('ascii') + b' >>\nstream\n' + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    content = b'%PDF-1.4\n'
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(content))
+        content += str(number).encode('ascii') + b' 0 obj\n' + obj + b'\nendobj\n'
+    xref = len(content)
+    content += b'xref\n0 ' + str(len(objects) + 1).encode('ascii') + b'\n0000000000 65535 f \n'
+    for offset in offsets:
+        content += '{:010d} 00000 n \n'.format(offset).encode('ascii')
+    content += b'trailer\n<< /Size ' + str(len(objects) + 1).encode('ascii') + b' /Root 1 0 R >>\n'
+    content += b'startxref\n' + str(xref).encode('ascii') + b'\n%%EOF\n'
+    return content
+
+def make_docx(text):
+    """Return the content of a minimal DOCX document holding text, one paragraph per 80 characters."""
+    paragraphs = ''.join('<w:p><w:r><w:t>{}</w:t></w:r></w:p>'.format(escape(text[i:i + 80]))
+                         for i in range(0, len(text), 80))
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                '<w:body>' + paragraphs + '</w:body></w:document>')
+    content_types = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                     '<Default Extension="xml" ContentType="application/xml"/>'
+                     '<Override PartName="/word/document.xml" ContentType="application/'
+                     'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>')
+    rels = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+            'relationships/officeDocument" Target="word/document.xml"/></Relationships>')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as docx:
+        # Fixed timestamps, so that the same text always produces the same bytes
+        for name, data in [('[Content_Types].xml', content_types), ('_rels/.rels', rels),
+                           ('word/document.xml', document)]:
+            docx.writestr(zipfile.ZipInfo(name, date_time=(2019, 1, 1, 0, 0, 0)), data.encode('utf-8'))
+    return buffer.getvalue()
+
+def make_png(text):
+    """Return the content of a greyscale PNG image whose size grows with text (its pixels are noise, not glyphs),
+    so that OCR has work to do without depending on any font being installed.
+    """
+    width = 256
+    height = max(1, len(text) // 16)
+    rng = random.Random(text)
+    rows = b''.join(b'\x00' + bytes(bytearray(rng.randint(200, 255) for _ in range(width)))
+                    for _ in range(height))
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows))
+            + chunk(b'IEND', b''))
+
+def _random_text(rng, size):
+    """Return about size characters of pseudo-random words, drawn from rng."""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
@@ -1 +1,3 @@
-__version__ = '1.1.5'
\ No newline at end of file
+__version__ = '1.1.5'
+
+from parsa.api import ExtractedFile, extract_many
@@ -0,0 +1,117 @@
+"""api.py - Importable batch extraction API for parsa
+
+Classes:
+    ExtractedFile - result of the extraction of a single file, as yielded by extract_many
+
+Functions:
+    extract_many - extract text from many files, yielding their results lazily as they finish
+    _iter_inputs - yield the files to extract from the inputs given to extract_many
+    _iter_extracted_files - yield the ExtractedFiles of extraction results
+    _to_extracted_file - turn an ExtractionResult into an ExtractedFile, writing its text to an output folder
+"""
+
+import collections
+import os
+
+from parsa.utils import filesystem as fs
+from parsa.utils import trace as tr
+from parsa.utils import workers
+from parsa.utils.cache import ExtractionCache
+from parsa.utils.filters import FileFilter
+
+ExtractedFile = collections.namedtuple('ExtractedFile', ['input', 'text', 'output', 'error', 'timings'])
+ExtractedFile.__doc__ = """Result of the extraction of a single file, as yielded by extract_many.
+text is the extracted text (an empty string if there was none), or None if an output folder was given,
+output is the file the text was written to (None if there was no text, or if no output folder was given),
+error describes why the extraction (or writing the output) failed (None if it didn't),
+and timings is a dict of the wall time spent in each phase of the extraction, in seconds (see trace.new_record).
+"""
+
+def extract_many(inputs, jobs=None, ordered=True, outdir=None, cache=None, cache_size=None, timeout=None,
+                 memory_limit=None, max_tasks_per_worker=None, include=None, exclude=None, min_size=None,
+                 max_size=None, extensions=None, exclude_extensions=None, pdf_pages_per_job=None,
+                 audio_seconds_per_job=None, ocr_batch_size=None):
+    """Extract text from inputs (the path of a file or folder, or an iterable of file paths), and return
+    an iterator yielding an ExtractedFile for each file, lazily: files are only discovered and extracted
+    as results are consumed, and the worker processes are stopped once the iterator is exhausted or closed.
+
+    Files are extracted the same way as by the parsa command (see workers.extract_files for jobs, timeout,
+    memory_limit, max_tasks_per_worker, pdf_pages_per_job, audio_seconds_per_job and ocr_batch_size): results
+    are yielded in input order, or as soon as they're finished if ordered is False. Failures never raise:
+    they're reported in the results' error, including missing files and unsupported extensions.
+    Files without an extension whose type can't be detected from their content are handed to textract as they are,
+    as there's no one to prompt for their extension, and are reported as failures if it can't extract them.
+
+    If outdir is given, text is streamed to files inside it (named as the parsa command names them)
+    instead of being held in memory; otherwise, each result holds its text.
+    If cache (the folder of an ExtractionCache, with a maximum size of cache_size bytes) is given,
+    text is looked up in it before being extracted.
+
+    When inputs is a folder, it's walked with the same filters as the parsa command's (see filters.FileFilter
+    for include, exclude, min_size, max_size, extensions and exclude_extensions), and outdir and cache
+    are never walked.
+    """
+    cache_dir = cache
+    cache = ExtractionCache(cache_dir, max_size=cache_size) if cache_dir is not None else None
+    outnames = fs.OutputNameIndex(fs.set_outdir(outdir, None)) if outdir is not None else None
+    file_filter = None
+    if isinstance(inputs, str) and os.path.isdir(inputs):
+        file_filter = FileFilter(inputs, include=include, exclude=exclude, min_size=min_size, max_size=max_size,
+                                 extensions=extensions, exclude_extensions=exclude_extensions,
+                                 exclude_dirs=[path for path in [outdir, cache_dir] if path is not None])
+    elif isinstance(inputs, str) and not os.path.isfile(inputs):
+        raise ValueError('input must be an existing file or directory: ' + inputs)
+
+    results = workers.extract_files(_iter_inputs(inputs, file_filter), jobs, disable_no_ext_prompt=True,
+                                    cache=cache, timeout=timeout, memory_limit=memory_limit,
+                                    max_tasks_per_worker=max_tasks_per_worker, trace=True, stream_dir=outdir,
+                                    ordered=ordered, pdf_pages_per_job=pdf_pages_per_job,
+                                    audio_seconds_per_job=audio_seconds_per_job, ocr_batch_size=ocr_batch_size)
+    return _iter_extracted_files(results, outnames)
+
+def _iter_inputs(inputs, file_filter=None):
+    """Yield the files to extract from inputs (see extract_many), walking it with file_filter if it's a folder."""
+    if file_filter is not None:
+        for entry in fs.iter_files(inputs, file_filter.prune):
+            if file_filter.accept(entry):
+                yield entry.path
+    elif isinstance(inputs, str):
+        yield inputs
+    else:
+        for infile in inputs:
+            yield infile
+
+def _iter_extracted_files(results, outnames=None):
+    """Yield the ExtractedFile of each of results (ExtractionResults, see _to_extracted_file),
+    stopping the worker processes as soon as this generator is closed, rather than when it's garbage-collected.
+    """
+    try:
+        for result in results:
+            yield _to_extracted_file(result, outnames)
+    finally:
+        results.close()
+
+def _to_extracted_file(result, outnames=None):
+    """Return the ExtractedFile of result (an ExtractionResult). If outnames (an OutputNameIndex) is given,
+    the text streamed to result.textfile is moved to an output file allocated by it.
+    """
+    record = result.trace if result.trace is not None else tr.new_record(result.infile)
+    if outnames is None:
+        return ExtractedFile(result.infile, result.text, None, result.error, record['timings'])
+
+    outfile = None
+    error = result.error
+    if result.textfile is not None:
+        try:
+            with tr.timed(record, 'name'):
+                outfile = outnames.allocate(result.infile)
+            with tr.timed(record, 'write'):
+                fs.replace_file(result.textfile, outfile)
+        except OSError as e:
+            if os.path.exists(result.textfile):
+                os.remove(result.textfile)
+            if outfile is not None and os.path.exists(outfile):
+                os.remove(outfile)
+            outfile = None
+            error = str(e)
+    return ExtractedFile(result.infile, None, outfile, error, record['timings'])
@@ -1,52 +1,532 @@
+import json
 import os
+import sys
+import threading
+import time
 
+from parsa.utils import audio
 from parsa.utils import cli
 from parsa.utils import filesystem as fs
-from parsa.utils import text as txt
+from parsa.utils import jobqueue as jq
+from parsa.utils import pdf
+from parsa.utils.dedup import DuplicateFinder
+from parsa.utils.filters import FileFilter
+from parsa.utils import profiling
+from parsa.utils import progress as prog
+from parsa.utils import trace as tr
+from parsa.utils import workers
+from parsa.utils.cache import ExtractionCache
+from parsa.utils.manifest import Manifest
+from parsa.utils.sharding import Shard, balanced_assignment
+from parsa.utils.watch import Watcher
+
+# Name of the file, inside the output directory, where failed extractions are recorded
+FAILURES_FILENAME = 'parsafailures.jsonl'
+# Name of the file, inside the output directory, mapping duplicate inputs to the input they duplicate
+DUPLICATES_FILENAME = 'parsaduplicates.jsonl'
+# Number of inputs added to a job queue per transaction, so that workers can start before the walk is over
+_QUEUE_BATCH_SIZE = 1000
+# Maximum number of seconds a queue worker waits before checking the queue again when it has nothing to claim
+_QUEUE_POLL_INTERVAL = 5.0
 
 def main():
+    # parsa worker JOBDB extracts the jobs of a queue filled by parsa --queue JOBDB
+    if len(sys.argv) > 1 and sys.argv[1] == 'worker':
+        _run_worker(cli.parse_worker_arguments(sys.argv[2:]))
+        return
+
     # Get CLI arguments
     args = cli.parse_arguments()
 
-    # If input is a file
-    if os.path.isfile(args.input):
+    if args.profile is None:
+        _run(args)
+        return
 
-        # Set IO variables
-        infile = args.input
-        indir = os.path.dirname(infile)
-        outdir = fs.set_outdir(args.output, indir)
+    profiling.start(args.profile)
+    try:
+        _run(args)
+    finally:
+        # Profiles are written (and merged with the workers' ones) even if the run was interrupted
+        profiledir = profiling.stop()
+        print(profiling.summarize(profiledir))
 
-        # Extract text
-        text = txt.get_text(infile, disable_no_ext_prompt=args.noprompt)
+def _run(args):
+    """Extract text from the input given by the parsed command-line arguments args."""
+    cache = ExtractionCache(args.cache, max_size=args.cache_size) if args.cache else None
+    # Per-file trace log (None if tracing is disabled)
+    tracelog = tr.TraceLog(args.trace) if args.trace else None
 
-        # If text has been extracted successfully (and infile was not empty)
-        if text:
-            outfile = fs.compose_unique_filepath(infile, outdir)
-            try:
-                fs.write_str_to_file(text, outfile) 
-            except OSError as e:
-                print(e)
+    try:
+        # If input is a file
+        if os.path.isfile(args.input):
+
+            # Set IO variables
+            infile = args.input
+            indir = os.path.dirname(infile)
+            outdir = fs.set_outdir(args.output, indir)
+            manifest = Manifest(outdir, use_hash=args.hash) if args.incremental else None
+            outnames = fs.OutputNameIndex(outdir)
+
+            # In incremental mode, skip the file if it hasn't changed since the last run
+            if manifest is None or not manifest.is_unchanged(infile):
+                stat = os.stat(infile)
+
+                # Extract text (in an isolated worker if there are limits to enforce, or in several workers
+                # if it's a PDF that may be split into page ranges, or an audio file that may be split into segments).
+                # Whether it may be split is judged by its name and size alone: its pages (or duration) are read
+                # once, by extract_files
+                split = ((args.pdf_pages_per_job is not None and pdf.splittable(infile)) or
+                         (args.audio_seconds_per_job is not None and audio.splittable(infile)))
+                jobs = args.jobs if split else 1
+                with profiling.phase('extraction'):
+                    result = next(workers.extract_files([infile], jobs, disable_no_ext_prompt=args.noprompt,
+                                                        cache=cache, timeout=args.timeout,
+                                                        memory_limit=args.memory_limit,
+                                                        trace=tracelog is not None,
+                                                        stream_dir=outdir if args.stream else None,
+                                                        encoded=True, pdf_pages_per_job=args.pdf_pages_per_job,
+                                                        audio_seconds_per_job=args.audio_seconds_per_job))
+
+                with profiling.phase('output'):
+                    _save_result(result, outdir, outnames, manifest, stat, tracelog)
+
+                if manifest is not None:
+                    manifest.save()
+            elif tracelog is not None:
+                tracelog.write(dict(tr.new_record(infile, os.path.getsize(infile)), outcome='unchanged'))
 
-    # If input is a folder            
-    elif os.path.isdir(args.input):
+        # If input is a folder
+        elif os.path.isdir(args.input):
 
-        # Set IO variables
-        indir = args.input
-        outdir = fs.set_outdir(args.output, indir, input_isdir=True)
+            # Set IO variables
+            indir = args.input
+            outdir = fs.set_outdir(args.output, indir, input_isdir=True)
+            # parsa's own folders are never walked, so that a run doesn't extract the outputs of previous runs
+            # (or of the other shards)
+            file_filter = FileFilter(indir, include=args.include, exclude=args.exclude, min_size=args.min_size,
+                                     max_size=args.max_size, extensions=args.extensions,
+                                     exclude_extensions=args.exclude_extensions,
+                                     exclude_dirs=[outdir] + ([args.cache] if args.cache else []))
+            if args.shard is not None:
+                file_filter.shard = _make_shard(indir, file_filter, args.shard, args.shard_by)
+                # Each shard has an output folder (and manifest) of its own, so that shards never conflict
+                outdir = fs.set_outdir(os.path.join(outdir, 'shard-{}-of-{}'.format(*args.shard)), indir)
+            # Files are only added to the job queue, to be extracted by parsa worker processes
+            if args.queue is not None:
+                _fill_queue(args.queue, indir, outdir, file_filter)
+                return
+            # In watch mode, the manifest is what lets a restarted watch skip the files it has already extracted
+            manifest = Manifest(outdir, use_hash=args.hash) if args.incremental or args.watch else None
+            # Output names are allocated from an index built with a single listing of outdir
+            outnames = fs.OutputNameIndex(outdir)
 
-        filelist = fs.get_filelist(indir)
+            # Stat results of the files being extracted, recorded in the manifest once they're done
+            stats = {}
+            # Time spent discovering each file being extracted, only recorded if tracing is enabled
+            walk_times = {} if tracelog is not None else None
+            # Progress display, fed with the time each file took to extract (taken from its trace record)
+            progress = prog.Progress(interval=args.progress_interval) if args.progress else None
+            # In dedup mode, duplicates found by the walk wait for the result of the input they duplicate
+            # ((input, stat) pairs by original input), and the outputs of saved inputs are kept to link them
+            dedup = DuplicateFinder() if args.dedup else None
+            duplicates = {}
+            outcomes = {}
+            # Files are discovered lazily, so that extraction starts while the tree is still being walked
+            filelist = profiling.iterate(_discover_files(indir, manifest, stats, walk_times, tracelog, progress,
+                                                         dedup, duplicates, file_filter),
+                                         'discovery')
 
-        for infile in filelist:
-            text = txt.get_text(infile, disable_no_ext_prompt=args.noprompt)
-            if text:
-                outfile = fs.compose_unique_filepath(infile, outdir)
+            if progress is not None:
+                progress.start()
+            # The folder is watched before it's walked, so that files dropped during the walk aren't missed
+            watcher = Watcher(indir, file_filter, settle_time=args.watch_settle) if args.watch else None
+            try:
+                # Extract text in parallel; results come back in the same order as filelist
+                results = workers.extract_files(filelist, args.jobs, disable_no_ext_prompt=args.noprompt, cache=cache,
+                                                timeout=args.timeout, memory_limit=args.memory_limit,
+                                                max_tasks_per_worker=args.max_tasks_per_worker,
+                                                pdf_pages_per_job=args.pdf_pages_per_job,
+                                                audio_seconds_per_job=args.audio_seconds_per_job,
+                                                ocr_batch_size=args.ocr_batch_size,
+                                                trace=tracelog is not None or progress is not None,
+                                                stream_dir=outdir if args.stream else None, encoded=True)
+                for result in profiling.iterate(results, 'extraction'):
+                    stat = stats.pop(result.infile, None)
+                    if progress is not None:
+                        progress.finished(result.infile, stat.st_size, _extraction_time(result.trace),
+                                          failed=result.error is not None)
+                    if result.trace is not None and walk_times is not None:
+                        result.trace['timings']['walk'] = walk_times.pop(result.infile, 0)
+                    with profiling.phase('output'):
+                        outcome = _save_result(result, outdir, outnames, manifest, stat, tracelog)
+                        if dedup is not None:
+                            outcomes[result.infile] = outcome
+                            _save_duplicates(duplicates, outcomes, outdir, outnames, manifest, tracelog, progress)
+                # Duplicates found at the end of the walk
+                with profiling.phase('output'):
+                    _save_duplicates(duplicates, outcomes, outdir, outnames, manifest, tracelog, progress)
+                if watcher is not None:
+                    manifest.save()
+                    if progress is not None:
+                        progress.stop()
+                        progress = None
+                    _watch(watcher, args, outdir, outnames, manifest, cache, tracelog)
+            finally:
+                # Save the progress made so far, even if the run was interrupted
+                if manifest is not None:
+                    manifest.save()
+                if progress is not None:
+                    progress.stop()
+                if watcher is not None:
+                    watcher.close()
+
+        else:
+            exit("Error: input must be an existing file or directory")
+    finally:
+        if tracelog is not None:
+            tracelog.close()
+
+def _discover_files(indir, manifest, stats, walk_times=None, tracelog=None, progress=None, dedup=None,
+                    duplicates=None, file_filter=None):
+    """Yield the path of every file in indir that has to be extracted, storing its stat result in stats.
+    If manifest is not None, files that haven't changed since the last run are skipped
+    (and recorded as such in tracelog and progress, if they're not None).
+    If progress is not None, every file found is counted in its totals as well.
+    If walk_times is not None, the time spent discovering each file is stored in it.
+    If dedup (a DuplicateFinder) is not None, files with the same content as a file found before are not yielded,
+    but stored (as (path, stat result) pairs) in duplicates, under the path of the file they duplicate.
+    If file_filter (a FileFilter) is not None, only the files it accepts are yielded,
+    and the folders it prunes are not walked.
+    """
+    walk_started = tr.clock()
+    for entry in fs.iter_files(indir, file_filter.prune if file_filter is not None else None):
+        if file_filter is not None and not file_filter.accept(entry):
+            continue
+        if manifest is not None or walk_times is not None or progress is not None or dedup is not None:
+            # DirEntry caches the stat result, so the manifest check doesn't stat the file again
+            stat = entry.stat()
+            if progress is not None:
+                progress.discovered(entry.path, stat.st_size)
+            if manifest is not None and manifest.is_unchanged(entry.path, stat):
+                if tracelog is not None:
+                    tracelog.write(dict(tr.new_record(entry.path, stat.st_size), outcome='unchanged'))
+                if progress is not None:
+                    progress.skipped(entry.path, stat.st_size)
+                continue
+            original = dedup.find(entry.path, stat.st_size) if dedup is not None else None
+            if original is not None:
+                duplicates.setdefault(original, []).append((entry.path, stat))
+                continue
+            stats[entry.path] = stat
+        if walk_times is not None:
+            walk_times[entry.path] = tr.clock() - walk_started
+        if progress is not None:
+            progress.started(entry.path)
+        yield entry.path
+        walk_started = tr.clock()
+    if progress is not None:
+        progress.discovery_finished()
+
+def _watch(watcher, args, outdir, outnames, manifest, cache=None, tracelog=None):
+    """Extract the files watcher (a Watcher) reports as new or modified, in batches, as soon as they've settled,
+    until interrupted. Files whose content hasn't changed since they were extracted (according to manifest)
+    are skipped, and manifest is saved after every batch.
+    """
+    print('Watching ' + watcher.indir + ' for new and modified files (press Ctrl-C to stop)')
+    try:
+        while True:
+            stats = {}
+            for infile in watcher.wait():
                 try:
-                    fs.write_str_to_file(text, outfile) 
-                except OSError as e:
-                    print(e)
+                    stat = os.stat(infile)
+                except OSError:
+                    continue
+                if not manifest.is_unchanged(infile, stat):
+                    stats[infile] = stat
+            if not stats:
+                continue
+            # Batches are usually a few files: no more workers are started than there are files
+            # (unless large PDFs or long audio files may be split across them)
+            jobs = args.jobs or workers.default_jobs()
+            if args.pdf_pages_per_job is None and args.audio_seconds_per_job is None:
+                jobs = min(jobs, len(stats))
+            results = workers.extract_files(list(stats), jobs, disable_no_ext_prompt=True, cache=cache,
+                                            timeout=args.timeout, memory_limit=args.memory_limit,
+                                            max_tasks_per_worker=args.max_tasks_per_worker,
+                                            pdf_pages_per_job=args.pdf_pages_per_job,
+                                            audio_seconds_per_job=args.audio_seconds_per_job,
+                                            ocr_batch_size=args.ocr_batch_size,
+                                            trace=tracelog is not None, stream_dir=outdir if args.stream else None,
+                                            encoded=True, ordered=False)
+            for result in results:
+                _save_result(result, outdir, outnames, manifest, stats[result.infile], tracelog)
+            manifest.save()
+    except KeyboardInterrupt:
+        # Interrupting is how a watch is stopped, and the manifest is saved by the caller
+        print('Stopped watching ' + watcher.indir)
+
+def _fill_queue(path, indir, outdir, file_filter):
+    """Add every file of indir that file_filter accepts to the job queue at path (see jobqueue.JobQueue),
+    to be extracted into outdir by parsa worker processes. Files already in the queue are not added again,
+    so an interrupted run can simply be rerun.
+    """
+    with jq.JobQueue(path) as queue:
+        # Paths are stored as absolute paths, as workers may run from any folder (or machine)
+        queue.set_setting('output', os.path.abspath(outdir))
+        # Workers don't stop while the queue is being (re)filled, even if they've drained it
+        queue.set_setting('filled', '0')
+        added = 0
+        batch = []
+        for entry in fs.iter_files(indir, file_filter.prune):
+            if file_filter.accept(entry):
+                batch.append(os.path.abspath(entry.path))
+            if len(batch) >= _QUEUE_BATCH_SIZE:
+                added += queue.add(batch)
+                batch = []
+        added += queue.add(batch)
+        queue.mark_filled()
+        counts = queue.counts()
+    print('Added {} files to {} ({pending} pending, {claimed} claimed, {done} done, {failed} failed)'.format(
+        added, path, **counts))
+
+def _run_worker(args):
+    """Extract the jobs of the queue given by the parsed parsa worker arguments args, until every job is done."""
+    cache = ExtractionCache(args.cache, max_size=args.cache_size) if args.cache else None
+    tracelog = tr.TraceLog(args.trace) if args.trace else None
+    worker = jq.worker_id()
+    try:
+        with jq.JobQueue(args.queue) as queue:
+            outdir = queue.get_setting('output')
+            if outdir is None:
+                exit("Error: " + args.queue + " is not a job queue filled by parsa --queue")
+            outnames = fs.OutputNameIndex(fs.set_outdir(outdir, None))
+            while True:
+                extracted = _extract_jobs(queue, worker, args, outdir, outnames, cache, tracelog)
+                # Jobs claimed by other workers are waited for, in case their workers die and they have to be claimed again
+                if queue.is_filled() and queue.unfinished() == 0:
+                    break
+                if not extracted:
+                    time.sleep(min(_QUEUE_POLL_INTERVAL, args.lease / 2))
+    finally:
+        if tracelog is not None:
+            tracelog.close()
+
+def _extract_jobs(queue, worker, args, outdir, outnames, cache=None, tracelog=None):
+    """Claim jobs of queue for worker and extract them into outdir (see _run_worker), as long as there are jobs
+    to claim, keeping their leases alive while they're being extracted. Return the number of jobs extracted.
+    Jobs that another worker claimed in the meantime (their leases having expired) are left to that worker:
+    they're not counted, and their outputs are removed.
+    """
+    # IDs of the jobs claimed and not finished yet, by input
+    in_flight = {}
+
+    def claimed_files():
+        while True:
+            # A batch per round of workers, so that the queue isn't locked once per file
+            jobs = queue.claim(worker, args.lease, limit=args.jobs or workers.default_jobs())
+            if not jobs:
+                return
+            # Every claimed job's lease is renewed from now on, including the jobs not handed out yet
+            in_flight.update((job.input, job.id) for job in jobs)
+            for job in jobs:
+                yield job.input
 
+    stop_renewing = threading.Event()
+    renewer = threading.Thread(target=_renew_leases, args=(queue.path, worker, in_flight, args.lease, stop_renewing))
+    renewer.daemon = True
+    renewer.start()
+    extracted = 0
+    try:
+        results = workers.extract_files(claimed_files(), args.jobs, disable_no_ext_prompt=True, cache=cache,
+                                        timeout=args.timeout, memory_limit=args.memory_limit,
+                                        max_tasks_per_worker=args.max_tasks_per_worker,
+                                        pdf_pages_per_job=args.pdf_pages_per_job,
+                                        audio_seconds_per_job=args.audio_seconds_per_job,
+                                        ocr_batch_size=args.ocr_batch_size,
+                                        trace=tracelog is not None, encoded=True, ordered=False)
+        # Jobs are finished as soon as they're extracted, rather than waiting behind a slow job
+        for result in results:
+            outfile, error = _save_result(result, outdir, outnames, tracelog=tracelog)
+            # The job's lease expired and another worker claimed it, so the output kept is that worker's
+            # (written under a name of its own), rather than one output per worker that extracted the job
+            if not queue.finish(worker, in_flight.pop(result.infile), outfile, error):
+                if outfile is not None and os.path.exists(outfile):
+                    os.remove(outfile)
+                continue
+            extracted += 1
+    finally:
+        stop_renewing.set()
+        renewer.join()
+    return extracted
+
+def _renew_leases(path, worker, in_flight, lease, stop):
+    """Renew the leases worker holds on the jobs in in_flight (see _extract_jobs) every third of lease seconds,
+    until stop is set. Runs in a thread of its own, with a connection of its own to the queue at path.
+    """
+    with jq.JobQueue(path) as queue:
+        while not stop.wait(lease / 3.0):
+            queue.renew(worker, list(in_flight.values()), lease)
+
+def _make_shard(indir, file_filter, shard, shard_by='path'):
+    """Return the Shard of indir given by shard, a (K, N) pair, whose files are assigned by path or by size
+    (see sharding.balanced_assignment). Balancing by size walks indir first, keeping the files file_filter accepts.
+    """
+    index, count = shard
+    if shard_by != 'size':
+        return Shard(index, count)
+    with profiling.phase('discovery'):
+        files = [(file_filter.relpath(entry), entry.stat().st_size)
+                 for entry in fs.iter_files(indir, file_filter.prune) if file_filter.accept(entry)]
+    return Shard(index, count, balanced_assignment(files, count))
+
+def _extraction_time(record):
+    """Return the time spent extracting a file (not waiting for it), according to its trace record."""
+    if record is None:
+        return 0
+    return sum(seconds for phase, seconds in record['timings'].items() if phase != 'walk')
+
+def _save_result(result, outdir, outnames, manifest=None, stat=None, tracelog=None):
+    """Save the result (an ExtractionResult) of the extraction of a file (see _save_text).
+    Failed extractions are reported, and recorded in FAILURES_FILENAME inside outdir instead;
+    they are not recorded in the manifest, so that they are retried on the next incremental run.
+    If tracelog is not None, the result's trace record is completed and written to it.
+    Return an (output file, error) pair: output file is None if no text was written,
+    and error is None unless the extraction (or writing the output) failed.
+    """
+    record = result.trace
+    if record is not None and stat is not None:
+        record['size'] = stat.st_size
+
+    if result.error is None:
+        outcome = _save_text(result.text, result.infile, outnames, manifest, stat, record, result.textfile)
     else:
-        exit("Error: input must be an existing file or directory")
+        print("Error while parsing file: " + result.infile)
+        print(result.error + "\n")
+        _record_failure(outdir, {'input': result.infile, 'error': result.error})
+        if record is not None:
+            record['outcome'] = 'error'
+            record['error'] = result.error
+        outcome = (None, result.error)
+
+    if tracelog is not None and record is not None:
+        tracelog.write(record)
+    return outcome
+
+def _save_duplicates(duplicates, outcomes, outdir, outnames, manifest=None, tracelog=None, progress=None):
+    """Save the duplicates (see _discover_files) of every input in outcomes (mapping inputs that have been saved
+    to the (output file, error) pair returned by _save_result), removing them from duplicates.
+
+    The output of a duplicate is linked to its original's output (see fs.link_file) instead of being extracted,
+    and the pair is recorded in DUPLICATES_FILENAME inside outdir; duplicates of inputs whose extraction failed
+    are recorded as failures. Duplicates are recorded in manifest, tracelog and progress as well,
+    if they're not None.
+    """
+    for original in [original for original in duplicates if original in outcomes]:
+        original_outfile, error = outcomes[original]
+        for infile, stat in duplicates.pop(original):
+            record = dict(tr.new_record(infile, stat.st_size), original=original)
+            if error is not None:
+                failure = 'duplicate of {}, whose extraction failed: {}'.format(original, error)
+                _record_failure(outdir, {'input': infile, 'error': failure})
+                record.update(outcome='error', error=failure)
+            else:
+                outfile, link = _save_duplicate(infile, original_outfile, outnames, manifest, stat, record)
+                if outfile is not None:
+                    with open(os.path.join(outdir, DUPLICATES_FILENAME), 'a') as fout:
+                        fout.write(json.dumps({'input': infile, 'original': original, 'output': outfile,
+                                               'link': link}) + '\n')
+            if tracelog is not None:
+                tracelog.write(record)
+            if progress is not None:
+                progress.skipped(infile, stat.st_size)
+
+def _save_duplicate(infile, original_outfile, outnames, manifest=None, stat=None, record=None):
+    """Link the output of infile, a duplicate, to original_outfile, the output of the input it duplicates
+    (None if that input produced no text), recording it in manifest if it's not None.
+    Return an (output file, link) pair, where link is how the output was made (see fs.link_file),
+    or (None, None) if no output was written. record (a trace record) is completed as in _save_text.
+    """
+    previous_outfile = manifest.get_output(infile) if manifest is not None else None
+    outfile = link = None
+    if original_outfile is not None:
+        with tr.timed(record, 'name'):
+            outfile = previous_outfile or outnames.allocate(infile)
+        try:
+            with tr.timed(record, 'write'):
+                link = fs.link_file(original_outfile, outfile)
+        except (OSError, IOError) as e:
+            print(e)
+            if outfile != previous_outfile and os.path.exists(outfile):
+                os.remove(outfile)
+            record.update(outcome='error', error=str(e))
+            return None, None
+    elif previous_outfile is not None and os.path.exists(previous_outfile):
+        os.remove(previous_outfile)
+
+    record['outcome'] = 'duplicate'
+    if outfile is not None:
+        record['output'] = outfile
+        record['output_size'] = os.path.getsize(outfile)
+    if manifest is not None:
+        manifest.record(infile, outfile, stat)
+    return outfile, link
+
+def _record_failure(outdir, failure):
+    """Append failure (a dict with the failed input and its error) to FAILURES_FILENAME inside outdir."""
+    with open(os.path.join(outdir, FAILURES_FILENAME), 'a') as fout:
+        fout.write(json.dumps(failure) + '\n')
+
+def _save_text(text, infile, outnames, manifest=None, stat=None, record=None, textfile=None):
+    """Write the text (UTF-8 encoded) extracted from infile to a file allocated by outnames (an OutputNameIndex),
+    recording it in manifest if it's not None.
+    If textfile is not None, the text has already been streamed to it, and it's renamed to the output instead.
+    In incremental mode, the output written for infile by a previous run is overwritten.
+    If record (a trace record) is not None, the time spent naming and writing the output,
+    the output's size and the outcome are recorded in it.
+    Return an (output file, error) pair, as _save_result does.
+    """
+    previous_outfile = manifest.get_output(infile) if manifest is not None else None
+    outfile = None
+
+    # If text has been extracted successfully (and infile was not empty)
+    if text or textfile is not None:
+        with tr.timed(record, 'name'):
+            outfile = previous_outfile or outnames.allocate(infile)
+        try:
+            with tr.timed(record, 'write'):
+                if textfile is not None:
+                    fs.replace_file(textfile, outfile)
+                else:
+                    # A previous output may be hard-linked to the outputs of duplicates (see _save_duplicate),
+                    # which must not change along with it, so it's replaced rather than overwritten in place
+                    if outfile == previous_outfile and os.path.exists(outfile):
+                        os.remove(outfile)
+                    # The text is UTF-8 encoded, so it's written as it is
+                    fs.write_bytes_to_file(text, outfile)
+        except OSError as e:
+            print(e)
+            if textfile is not None and os.path.exists(textfile):
+                os.remove(textfile)
+            # Release the name claimed for the output, unless it belongs to a previous run
+            if outfile != previous_outfile and os.path.exists(outfile):
+                os.remove(outfile)
+            if record is not None:
+                record['outcome'] = 'error'
+                record['error'] = str(e)
+            return None, str(e)
+    # The input doesn't produce any text anymore, so its previous output is stale
+    elif previous_outfile is not None and os.path.exists(previous_outfile):
+        os.remove(previous_outfile)
+
+    if record is not None:
+        record['outcome'] = 'ok' if outfile is not None else 'empty'
+        if outfile is not None:
+            record['output'] = outfile
+            record['output_size'] = os.path.getsize(outfile)
+
+    if manifest is not None:
+        manifest.record(infile, outfile, stat)
+    return outfile, None
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
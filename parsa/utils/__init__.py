@@ -1,3 +1,18 @@
 from .cli import *
 from .filesystem import *
-from .text import *
\ No newline at end of file
+from .filetype import *
+from .filters import *
+from .text import *
+from .trace import *
+from .audio import *
+from .cache import *
+from .dedup import *
+from .jobqueue import *
+from .manifest import *
+from .ocr import *
+from .pdf import *
+from .profiling import *
+from .progress import *
+from .sharding import *
+from .watch import *
+from .workers import *
\ No newline at end of file
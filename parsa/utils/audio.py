@@ -0,0 +1,187 @@
+"""utils/audio.py - Segmented transcription of long audio files, so that several workers can transcribe one at once
+
+Functions:
+    splittable - return whether a file may be split into segments, judging by its name alone
+    segments - split an audio file into segments, cut at silences where possible
+    duration - return the duration of an audio file
+    transcribe_segment - transcribe a segment of an audio file, the way textract transcribes whole files
+    join_segments - join the transcripts of consecutive segments, dropping the words repeated by their overlaps
+    _quietest_point - find a silence near a point of a WAV file
+    _copy_wav_segment - copy a segment of a WAV file to another WAV file
+
+Constants:
+    AUDIO_EXTENSIONS - extensions of the audio formats textract transcribes
+    DEFAULT_OVERLAP - seconds shared by consecutive segments that aren't cut at a silence
+"""
+
+import array
+import contextlib
+import math
+import os
+import sys
+import tempfile
+import wave
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.ogg')
+
+DEFAULT_OVERLAP = 1.0
+
+# Seconds searched for a silence on each side of a segment's nominal end
+_SILENCE_SEARCH = 1.0
+# Length in seconds of the windows whose loudness is compared when looking for a silence
+_SILENCE_WINDOW = 0.02
+# A window is silent if it's this many times quieter than the average of the searched span
+_SILENCE_RATIO = 0.1
+
+# array typecodes of signed PCM samples, by sample width in bytes (8-bit samples are unsigned)
+_SAMPLE_TYPECODES = {1: 'B', 2: 'h', 4: 'i'}
+
+# Most words the overlap of two segments can hold, when looking for words transcribed twice
+_MAX_OVERLAP_WORDS = 8
+
+def splittable(infile):
+    """Return True if infile may be split into segments (see segments), judging by its name alone
+    (without reading it): if it's an audio file textract transcribes.
+    """
+    return os.path.splitext(infile)[1].lower() in AUDIO_EXTENSIONS
+
+def segments(infile, seconds_per_segment, overlap=DEFAULT_OVERLAP):
+    """Return the (start, end) segments (in seconds) of about seconds_per_segment seconds that infile is split
+    into, or None if infile shouldn't be split: if it's not an audio file textract transcribes,
+    if it's shorter than two segments, or if its duration can't be read (in which case textract reports
+    the problem, as it does for any audio file).
+
+    Segments of WAV files are cut at the quietest point near their nominal end, if it's silent,
+    so that no word is cut in two. Other cuts (and all those of compressed formats, which would have to be
+    decoded to be searched) are made overlap seconds wide, so that a word cut in two by one segment
+    is whole in the other (see join_segments).
+    """
+    if not splittable(infile):
+        return None
+    extension = os.path.splitext(infile)[1].lower()
+    try:
+        total = duration(infile)
+    except Exception:
+        return None
+    if total < 2 * seconds_per_segment:
+        return None
+
+    spans = []
+    start = 0.0
+    cut = seconds_per_segment
+    while cut < total - seconds_per_segment / 2.0:
+        silence = None
+        if extension == '.wav':
+            try:
+                silence = _quietest_point(infile, cut)
+            except Exception:
+                silence = None
+        if silence is not None:
+            spans.append((start, silence))
+            start = silence
+        else:
+            spans.append((start, min(cut + overlap / 2.0, total)))
+            start = max(cut - overlap / 2.0, 0.0)
+        cut += seconds_per_segment
+    spans.append((start, total))
+    return [(round(start, 3), round(end, 3)) for start, end in spans]
+
+def duration(infile):
+    """Return the duration of infile in seconds: read from its header for WAV files, or with soxi (sox's info tool,
+    which textract needs to convert compressed formats anyway) for the others.
+    """
+    if os.path.splitext(infile)[1].lower() == '.wav':
+        with contextlib.closing(wave.open(infile, 'rb')) as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    from textract.parsers.audio import Parser
+
+    stdout, _ = Parser().run(['soxi', '-D', infile])
+    return float(stdout.decode('ascii').strip())
+
+def transcribe_segment(infile, start, end):
+    """Transcribe the segment of infile from start to end (in seconds), by handing it to textract
+    as a WAV file of its own, so that it's transcribed exactly as textract transcribes whole files.
+    The transcript is returned as textract returns it, to be joined with join_segments.
+    """
+    import textract
+    from textract.parsers.audio import Parser
+
+    handle, segment_file = tempfile.mkstemp(suffix='.wav')
+    os.close(handle)
+    try:
+        if os.path.splitext(infile)[1].lower() == '.wav':
+            _copy_wav_segment(infile, segment_file, start, end)
+        else:
+            # The same conversion textract makes (to a mono WAV file), trimmed to the segment
+            Parser().run(['sox', '-G', '-c', '1', infile, segment_file, 'trim', str(start), str(end - start)])
+        return textract.process(segment_file)
+    finally:
+        os.remove(segment_file)
+
+def join_segments(spans, texts):
+    """Join texts, the transcripts (see transcribe_segment) of the consecutive segments spans of an audio file,
+    into a single transcript formatted as textract formats the transcript of a whole file.
+    Where two segments overlap, the words at the start of the later one that repeat the last words
+    of the earlier one are dropped.
+    """
+    words = []
+    previous_end = None
+    for (start, end), text in zip(spans, texts):
+        if not isinstance(text, str):
+            text = text.decode('utf-8')
+        segment_words = text.split()
+        if previous_end is not None and start < previous_end:
+            for count in range(min(_MAX_OVERLAP_WORDS, len(words), len(segment_words)), 0, -1):
+                if words[-count:] == segment_words[:count]:
+                    segment_words = segment_words[count:]
+                    break
+        words.extend(segment_words)
+        previous_end = end
+    # textract ends every transcript with a newline
+    return (' '.join(words) + '\n').encode('utf-8')
+
+def _quietest_point(infile, around, search=_SILENCE_SEARCH, window=_SILENCE_WINDOW):
+    """Return the middle (in seconds) of the quietest window of the WAV file infile within search seconds
+    of around, if it's silent (much quieter than the searched span on average, or the whole span is silent),
+    or None otherwise. Only the searched span is read.
+    """
+    with contextlib.closing(wave.open(infile, 'rb')) as wav:
+        rate = wav.getframerate()
+        width = wav.getsampwidth()
+        channels = wav.getnchannels()
+        if width not in _SAMPLE_TYPECODES:
+            return None
+        first_frame = max(int((around - search) * rate), 0)
+        wav.setpos(first_frame)
+        samples = array.array(_SAMPLE_TYPECODES[width], wav.readframes(int(2 * search * rate)))
+    # WAV samples are little-endian
+    if width > 1 and sys.byteorder == 'big':
+        samples.byteswap()
+    if width == 1:
+        samples = array.array('h', (sample - 128 for sample in samples))
+
+    window_samples = max(int(window * rate), 1) * channels
+    energies = []
+    for offset in range(0, len(samples) - window_samples + 1, window_samples):
+        chunk = samples[offset:offset + window_samples]
+        energies.append(sum(sample * sample for sample in chunk))
+    if not energies:
+        return None
+    average = sum(energies) / float(len(energies))
+    quietest = min(range(len(energies)), key=lambda index: (energies[index], abs(index - len(energies) // 2)))
+    # In a completely silent span, all windows tie and the one nearest around is the quietest
+    if average > 0 and math.sqrt(energies[quietest] / average) > _SILENCE_RATIO:
+        return None
+    return (first_frame + (quietest + 0.5) * window_samples // channels) / float(rate)
+
+def _copy_wav_segment(infile, outfile, start, end):
+    """Copy the frames of the WAV file infile from start to end (in seconds) to the WAV file outfile."""
+    with contextlib.closing(wave.open(infile, 'rb')) as wav:
+        rate = wav.getframerate()
+        wav.setpos(int(start * rate))
+        frames = wav.readframes(int((end - start) * rate))
+        with contextlib.closing(wave.open(outfile, 'wb')) as segment:
+            segment.setnchannels(wav.getnchannels())
+            segment.setsampwidth(wav.getsampwidth())
+            segment.setframerate(rate)
+            segment.writeframes(frames)
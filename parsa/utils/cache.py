@@ -0,0 +1,229 @@
+"""utils/cache.py - Content-addressed extraction cache for parsa
+
+Classes:
+    ExtractionCache - on-disk cache of extracted text, keyed by input content and extraction settings
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    # Reason for no coverage: fcntl is available on every supported platform (Linux)
+    fcntl = None
+
+import parsa
+from parsa.utils import filesystem as fs
+
+# Extension of the files holding cached text
+_ENTRY_SUFFIX = '.txt'
+# Name of the lock file taken while evicting entries
+_LOCK_FILENAME = '.lock'
+# Number of characters (or bytes) copied at a time between cache entries and files
+_COPY_CHUNK_SIZE = 1024 * 1024
+# Fraction of max_size the cache is shrunk to when it is evicted,
+# so that eviction doesn't run again after every single insertion
+_EVICTION_LOW_WATERMARK = 0.9
+
+class ExtractionCache(object):
+    """On-disk cache of extracted text, shared across paths, runs and concurrent parsa processes.
+
+    Entries are keyed by the SHA-256 hash of the input's content together with the extraction settings
+    (input extension, parsa and textract versions), so identical files stored under different paths
+    share one entry. Each entry is a UTF-8 text file inside cachedir.
+
+    If max_size (in bytes) is set, the least recently used entries are evicted whenever the cache grows
+    beyond it; an entry's modification time is refreshed on every hit to track its last use.
+
+    Entries are written to a temporary file and then renamed into place, so concurrent readers never see
+    a partially written entry, and eviction is serialised across processes with a lock file.
+    """
+
+    def __init__(self, cachedir, max_size=None):
+        self.cachedir = cachedir
+        self.max_size = max_size
+        if not os.path.exists(cachedir):
+            try:
+                os.makedirs(cachedir)
+            except OSError:
+                # Another process may have created the directory in the meantime
+                if not os.path.isdir(cachedir):
+                    raise
+        # Estimate of the cache's size, only used to decide when to evict;
+        # other processes sharing the cache also grow it, so the real size is recomputed on eviction
+        self._size_estimate = self._scan_size() if max_size is not None else 0
+
+    def key(self, infile, extension=None):
+        """Return the cache key of infile, extracted with the given extension (infile's own extension by default)."""
+        if extension is None:
+            extension = os.path.splitext(infile)[1]
+        settings = '\0'.join([extension.lower().lstrip('.'), parsa.__version__, _textract_version()])
+        key = hashlib.sha256(fs.hash_file(infile).encode('ascii'))
+        key.update(settings.encode('utf-8'))
+        return key.hexdigest()
+
+    def get(self, key, encoded=False):
+        """Return the text cached under key, or None if there is no such entry.
+        If encoded is set, the text is returned UTF-8 encoded (as bytes), as it's stored, without decoding it.
+        """
+        entry = self._entry_path(key)
+        try:
+            if encoded:
+                with open(entry, 'rb') as fin:
+                    text = fin.read()
+            else:
+                with io.open(entry, 'r', encoding='utf-8', newline='') as fin:
+                    text = fin.read()
+        except (OSError, IOError):
+            return None
+        # Refresh the entry's modification time, which is used as its last use time when evicting
+        try:
+            os.utime(entry, None)
+        except OSError:
+            # The entry has been evicted by another process in the meantime
+            pass
+        return text
+
+    def get_file(self, key, outfile):
+        """Write the text cached under key to outfile (as fs.write_str_to_file would), a chunk at a time.
+        Return False (leaving outfile untouched) if there is no such entry.
+        """
+        entry = self._entry_path(key)
+        try:
+            fin = io.open(entry, 'r', encoding='utf-8', newline='')
+        except (OSError, IOError):
+            return False
+        with fin, io.open(outfile, 'w', encoding='utf-8', newline='') as fout:
+            for chunk in iter(lambda: fin.read(_COPY_CHUNK_SIZE), ''):
+                fout.write(chunk)
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        return True
+
+    def put(self, key, text):
+        """Store text (a string, or UTF-8 encoded bytes-like object) under key,
+        evicting the least recently used entries if the cache grows beyond max_size.
+        """
+        # Encoded text is stored as it is
+        self._store(key, lambda fout: fout.write(text), binary=not isinstance(text, str))
+
+    def put_file(self, key, textfile):
+        """Store the text of textfile (written as fs.write_str_to_file would) under key, a chunk at a time.
+        The file is copied as it is, so that cache hits hold the same bytes, newlines included.
+        """
+        def copy(fout):
+            with open(textfile, 'rb') as fin:
+                shutil.copyfileobj(fin, fout, _COPY_CHUNK_SIZE)
+        self._store(key, copy, binary=True)
+
+    def _store(self, key, write, binary=False):
+        """Store the text written by write (called with the entry's file object, opened in binary mode
+        if binary is set) under key, evicting the least recently used entries if the cache grows beyond max_size.
+        """
+        entry = self._entry_path(key)
+        entrydir = os.path.dirname(entry)
+        if not os.path.exists(entrydir):
+            try:
+                os.makedirs(entrydir)
+            except OSError:
+                if not os.path.isdir(entrydir):
+                    raise
+        # Write to a temporary file in the same directory, then rename it into place atomically
+        fd, tmp_path = tempfile.mkstemp(dir=entrydir, suffix='.tmp')
+        try:
+            if binary:
+                fout = io.open(fd, 'wb')
+            else:
+                fout = io.open(fd, 'w', encoding='utf-8', newline='')
+            with fout:
+                write(fout)
+                fout.flush()
+                # Sized before it's renamed, as another process sharing the cache may evict it right after
+                size = os.fstat(fout.fileno()).st_size
+            fs.replace_file(tmp_path, entry)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if self.max_size is not None:
+            self._size_estimate += size
+            if self._size_estimate > self.max_size:
+                self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is below its low watermark.
+        If another process is already evicting, this call returns without doing anything.
+        """
+        with _EvictionLock(os.path.join(self.cachedir, _LOCK_FILENAME)) as acquired:
+            if not acquired:
+                return
+            entries = list(self._iter_entries())
+            total_size = sum(size for _, _, size in entries)
+            target_size = self.max_size * _EVICTION_LOW_WATERMARK
+            # Oldest (least recently used) entries first
+            entries.sort()
+            for _, entry, size in entries:
+                if total_size <= target_size:
+                    break
+                try:
+                    os.remove(entry)
+                except OSError:
+                    # Already removed by someone else
+                    pass
+                total_size -= size
+            self._size_estimate = total_size
+
+    def _entry_path(self, key):
+        """Return the path of the entry for key; entries are spread across 256 subdirectories."""
+        return os.path.join(self.cachedir, key[:2], key + _ENTRY_SUFFIX)
+
+    def _iter_entries(self):
+        """Yield (modification time, path, size) for every entry in the cache."""
+        for entry in fs.iter_files(self.cachedir):
+            if not entry.name.endswith(_ENTRY_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            yield stat.st_mtime, entry.path, stat.st_size
+
+    def _scan_size(self):
+        """Return the total size of the entries in the cache."""
+        return sum(size for _, _, size in self._iter_entries())
+
+class _EvictionLock(object):
+    """Non-blocking, cross-process lock held while evicting entries.
+    The context manager returns whether the lock was acquired.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        if fcntl is None: # pragma: no cover
+            return True
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (OSError, IOError):
+            return False
+        return True
+
+    def __exit__(self, *exc_info):
+        # Closing the file descriptor releases the lock
+        os.close(self.fd)
+        return False
+
+def _textract_version():
+    """Return textract's version, which is part of the cache key as different versions may extract text differently."""
+    import textract
+    return getattr(textract, 'VERSION', '')
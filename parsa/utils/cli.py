@@ -5,7 +5,14 @@ Classes:
 
 Functions:
     parse_arguments - parse CLI arguments
+    parse_worker_arguments - parse the CLI arguments of the worker command
     _set_arguments - set CLI description and arguments
+    _set_worker_arguments - set the worker command's CLI description and arguments
+    _positive_int - argparse type for strictly positive integers
+    _positive_float - argparse type for strictly positive numbers
+    _size - argparse type for sizes in bytes, with an optional unit suffix
+    _extension_list - argparse type for comma-separated lists of extensions
+    _shard - argparse type for shards, written K/N
 """
 
 import argparse
@@ -30,6 +37,12 @@ def parse_arguments():
     args = argparser.parse_args()
     return args
 
+def parse_worker_arguments(argv=None):
+    """Parse the command-line arguments of parsa worker (argv, without the worker command itself;
+    sys.argv's by default), and return a Namespace object containing them.
+    """
+    return _set_worker_arguments().parse_args(argv)
+
 def _set_arguments():
     """Set CLI description and arguments."""
     argparser = argparse.ArgumentParser(description=('Textract-based text parser that supports most text file extensions. '
@@ -46,4 +59,220 @@ def _set_arguments():
     'will be stored. The default folder is: \n'
     '(a) the input file\'s parent folder, if the input is a file, or \n'
     '(b) a folder named \'parsaoutput\' located in the input folder, if the input is a folder.'))
-    return argparser
\ No newline at end of file
+
+    argparser.add_argument('--jobs', '-j', type=_positive_int, default=None, help=('number of worker processes '
+    'used to extract text when the input is a folder (default: number of CPUs)'))
+
+    argparser.add_argument('--incremental', action='store_true', help=('only extract inputs that are new or have changed '
+    'since the last run, overwriting the outputs of changed inputs; processed inputs are recorded in a manifest '
+    'file (parsamanifest.json) inside the output folder'))
+
+    argparser.add_argument('--hash', action='store_true', help=('with --incremental, also record the content hash '
+    'of each input, so that inputs whose modification time changed but whose content did not are skipped'))
+
+    argparser.add_argument('--cache', metavar='CACHEDIR', default=None, help=('folder of an extraction cache, '
+    'which stores the extracted text of each input by content; inputs whose content has already been extracted '
+    '(under any path, in this or a previous run) are not extracted again. The cache can be shared by several '
+    'parsa processes at once'))
+
+    argparser.add_argument('--cache-size', type=_size, default=None, help=('maximum size of the extraction cache '
+    '(e.g. 500M or 2G); the least recently used entries are evicted beyond it (default: unlimited)'))
+
+    argparser.add_argument('--timeout', type=_positive_float, default=None, help=('maximum number of seconds '
+    'the extraction of a single file may take; files that take longer are recorded as failures '
+    '(in parsafailures.jsonl, inside the output folder) and the run continues (default: no limit)'))
+
+    argparser.add_argument('--memory-limit', type=_size, default=None, help=('maximum memory (e.g. 2G) '
+    'the extraction of a single file may use, including the programs it runs; files that need more '
+    'are recorded as failures and the run continues (default: no limit)'))
+
+    argparser.add_argument('--max-tasks-per-worker', type=_positive_int, default=None, help=('number of files '
+    'each worker process extracts before being replaced with a fresh one, to limit the memory leaked by '
+    'parsers over long runs (default: workers are never replaced)'))
+
+    argparser.add_argument('--pdf-pages-per-job', metavar='PAGES', type=_positive_int, default=None, help=('split '
+    'PDFs of at least 2*PAGES pages (and 1 MB) into ranges of PAGES pages, extracted by several worker processes '
+    'at once and joined back in page order, so that a single large PDF doesn\'t hold up a run; the text is the '
+    'same as when the PDF is extracted whole. --timeout and --memory-limit apply to each range '
+    '(default: PDFs are not split)'))
+
+    argparser.add_argument('--audio-seconds-per-job', metavar='SECONDS', type=_positive_float, default=None,
+    help=('split audio files (.wav, .mp3, .ogg) of at least 2*SECONDS seconds into segments of about SECONDS '
+    'seconds, cut at silences where possible (and overlapping slightly otherwise), transcribed by several '
+    'worker processes at once and joined back in order; --jobs sets how many segments are transcribed at once, '
+    'and --timeout and --memory-limit apply to each segment (default: audio files are not split)'))
+
+    argparser.add_argument('--ocr-batch-size', metavar='IMAGES', type=_positive_int, default=None, help=('OCR '
+    'images (.png, .jpg, .jpeg) in batches of up to IMAGES images, each with a single tesseract invocation, '
+    'so that tesseract starts (and loads its language data) once per batch rather than once per image; '
+    'each image gets the same text and output file as when it\'s OCRed alone. If a batch fails, its images are '
+    'OCRed again one at a time. --timeout and --memory-limit apply to each batch (default: images are OCRed '
+    'one at a time)'))
+
+    argparser.add_argument('--trace', metavar='TRACEFILE', default=None, help=('append a JSON line to TRACEFILE '
+    'for every processed file, holding its size, detected type, the extractor used, the time spent in each phase '
+    '(walk, sniff, extract, decode, cache, name, write), its output size and its outcome'))
+
+    argparser.add_argument('--profile', metavar='PROFILEDIR', default=None, help=('profile the run, writing '
+    'a cProfile profile of each phase (discovery, extraction, post-processing, output, other), merged across '
+    'worker processes, to PROFILEDIR, and print the hottest functions'))
+
+    argparser.add_argument('--progress', action='store_true', help=('when the input is a folder, report progress '
+    '(files and MB per second, files in flight, ETA) on stderr: as a single updating line on a terminal, '
+    'or as JSON lines otherwise'))
+
+    argparser.add_argument('--progress-interval', type=_positive_float, default=1.0, help=('seconds between '
+    'progress reports (default: %(default)s)'))
+
+    argparser.add_argument('--stream', action='store_true', help=('write text to the output files as it is '
+    'decoded, instead of holding the whole text of a file in memory, so that very large inputs are extracted '
+    'in bounded memory'))
+
+    argparser.add_argument('--dedup', action='store_true', help=('when the input is a folder, extract files with '
+    'identical content (and the same extension) only once: the outputs of duplicates are hard links (or reflinks, or copies) to the output '
+    'of the first copy, and every duplicate is recorded in parsaduplicates.jsonl inside the output folder'))
+
+    argparser.add_argument('--include', metavar='GLOB', action='append', default=None, help=('when the input is '
+    'a folder, only extract files matching GLOB (e.g. \'*.pdf\'); globs containing a slash are matched against '
+    'the path relative to the input folder, others against the file name. Can be given several times'))
+
+    argparser.add_argument('--exclude', metavar='GLOB', action='append', default=None, help=('when the input is '
+    'a folder, skip files and folders matching GLOB (e.g. .git or node_modules); excluded folders are not '
+    'walked at all. Can be given several times. The output folder is always excluded'))
+
+    argparser.add_argument('--min-size', type=_size, default=None, help=('skip files smaller than this size '
+    '(e.g. 1K)'))
+
+    argparser.add_argument('--max-size', type=_size, default=None, help=('skip files larger than this size '
+    '(e.g. 100M)'))
+
+    argparser.add_argument('--extensions', metavar='EXT[,EXT...]', type=_extension_list, default=None,
+    help=('only extract files with one of these extensions (e.g. pdf,docx); an empty extension stands for '
+    'files without one'))
+
+    argparser.add_argument('--exclude-extensions', metavar='EXT[,EXT...]', type=_extension_list, default=None,
+    help=('skip files with one of these extensions (e.g. exe,zip)'))
+
+    argparser.add_argument('--shard', metavar='K/N', type=_shard, default=None, help=('when the input is a folder, '
+    'only extract shard K (from 1 to N) of N disjoint shards of it, so that N runs (e.g. on different machines '
+    'sharing the input folder) together extract every file exactly once; outputs are written to a '
+    'shard-K-of-N folder inside the output folder'))
+
+    argparser.add_argument('--shard-by', choices=['path', 'size'], default='path', help=('how files are assigned '
+    'to shards: by a stable hash of their relative path (default), or so that every shard holds about as many '
+    'bytes (which walks the whole input folder before extracting anything)'))
+
+    argparser.add_argument('--queue', metavar='JOBDB', default=None, help=('when the input is a folder, don\'t '
+    'extract anything: add every file to the SQLite job queue JOBDB (created if needed, e.g. on a shared '
+    'filesystem) instead, to be extracted by any number of "parsa worker JOBDB" processes'))
+
+    argparser.add_argument('--watch', action='store_true', help=('when the input is a folder, keep running after '
+    'extracting it, and extract new and modified files as soon as they\'re done being written, until interrupted. '
+    'Implies --incremental, so that a restarted watch only catches up on the files it missed. Files without '
+    'an extension are not prompted for'))
+
+    argparser.add_argument('--watch-settle', metavar='SECONDS', type=_positive_float, default=2.0, help=('with '
+    '--watch, seconds a file must go unmodified before it\'s extracted, so that files still being written '
+    'are not extracted half-written (default: %(default)s)'))
+    return argparser
+
+def _set_worker_arguments():
+    """Set the worker command's CLI description and arguments."""
+    argparser = argparse.ArgumentParser(prog='parsa worker', description=('Extract the files of a job queue '
+    'filled by "parsa --queue JOBDB", writing their text to the output folder of the run that filled it. '
+    'Any number of workers (on any number of machines sharing the queue) can run at once: each claims jobs '
+    'as it becomes free, and jobs claimed by workers that died are claimed again once their lease expires. '
+    'Workers exit once every job is done.'))
+
+    argparser.add_argument('queue', metavar='JOBDB', help='job queue filled by parsa --queue')
+
+    argparser.add_argument('--jobs', '-j', type=_positive_int, default=None, help=('number of worker processes '
+    'extracting text (default: number of CPUs)'))
+
+    argparser.add_argument('--lease', type=_positive_float, default=60.0, help=('seconds a claimed job stays '
+    'reserved for this worker without being renewed; leases are renewed while jobs are being extracted, '
+    'so this is how long it takes for the jobs of a dead worker to be claimed again (default: %(default)s)'))
+
+    argparser.add_argument('--cache', metavar='CACHEDIR', default=None, help='folder of an extraction cache')
+
+    argparser.add_argument('--cache-size', type=_size, default=None, help='maximum size of the extraction cache')
+
+    argparser.add_argument('--timeout', type=_positive_float, default=None, help=('maximum number of seconds '
+    'the extraction of a single file may take'))
+
+    argparser.add_argument('--memory-limit', type=_size, default=None, help=('maximum memory the extraction '
+    'of a single file may use'))
+
+    argparser.add_argument('--max-tasks-per-worker', type=_positive_int, default=None, help=('number of files '
+    'each worker process extracts before being replaced with a fresh one'))
+
+    argparser.add_argument('--pdf-pages-per-job', metavar='PAGES', type=_positive_int, default=None, help=('split '
+    'large PDFs into ranges of PAGES pages, extracted by several worker processes at once'))
+
+    argparser.add_argument('--audio-seconds-per-job', metavar='SECONDS', type=_positive_float, default=None,
+    help=('split long audio files into segments of about SECONDS seconds, transcribed by several worker '
+    'processes at once'))
+
+    argparser.add_argument('--ocr-batch-size', metavar='IMAGES', type=_positive_int, default=None, help=('OCR '
+    'images in batches of up to IMAGES images, each with a single tesseract invocation'))
+
+    argparser.add_argument('--trace', metavar='TRACEFILE', default=None, help=('append a JSON line to TRACEFILE '
+    'for every processed file'))
+    return argparser
+
+def _positive_int(value):
+    """Convert value to an integer, raising argparse.ArgumentTypeError if it is not strictly positive."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid integer value: ' + repr(value))
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be a positive integer: ' + repr(value))
+    return number
+
+def _positive_float(value):
+    """Convert value to a number, raising argparse.ArgumentTypeError if it is not strictly positive."""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid number: ' + repr(value))
+    if number <= 0:
+        raise argparse.ArgumentTypeError('must be a positive number: ' + repr(value))
+    return number
+
+def _size(value):
+    """Convert a size such as 512, 100K, 500M or 2G (binary units) to a number of bytes,
+    raising argparse.ArgumentTypeError if it's not valid.
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    number = value.strip().upper()
+    multiplier = 1
+    # Accept both 500M and 500MB
+    if number.endswith('B'):
+        number = number[:-1]
+    if number and number[-1] in units:
+        multiplier = units[number[-1]]
+        number = number[:-1]
+    try:
+        size = int(float(number) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid size: ' + repr(value))
+    if size < 0:
+        raise argparse.ArgumentTypeError('size must not be negative: ' + repr(value))
+    return size
+
+def _extension_list(value):
+    """Convert a comma-separated list of extensions (e.g. 'pdf,.docx') to a list of extensions."""
+    return [extension.strip() for extension in value.split(',')]
+
+def _shard(value):
+    """Convert a shard written K/N (e.g. 2/8) to a (K, N) pair,
+    raising argparse.ArgumentTypeError if it's not valid (K must be between 1 and N).
+    """
+    try:
+        index, count = [int(number) for number in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid shard (expected K/N, e.g. 2/8): ' + repr(value))
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError('shard K/N must have 1 <= K <= N: ' + repr(value))
+    return index, count
@@ -0,0 +1,78 @@
+"""utils/dedup.py - Detection of duplicate inputs, used by parsa's dedup mode
+
+Classes:
+    DuplicateFinder - find inputs whose content is identical to that of an input seen before
+"""
+
+import hashlib
+import os
+
+from parsa.utils import filesystem as fs
+
+# Number of bytes at the start of a file hashed to tell apart files of the same size
+PARTIAL_HASH_SIZE = 64 * 1024
+
+class DuplicateFinder(object):
+    """Find inputs whose content is identical to that of an input seen before, hashing as little as possible.
+
+    Files are compared in three stages, each only reached by files that matched on the previous one:
+    their size (known from the walk, so free), a hash of their first partial_size bytes,
+    then a hash of their whole content. A file with a size no other file has is never read,
+    and the first file of each group is only hashed once a second one shows up.
+
+    Only files with the same extension (compared case-insensitively) are compared, as the extension picks
+    the extractor, so files with the same content but different extensions may not have the same text.
+
+    Files that can't be read are never reported as duplicates, so that their extraction reports the error.
+    """
+
+    def __init__(self, partial_size=PARTIAL_HASH_SIZE):
+        self.partial_size = partial_size
+        # First file seen with each (extension, size) group, and with each (group, partial hash)
+        # and (group, full hash) pair
+        self._by_size = {}
+        self._by_partial_hash = {}
+        self._by_full_hash = {}
+        # Files already registered by their partial or full hash
+        self._partially_hashed = set()
+        self._fully_hashed = set()
+
+    def find(self, infile, size):
+        """Return the first file seen with the same content as infile (of size bytes),
+        and extension, or None if there is none, in which case infile is remembered as the first file
+        with its content and extension.
+        """
+        group = (os.path.splitext(infile)[1].lower(), size)
+        original = self._by_size.setdefault(group, infile)
+        if original == infile:
+            return None
+        try:
+            # Another file has this size: compare their partial hashes, hashing the first file lazily
+            self._register(original, group, self._partially_hashed, self._by_partial_hash, self._partial_hash)
+            original = self._by_partial_hash.setdefault((group, self._partial_hash(infile)), infile)
+            self._partially_hashed.add(infile)
+            if original == infile:
+                return None
+            # The partial hash covers the whole content of small files
+            if size <= self.partial_size:
+                return original
+
+            self._register(original, group, self._fully_hashed, self._by_full_hash, fs.hash_file)
+            original = self._by_full_hash.setdefault((group, fs.hash_file(infile)), infile)
+            self._fully_hashed.add(infile)
+        except (OSError, IOError):
+            return None
+        return original if original != infile else None
+
+    def _register(self, infile, group, hashed, by_hash, hash_function):
+        """Register infile (if it isn't already) in by_hash, under its (extension, size) group
+        and the hash given by hash_function.
+        """
+        if infile not in hashed:
+            by_hash.setdefault((group, hash_function(infile)), infile)
+            hashed.add(infile)
+
+    def _partial_hash(self, infile):
+        """Return the hex digest of the first partial_size bytes of infile."""
+        with open(infile, 'rb') as fin:
+            return hashlib.sha256(fin.read(self.partial_size)).hexdigest()
@@ -1,13 +1,35 @@
 """utils/filesystem.py - OS/filesystem utilities for parsa
 
+Classes:
+    OutputNameIndex - allocate unique output filepaths in constant time
+
 Functions:
     compose_unique_filepath - compose a filepath to avoid overwriting existing files
     get_filelist - return list of files of a directory and all subdirectories
+    hash_file - return the hex digest of a file's content
+    iter_files - lazily yield the files of a directory and all subdirectories
+    link_file - make a file share another file's content, with a hard link, a reflink or a copy
+    replace_file - rename a file, overwriting the destination if it exists
     set_outdir - set output directory based on the user's choice
     write_str_to_file - write string to file
+    write_bytes_to_file - write UTF-8 encoded text to file
 """
 
+import errno
+import hashlib
+import io
 import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    # Reason for no coverage: fcntl is available on every supported platform (Linux)
+    fcntl = None
+
+# ioctl request cloning a file's extents into another one (Linux's FICLONE), supported by Btrfs, XFS, ...
+_FICLONE = 0x40049409
 
 def compose_unique_filepath(infile, outdir):
     """Compose output filepath to avoid overwriting existing files.
@@ -43,16 +65,139 @@ def compose_unique_filepath(infile, outdir):
         file_exists_counter += 1
     return outfile
 
+class OutputNameIndex(object):
+    """Allocate unique output filepaths in outdir, following the same naming scheme as compose_unique_filepath.
+
+    The output directory is listed once, when the index is created; from then on, names are allocated
+    from memory, remembering the next counter to try for each name, so allocating a name takes constant time
+    instead of one os.path.exists call per counter value.
+
+    Allocated names are claimed by creating an empty file with O_EXCL, so that names stay unique
+    even when several processes (or threads) allocate names in the same output directory at once:
+    if another process has taken a name in the meantime, the next one is tried.
+    """
+
+    def __init__(self, outdir):
+        self.outdir = outdir
+        self._names = set(os.listdir(outdir))
+        # Next counter to try for each output name prefix (e.g. 'foo.pdf' -> 3 if foo.pdf2.txt is taken)
+        self._next_counter = {}
+        self._lock = threading.Lock()
+
+    def allocate(self, infile, claim=True):
+        """Return a unique output filepath for infile, in the same format as compose_unique_filepath.
+        If claim is set, an empty file is created at the returned filepath to reserve it.
+        """
+        filename_noextension = os.path.basename(os.path.normpath(os.path.splitext(infile)[0]))
+        input_extension = os.path.splitext(infile)[1]
+        prefix = filename_noextension + input_extension
+
+        with self._lock:
+            outname = filename_noextension + '.txt'
+            while not self._reserve(outname, claim):
+                file_exists_counter = self._next_counter.get(prefix, 1)
+                # If it's the first conflict, just add the input extension to the filename
+                if file_exists_counter == 1:
+                    outname = prefix + '.txt'
+                # Otherwise, add a counter too
+                else:
+                    outname = prefix + str(file_exists_counter) + '.txt'
+                self._next_counter[prefix] = file_exists_counter + 1
+        return os.path.join(self.outdir, outname)
+
+    def _reserve(self, outname, claim):
+        """Reserve outname, returning False if it's already taken."""
+        if outname in self._names:
+            return False
+        self._names.add(outname)
+        if claim:
+            try:
+                # Created with the permissions open() gives new files (0o666, less the umask)
+                fd = os.open(os.path.join(self.outdir, outname), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+            except OSError as e:
+                # Taken by another process after the output directory was listed
+                if e.errno == errno.EEXIST:
+                    return False
+                raise
+            os.close(fd)
+        return True
+
 def get_filelist(indir):
     """Return list of files in the input directory, including the files in all subdirectories.""" 
-    filelist = []
-    # Cycle through all files in the directory recursively
-    # https://stackoverflow.com/a/36898903
-    for root, dirs, files in os.walk(indir, topdown=True):
-        for filename in files:
-            filepath = os.path.join(root, filename)
-            filelist.append(filepath)
-    return filelist
+    return [entry.path for entry in iter_files(indir)]
+
+def hash_file(infile, algorithm='sha256', chunk_size=1024 * 1024):
+    """Return the hex digest of infile's content, reading it in chunks of chunk_size bytes."""
+    digest = hashlib.new(algorithm)
+    with open(infile, 'rb') as fin:
+        chunk = fin.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = fin.read(chunk_size)
+    return digest.hexdigest()
+
+def iter_files(indir, prune=None):
+    """Lazily yield a DirEntry for every file in the input directory, including the files in all subdirectories.
+    If prune is given, it's called with the DirEntry of every subdirectory, and the subdirectories
+    for which it returns True are skipped, without being scanned.
+
+    Files are yielded as soon as their directory is scanned, so callers can start working on them
+    while the rest of the tree is still being walked. The DirEntry objects carry the file type
+    (and, once entry.stat() has been called, the stat data), so no further stat calls are needed.
+
+    The order is the same as os.walk(indir, topdown=True): symbolic links to directories
+    are not followed, and directories that cannot be scanned are skipped.
+    """
+    # An explicit stack is used instead of recursion, so that deep trees can't exceed the recursion limit
+    dirs_to_scan = [indir]
+    while dirs_to_scan:
+        subdirs = []
+        try:
+            for entry in os.scandir(dirs_to_scan.pop()):
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not entry.is_symlink() and (prune is None or not prune(entry)):
+                        subdirs.append(entry.path)
+                else:
+                    yield entry
+        except OSError:
+            continue
+        # Reversed, so that subdirectories are popped (and scanned) in the order they were found
+        dirs_to_scan.extend(reversed(subdirs))
+
+def link_file(src, dst):
+    """Make dst (overwriting it if it exists) hold the same content as src without duplicating it where possible:
+    dst is a hard link to src if the filesystem allows it, otherwise a reflink (a copy-on-write clone)
+    if the filesystem supports them, otherwise a plain copy. Return 'hardlink', 'reflink' or 'copy'.
+    """
+    # Linked to a temporary name first, as links can't overwrite their destination
+    tmp_path = '{}.{}.tmp'.format(dst, os.getpid())
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        pass
+    else:
+        replace_file(tmp_path, dst)
+        return 'hardlink'
+
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        try:
+            if fcntl is None: # pragma: no cover
+                raise IOError('reflinks are not supported')
+            fcntl.ioctl(fout.fileno(), _FICLONE, fin.fileno())
+            return 'reflink'
+        except (OSError, IOError):
+            shutil.copyfileobj(fin, fout)
+            return 'copy'
+
+def replace_file(src, dst):
+    """Rename src to dst, overwriting dst if it exists.
+    The rename is atomic, so readers of dst never see a partially written file.
+    """
+    os.replace(src, dst)
 
 def set_outdir(args_outdir, indir, input_isdir=False):
     """Set output directory based on whether a custom outside directory was provided or not, and return it."""
@@ -65,12 +210,17 @@ def set_outdir(args_outdir, indir, input_isdir=False):
     else:
         outdir = args_outdir
     # Create outdir
-    # (exist_ok=True flag in os.makedirs is not used, as it's not present in Python 2.x)
-    if not os.path.exists(outdir):
-        os.makedirs(outdir)
+    os.makedirs(outdir, exist_ok=True)
     return outdir
 
 def write_str_to_file(text, outfile):
-    """Write input text string to a file."""
-    with open(outfile, "w") as fout:
-        fout.write(text)
\ No newline at end of file
+    """Write input text string to a file, UTF-8 encoded (whatever the locale) and without translating newlines,
+    so that it holds the same bytes write_bytes_to_file would.
+    """
+    with io.open(outfile, 'w', encoding='utf-8', newline='') as fout:
+        fout.write(text)
+
+def write_bytes_to_file(data, outfile):
+    """Write UTF-8 encoded text (a bytes-like object, e.g. a memoryview) to a file as it is."""
+    with open(outfile, 'wb') as fout:
+        fout.write(data)
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""utils/filetype.py - File type detection for parsa
+
+Functions:
+    sniff_extension - detect a file's type from its content, returning the matching extension
+    _sniff_zip - detect the type of a zip-based document
+    _sniff_ole - detect the type of an OLE2 (legacy Microsoft Office) document
+    _is_mpeg_frame_header - check whether data starts with a valid MPEG audio frame header
+    _is_text - check whether a chunk of data looks like text
+"""
+
+import codecs
+import struct
+
+# Number of bytes read from the beginning of a file to detect its type
+SNIFF_SIZE = 8192
+
+# Magic numbers found at the beginning of files, mapped to the extension of their type.
+# Checked in order, so longer signatures must come before any shorter prefix of theirs.
+_SIGNATURES = [
+    (b'%PDF-', '.pdf'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+    (b'II*\x00', '.tiff'),
+    (b'MM\x00*', '.tiff'),
+    (b'OggS', '.ogg'),
+    (b'ID3', '.mp3'),
+    (b'{\\rtf', '.rtf'),
+    (b'%!PS', '.ps'),
+]
+
+# Entries of zip-based documents that identify their type, mapped to its extension
+_ZIP_MARKERS = [
+    (b'mimetypeapplication/epub+zip', '.epub'),
+    (b'mimetypeapplication/vnd.oasis.opendocument.text', '.odt'),
+    (b'mimetypeapplication/vnd.oasis.opendocument.spreadsheet', '.ods'),
+    (b'word/', '.docx'),
+    (b'xl/', '.xlsx'),
+    (b'ppt/', '.pptx'),
+]
+
+# Stream names (UTF-16) found in the directory of OLE2 documents, mapped to their type's extension
+_OLE_MARKERS = [
+    ('WordDocument'.encode('utf-16-le'), '.doc'),
+    ('Workbook'.encode('utf-16-le'), '.xls'),
+    ('Book'.encode('utf-16-le'), '.xls'),
+    ('__substg1.0_'.encode('utf-16-le'), '.msg'),
+]
+
+_ZIP_SIGNATURE = b'PK\x03\x04'
+_OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+# The central directory of a zip file is at its end, so the tail is read as well if the head isn't enough
+_ZIP_TAIL_SIZE = 65536
+# Byte order marks of UTF-16 text; the little-endian one also looks like an MPEG frame sync
+_UTF16_BOMS = (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+
+def sniff_extension(infile):
+    """Detect infile's type from its content, returning the matching extension (e.g. '.pdf'),
+    or None if the type could not be detected.
+
+    Only the first SNIFF_SIZE bytes of infile are read, except for zip and OLE2 containers,
+    whose directory (at a known offset) is read as well to tell their document types apart.
+    """
+    try:
+        with open(infile, 'rb') as fin:
+            head = fin.read(SNIFF_SIZE)
+            if head.startswith(_ZIP_SIGNATURE):
+                return _sniff_zip(fin, head)
+            if head.startswith(_OLE_SIGNATURE):
+                return _sniff_ole(fin, head)
+    except (OSError, IOError):
+        return None
+
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    # RIFF containers hold their format 8 bytes in
+    if head.startswith(b'RIFF') and head[8:12] == b'WAVE':
+        return '.wav'
+    # UTF-16 text isn't detected (it isn't UTF-8), but must not be mistaken for MP3 either
+    if head.startswith(_UTF16_BOMS):
+        return None
+    # MP3 files without an ID3 tag start with an MPEG frame header
+    if _is_mpeg_frame_header(head):
+        return '.mp3'
+
+    start = head.lstrip()[:64].lower()
+    if start.startswith(b'<!doctype html') or start.startswith(b'<html'):
+        return '.html'
+    if head and _is_text(head, is_complete=len(head) < SNIFF_SIZE):
+        return '.txt'
+    return None
+
+def _sniff_zip(fin, head):
+    """Detect the type of a zip-based document from its head, or from its central directory if needed."""
+    for marker, extension in _ZIP_MARKERS:
+        if marker in head:
+            return extension
+    fin.seek(0, 2)
+    size = fin.tell()
+    fin.seek(max(0, size - _ZIP_TAIL_SIZE))
+    tail = fin.read()
+    for marker, extension in _ZIP_MARKERS:
+        # The central directory holds entry names only, so mimetype markers can't be found there
+        if marker in tail:
+            return extension
+    return None
+
+def _sniff_ole(fin, head):
+    """Detect the type of an OLE2 document from the first sector of its directory."""
+    # Too short to hold the OLE2 header
+    if len(head) < 512:
+        return None
+    # The sector size is stored as a power of two at offset 30,
+    # and the first sector of the directory at offset 48
+    sector_shift, = struct.unpack('<H', head[30:32])
+    first_directory_sector, = struct.unpack('<I', head[48:52])
+    # Only 512 and 4096 byte sectors exist; anything else is not an OLE2 document
+    if sector_shift not in (9, 12):
+        return None
+    sector_size = 1 << sector_shift
+    # Sectors are numbered from the end of the header, which takes one sector
+    fin.seek((first_directory_sector + 1) * sector_size)
+    directory = fin.read(sector_size)
+    for marker, extension in _OLE_MARKERS:
+        if marker in directory:
+            return extension
+    return None
+
+def _is_mpeg_frame_header(data):
+    """Return True if data starts with an MPEG audio frame header: an 11-bit frame sync,
+    followed by version, layer, bitrate and sample rate fields that don't hold reserved values.
+    """
+    if len(data) < 3:
+        return False
+    second, third = bytearray(data[1:3])
+    if data[0:1] != b'\xff' or (second & 0xe0) != 0xe0:
+        return False
+    version = (second >> 3) & 0x3
+    layer = (second >> 1) & 0x3
+    bitrate_index = third >> 4
+    sample_rate_index = (third >> 2) & 0x3
+    return version != 1 and layer != 0 and bitrate_index != 0xf and sample_rate_index != 3
+
+def _is_text(data, is_complete=False):
+    """Return True if data looks like UTF-8 text (it decodes, and has no NUL bytes).
+    If is_complete is not set, data may end halfway through a multi-byte character.
+    """
+    if b'\x00' in data:
+        return False
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        decoder.decode(data, final=is_complete)
+    except UnicodeDecodeError:
+        return False
+    return True
@@ -0,0 +1,117 @@
+"""utils/filters.py - Walk-time filtering of parsa's inputs
+
+Classes:
+    FileFilter - decide which files of the input folder are extracted, and which subfolders are walked at all
+"""
+
+import fnmatch
+import os
+import re
+
+class FileFilter(object):
+    """Decide, while the input folder indir is being walked, which files are extracted (accept)
+    and which subfolders are not walked at all (prune), so that excluded trees cost a single directory entry.
+
+    Glob patterns (as in fnmatch) containing a slash are matched against the path relative to indir
+    (with forward slashes, e.g. 'docs/*.pdf'); the others are matched against the file or folder name
+    (e.g. '.git' or '*.tmp'). A file is accepted if:
+        - it matches one of include, if include is given, and none of exclude;
+        - its size is between min_size and max_size (in bytes, inclusive), if they're given;
+        - its extension is in extensions, if it's given, and not in exclude_extensions
+          (extensions are compared in lowercase, with or without their leading dot; '' stands for no extension);
+        - it belongs to shard (a sharding.Shard), if it's given.
+    A folder is pruned if it matches one of exclude, or if it is one of exclude_dirs
+    (e.g. parsa's own output folder, when it's inside indir).
+    """
+
+    def __init__(self, indir, include=None, exclude=None, min_size=None, max_size=None, extensions=None,
+                 exclude_extensions=None, exclude_dirs=None, shard=None):
+        # Prefix of the paths of the walked entries (which are joined to indir as it was given)
+        self._prefix = os.path.join(indir, '')
+        self._include = _compile_globs(include)
+        self._exclude = _compile_globs(exclude)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.extensions = _normalise_extensions(extensions)
+        self.exclude_extensions = _normalise_extensions(exclude_extensions) or frozenset()
+        self.shard = shard
+        # Excluded folders by inode number, which DirEntry knows without a stat call (confirmed with samefile)
+        self._exclude_dirs = {}
+        for path in exclude_dirs or []:
+            try:
+                self._exclude_dirs.setdefault(os.stat(path).st_ino, []).append(path)
+            except OSError:
+                continue
+
+    def prune(self, entry):
+        """Return True if the folder entry (a DirEntry) must not be walked."""
+        if self._exclude is not None and self._matches(self._exclude, entry):
+            return True
+        for path in self._exclude_dirs.get(entry.inode(), ()):
+            try:
+                if os.path.samefile(entry.path, path):
+                    return True
+            except OSError:
+                continue
+        return False
+
+    def accept(self, entry):
+        """Return True if the file entry (a DirEntry) must be extracted."""
+        extension = os.path.splitext(entry.name)[1].lower()
+        if self.extensions is not None and extension not in self.extensions:
+            return False
+        if extension in self.exclude_extensions:
+            return False
+        if self._include is not None and not self._matches(self._include, entry):
+            return False
+        if self._exclude is not None and self._matches(self._exclude, entry):
+            return False
+        if self.min_size is not None or self.max_size is not None:
+            # DirEntry caches the stat result, so callers that need it don't stat the file again
+            try:
+                size = entry.stat().st_size
+            except OSError:
+                # Let the extraction report the error
+                return True
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+        if self.shard is not None and not self.shard.contains(self.relpath(entry)):
+            return False
+        return True
+
+    def relpath(self, entry):
+        """Return the path of entry (a DirEntry) relative to indir, with forward slashes."""
+        relpath = entry.path[len(self._prefix):] if entry.path.startswith(self._prefix) else entry.path
+        return relpath.replace(os.sep, '/')
+
+    def _matches(self, globs, entry):
+        """Return True if entry matches globs, a (name pattern, relative path pattern) pair."""
+        name_pattern, path_pattern = globs
+        if name_pattern is not None and name_pattern.match(entry.name):
+            return True
+        if path_pattern is not None:
+            return path_pattern.match(self.relpath(entry)) is not None
+        return False
+
+def _compile_globs(globs):
+    """Compile globs into a (name pattern, relative path pattern) pair of regular expressions
+    (each None if there are no globs of its kind), or return None if there are no globs at all.
+    """
+    if not globs:
+        return None
+    name_globs = [glob for glob in globs if '/' not in glob]
+    path_globs = [glob.lstrip('/') for glob in globs if '/' in glob]
+    # A single regular expression per kind, so that matching costs one call however many globs there are
+    compile_globs = lambda globs: re.compile('|'.join(fnmatch.translate(glob) for glob in globs)) if globs else None
+    return compile_globs(name_globs), compile_globs(path_globs)
+
+def _normalise_extensions(extensions):
+    """Return extensions as a frozenset of lowercase extensions with a leading dot (or '' for no extension),
+    or None if extensions is None.
+    """
+    if extensions is None:
+        return None
+    return frozenset('.' + extension.lower().lstrip('.') if extension.lstrip('.') else ''
+                     for extension in extensions)
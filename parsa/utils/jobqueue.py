@@ -0,0 +1,180 @@
+"""utils/jobqueue.py - SQLite job queue shared by parsa worker processes
+
+Classes:
+    Job - a claimed job: its ID and input file
+    JobQueue - SQLite-backed queue of input files, claimed with expiring leases by any number of workers
+
+Functions:
+    worker_id - return an identifier of the current process, unique across the machines sharing a queue
+"""
+
+import collections
+import os
+import socket
+import sqlite3
+import time
+
+# States of a job
+PENDING = 'pending'
+CLAIMED = 'claimed'
+DONE = 'done'
+FAILED = 'failed'
+
+# Number of times a job may be claimed before it's given up on (its workers died while extracting it)
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Seconds a connection waits for another process's lock on the database before giving up
+_BUSY_TIMEOUT = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    input TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    output TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+Job = collections.namedtuple('Job', ['id', 'input'])
+
+class JobQueue(object):
+    """Queue of input files stored in a SQLite database at path, shared by any number of worker processes
+    (on one machine, or on several machines sharing a filesystem with working locks).
+
+    A producer adds jobs (see add) and marks the queue as filled once every input has been added;
+    workers claim jobs (see claim), which leases them for lease seconds, renew the leases of the jobs
+    they're still extracting (see renew), and mark each job as done or failed (see finish).
+    A job whose lease expires (e.g. because its worker died) can be claimed by another worker,
+    until it has been claimed max_attempts times, after which it's marked as failed.
+
+    Every change is a single transaction, so a crash never leaves the queue half-updated:
+    rerunning the producer only adds the inputs that aren't in the queue yet, and restarted workers
+    pick up the jobs that were pending or whose leases have expired.
+    """
+
+    def __init__(self, path, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        # Autocommit mode: transactions are started explicitly, so that claims take the write lock up front
+        self._conn = sqlite3.connect(path, timeout=_BUSY_TIMEOUT, isolation_level=None)
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, inputs):
+        """Add a pending job for every input file in inputs (an iterable) that isn't in the queue yet,
+        and return the number of jobs added.
+        """
+        with self._transaction():
+            before = self._conn.total_changes
+            self._conn.executemany('INSERT OR IGNORE INTO jobs (input) VALUES (?)',
+                                   ((infile,) for infile in inputs))
+            return self._conn.total_changes - before
+
+    def claim(self, worker, lease, limit=1):
+        """Claim up to limit jobs (pending ones, or claimed ones whose lease has expired) for worker,
+        leasing them for lease seconds, and return them as a list of Jobs (empty if there are none to claim).
+        """
+        now = time.time()
+        with self._transaction():
+            # Jobs abandoned too many times are given up on, rather than crashing yet another worker
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ? WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, 'abandoned by {} workers'.format(self.max_attempts), CLAIMED, now, self.max_attempts))
+            rows = self._conn.execute(
+                'SELECT id, input FROM jobs WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY id LIMIT ?',
+                (PENDING, CLAIMED, now, limit)).fetchall()
+            self._conn.executemany(
+                'UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?',
+                ((CLAIMED, worker, now + lease, job_id) for job_id, _ in rows))
+        return [Job(job_id, infile) for job_id, infile in rows]
+
+    def renew(self, worker, job_ids, lease):
+        """Extend the leases worker holds on the jobs with the given IDs to lease seconds from now."""
+        with self._transaction():
+            self._conn.executemany('UPDATE jobs SET lease_expires = ? WHERE id = ? AND state = ? AND worker = ?',
+                                   ((time.time() + lease, job_id, CLAIMED, worker) for job_id in job_ids))
+
+    def finish(self, worker, job_id, output=None, error=None):
+        """Mark the job with the given ID, claimed by worker, as done (recording its output file, if any),
+        or as failed if error is not None. Return False if worker doesn't hold the job anymore
+        (its lease expired and another worker claimed it), in which case the job is left as it is.
+        """
+        with self._transaction():
+            cursor = self._conn.execute(
+                'UPDATE jobs SET state = ?, output = ?, error = ?, lease_expires = NULL '
+                'WHERE id = ? AND state = ? AND worker = ?',
+                (FAILED if error is not None else DONE, output, error, job_id, CLAIMED, worker))
+            return cursor.rowcount == 1
+
+    def counts(self):
+        """Return a dict mapping each job state to the number of jobs in it."""
+        counts = dict((state, 0) for state in (PENDING, CLAIMED, DONE, FAILED))
+        counts.update(self._conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+        return counts
+
+    def unfinished(self):
+        """Return the number of jobs that are neither done nor failed."""
+        return self._conn.execute('SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)', (PENDING, CLAIMED)).fetchone()[0]
+
+    def set_setting(self, key, value):
+        """Store a setting of the run (e.g. its output folder) for the workers."""
+        with self._transaction():
+            self._conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, value))
+
+    def get_setting(self, key, default=None):
+        """Return the setting stored under key, or default if there is none."""
+        row = self._conn.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else default
+
+    def mark_filled(self):
+        """Record that every input has been added, so that workers stop once the queue is drained."""
+        self.set_setting('filled', '1')
+
+    def is_filled(self):
+        """Return True if every input has been added (see mark_filled)."""
+        return self.get_setting('filled') == '1'
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _transaction(self):
+        """Return a context manager running its block in a write transaction (committed, or rolled back on error)."""
+        return _Transaction(self._conn)
+
+class _Transaction(object):
+    """Write transaction on a SQLite connection in autocommit mode.
+    BEGIN IMMEDIATE takes the write lock up front, so that two workers can't both read the same pending job
+    before either of them marks it as claimed.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.conn.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        return False
+
+def worker_id():
+    """Return an identifier of the current process (host name and process ID),
+    unique across the machines sharing a queue.
+    """
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
@@ -0,0 +1,98 @@
+"""utils/manifest.py - Manifest of processed inputs, used by parsa's incremental mode
+
+Classes:
+    Manifest - record of the inputs processed in previous runs and the outputs they produced
+
+Constants:
+    MANIFEST_FILENAME - name of the manifest file stored in the output directory
+"""
+
+import json
+import os
+
+from parsa.utils import filesystem as fs
+
+MANIFEST_FILENAME = 'parsamanifest.json'
+
+# Bumped whenever the manifest's layout changes; manifests with a different version are ignored
+_MANIFEST_VERSION = 1
+
+class Manifest(object):
+    """Record of the inputs processed in previous runs, stored as JSON in the output directory.
+
+    Each input (keyed by its absolute path) is stored with its size, modification time,
+    content hash (only if use_hash is set) and the output file its text was written to
+    (None if no text was extracted from it).
+
+    An input is unchanged if its size and modification time match the recorded ones.
+    If use_hash is set, an input whose modification time changed but whose size did not
+    is also unchanged if its content hash matches the recorded one.
+    """
+
+    def __init__(self, outdir, use_hash=False):
+        self.path = os.path.join(outdir, MANIFEST_FILENAME)
+        self.use_hash = use_hash
+        self.files = {}
+        self.load()
+
+    def load(self):
+        """Load the manifest from the output directory, starting from an empty one if it can't be read."""
+        try:
+            with open(self.path, 'r') as fin:
+                manifest = json.load(fin)
+        except (OSError, IOError, ValueError):
+            return
+        if manifest.get('version') == _MANIFEST_VERSION:
+            self.files = manifest.get('files', {})
+
+    def save(self):
+        """Write the manifest to the output directory.
+        The manifest is written to a temporary file first, so that an interrupted write can't corrupt it.
+        """
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fout:
+            json.dump({'version': _MANIFEST_VERSION, 'files': self.files}, fout)
+        fs.replace_file(tmp_path, self.path)
+
+    def is_unchanged(self, infile, stat=None):
+        """Return True if infile has already been processed and hasn't changed since.
+        stat is infile's os.stat result; if it's not provided, infile is stat'ed again.
+        """
+        record = self.files.get(os.path.abspath(infile))
+        if record is None:
+            return False
+        # The input has to be processed again if its output has been removed
+        if record['output'] is not None and not os.path.exists(record['output']):
+            return False
+        if stat is None:
+            stat = os.stat(infile)
+        if record['size'] != stat.st_size:
+            return False
+        if record['mtime'] == stat.st_mtime_ns:
+            return True
+        if self.use_hash and record.get('hash') is not None:
+            if record['hash'] == fs.hash_file(infile):
+                # Remember the new modification time, so the file doesn't need hashing next time
+                record['mtime'] = stat.st_mtime_ns
+                return True
+        return False
+
+    def get_output(self, infile):
+        """Return the output file recorded for infile, or None if there isn't one."""
+        record = self.files.get(os.path.abspath(infile))
+        if record is None:
+            return None
+        return record['output']
+
+    def record(self, infile, outfile, stat=None):
+        """Record that infile has been processed, with its text written to outfile (None if there was no text).
+        stat is infile's os.stat result at the time it was processed; if it's not provided, infile is stat'ed again.
+        """
+        if stat is None:
+            stat = os.stat(infile)
+        self.files[os.path.abspath(infile)] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'hash': fs.hash_file(infile) if self.use_hash else None,
+            'output': os.path.abspath(outfile) if outfile is not None else None,
+        }
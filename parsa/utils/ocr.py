@@ -0,0 +1,59 @@
+"""utils/ocr.py - Batched OCR of images, so that tesseract starts (and loads its language data) once per batch
+
+Functions:
+    batchable - return whether a file may be OCRed as part of a batch
+    ocr_batch - OCR several images with a single tesseract invocation, returning the text of each
+    _split_pages - split tesseract's output for a batch into the output of each image
+
+Constants:
+    BATCH_EXTENSIONS - extensions of the images that are OCRed in batches
+"""
+
+import os
+import tempfile
+
+# Single-page formats that textract hands to tesseract as they are. TIFFs may hold several pages, and textract
+# converts animated GIFs first, so neither maps to a single page of a batch's output.
+BATCH_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# tesseract's default page separator, written after each image's text
+_PAGE_SEPARATOR = b'\x0c'
+
+def batchable(infile):
+    """Return True if infile may be OCRed as part of a batch (see ocr_batch)."""
+    # Paths are listed one per line, so a path holding a line break can't be
+    return os.path.splitext(infile)[1].lower() in BATCH_EXTENSIONS and '\n' not in infile and '\r' not in infile
+
+def ocr_batch(infiles):
+    """OCR the images infiles with a single tesseract invocation, and return the text of each image, as
+    textract.process returns it for that image alone (UTF-8 encoded).
+
+    tesseract reads the images from a list file, and separates their texts with its page separator.
+    It stops at the first image it can't read, and textract's parser raises ShellError when it does
+    (as it does when tesseract isn't installed), so that the caller can fall back to OCRing each image alone.
+    """
+    from textract.parsers.image import Parser
+
+    parser = Parser()
+    handle, listfile = tempfile.mkstemp(suffix='.txt')
+    try:
+        with os.fdopen(handle, 'wb') as fout:
+            fout.write(b''.join(os.fsencode(os.path.abspath(infile)) + b'\n' for infile in infiles))
+        stdout, _ = parser.run(['tesseract', listfile, 'stdout'])
+    finally:
+        os.remove(listfile)
+    # Each image's text is decoded on its own, as textract decodes the output of a single image
+    return [parser.encode(parser.decode(page), 'utf8') for page in _split_pages(stdout, len(infiles))]
+
+def _split_pages(output, count):
+    """Split output, tesseract's output for a batch of count images, into the output of each image,
+    raising ValueError if it doesn't hold count pages.
+    """
+    pages = output.split(_PAGE_SEPARATOR)
+    # Most versions write the separator after every page (including the last, and a single image's)
+    if len(pages) == count + 1 and not pages[-1]:
+        return [page + _PAGE_SEPARATOR for page in pages[:-1]]
+    # Others only write it between pages
+    if len(pages) == count:
+        return pages
+    raise ValueError('tesseract returned {} pages for {} images'.format(len(pages), count))
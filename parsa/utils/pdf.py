@@ -0,0 +1,120 @@
+"""utils/pdf.py - Page-range extraction of large PDFs, so that several workers can extract one at once
+
+Functions:
+    splittable - return whether a file may be split into page ranges, judging by its name and size alone
+    page_ranges - split a PDF into ranges of pages, if it's large enough for that to pay off
+    count_pages - return the number of pages of a PDF
+    extract_pages - extract the text of a range of pages of a PDF, the way textract extracts whole PDFs
+    join_pages - join the texts of consecutive page ranges into the text textract returns for the whole PDF
+    _page_range_parser - return textract's PDF parser, limited to a range of pages
+
+Constants:
+    MIN_SPLIT_SIZE - size in bytes below which PDFs are never split
+"""
+
+import os
+
+MIN_SPLIT_SIZE = 1024 * 1024
+
+def splittable(infile, min_size=None):
+    """Return True if infile may be split into page ranges (see page_ranges), judging by its name and size alone
+    (without reading it): if it's a .pdf file of at least min_size bytes (MIN_SPLIT_SIZE by default).
+    """
+    if os.path.splitext(infile)[1].lower() != '.pdf':
+        return False
+    try:
+        return os.path.getsize(infile) >= (MIN_SPLIT_SIZE if min_size is None else min_size)
+    except OSError:
+        return False
+
+def page_ranges(infile, pages_per_range, min_size=None):
+    """Return the (first, last) page ranges (1-based and inclusive) of at most pages_per_range pages
+    that infile is split into, or None if infile shouldn't be split: if it's not a .pdf file, if it's smaller
+    than min_size bytes (MIN_SPLIT_SIZE by default), if it has fewer than two ranges' worth of pages, or if its
+    pages can't be counted (in which case textract reports the problem, as it does for any PDF).
+    """
+    if not splittable(infile, min_size):
+        return None
+    try:
+        page_count = count_pages(infile)
+    except Exception:
+        return None
+    if page_count < 2 * pages_per_range:
+        return None
+    return [(first, min(first + pages_per_range - 1, page_count))
+            for first in range(1, page_count + 1, pages_per_range)]
+
+def count_pages(infile):
+    """Return the number of pages of infile, read from its page tree (without parsing any page).
+
+    Pages are counted by the process handing files out to workers, outside of the run's time and memory limits,
+    so only a well-formed cross-reference table is read: pdfminer's fallback of scanning the whole file for
+    objects (which malformed PDFs trigger) is disabled, and such PDFs raise instead, as do PDFs claiming more
+    pages than they have bytes. They're then extracted whole, by a worker, under the run's limits.
+    """
+    # pdfminer is one of textract's dependencies; like textract, it's only imported when it's needed
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    with open(infile, 'rb') as fin:
+        document = PDFDocument(PDFParser(fin), fallback=False)
+        page_count = int(resolve1(resolve1(document.catalog['Pages'])['Count']))
+        if not 0 < page_count <= os.fstat(fin.fileno()).st_size:
+            raise ValueError('implausible page count: {}'.format(page_count))
+    return page_count
+
+def extract_pages(infile, first, last):
+    """Extract the text of pages first to last (1-based and inclusive) of infile, with the installed textract's
+    own PDF parser (see _PageRangeParser), so that it runs the program it runs for whole PDFs (pdftotext,
+    or pdfminer if pdftotext isn't installed) with the same options.
+    The text is returned as that parser returns it, to be joined with join_pages.
+    """
+    return _page_range_parser(first, last).extract(infile)
+
+def _page_range_parser(first, last):
+    """Return an instance of _PageRangeParser, limited to pages first to last."""
+    from textract.parsers.pdf_parser import Parser
+
+    class _PageRangeParser(Parser):
+        """textract's PDF parser, with the extraction limited to a range of pages. The commands the parser
+        builds are passed through with the range's options added, so whatever else textract's release
+        passes (such as pdftotext's encoding) is kept.
+        """
+
+        def run(self, args):
+            program = os.path.basename(args[0]) if args else None
+            if program == 'pdftotext':
+                args = [args[0], '-f', str(first), '-l', str(last)] + list(args[1:])
+            elif program == 'pdf2txt.py':
+                # pdfminer's command-line tool, which older textract releases fall back to
+                pages = ','.join(str(page) for page in range(first, last + 1))
+                args = [args[0], '-p', pages, '-m', str(last)] + list(args[1:])
+            return super(_PageRangeParser, self).run(args)
+
+        def extract_pdfminer(self, filename, **kwargs):
+            try:
+                from pdfminer.high_level import extract_text
+            except ImportError:
+                # pdfminer releases without it come with textract releases that run pdf2txt.py (see run)
+                return super(_PageRangeParser, self).extract_pdfminer(filename, **kwargs)
+            # Newer textract releases call extract_text in-process, which this mirrors for the range.
+            # Pages after the range aren't even read.
+            return extract_text(filename, page_numbers=range(first - 1, last), maxpages=last).encode('utf-8')
+
+    return _PageRangeParser()
+
+def join_pages(parts):
+    """Join parts, the texts of consecutive page ranges of a PDF (see extract_pages), and return the text
+    textract.process returns for the whole PDF: both programs end every page with a form feed,
+    so the text of the whole PDF is the concatenation of its ranges', which textract's parser then decodes
+    and encodes as a whole.
+    """
+    from textract.parsers.pdf_parser import Parser
+
+    if all(isinstance(part, str) for part in parts):
+        text = ''.join(parts)
+    else:
+        text = b''.join(part.encode('utf-8') if isinstance(part, str) else part for part in parts)
+    parser = Parser()
+    return parser.encode(parser.decode(text), 'utf8')
@@ -0,0 +1,201 @@
+"""utils/profiling.py - Per-phase profiling of parsa's pipeline
+
+The pipeline is split into phases, each profiled separately with cProfile:
+    discovery - walking the input folder
+    extraction - extracting text from each file (including waiting for worker processes)
+    post-processing - decoding and cleaning up the extracted text
+    output - naming and writing the output files, and recording failures
+    other - everything else (parsing arguments, loading and saving the manifest, ...)
+
+Profiling is process-wide: once start has been called, the phase context manager switches
+the running profile; otherwise it does nothing, so callers don't need to check whether profiling is enabled.
+Worker processes profile themselves (see start_worker and stop_worker), and their profiles are merged
+into the main process's ones by stop.
+
+Classes:
+    PhaseProfiler - set of cProfile profiles, one per phase, of which at most one runs at a time
+
+Functions:
+    start - start profiling the current process, writing profiles to a folder
+    stop - stop profiling, merge the profiles of every process and write them
+    start_worker - start profiling a worker process
+    stop_worker - stop profiling a worker process and write its profiles
+    active_profiledir - return the folder profiles are written to, or None if profiling is disabled
+    phase - context manager attributing the time spent inside it to a phase
+    iterate - iterate over an iterable, attributing the time spent producing each item to a phase
+    summarize - return a short summary of the hottest functions of the written profiles
+"""
+
+import contextlib
+import cProfile
+import glob
+import os
+import pstats
+
+PHASES = ['discovery', 'extraction', 'post-processing', 'output', 'other']
+
+# Extension of the profile files (loadable with pstats, snakeviz, gprof2dot, ...)
+PROFILE_SUFFIX = '.prof'
+
+# Profiler of the current process, or None if profiling is disabled
+_active = None
+
+class PhaseProfiler(object):
+    """Set of cProfile profiles, one per phase; entering a phase pauses the enclosing one,
+    so that each call is only counted in the innermost phase.
+    """
+
+    def __init__(self, profiledir):
+        self.profiledir = profiledir
+        self.profiles = {}
+        self._stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Profile the with block as part of phase name."""
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def enter(self, name):
+        """Pause the running profile and start (or resume) the profile of phase name."""
+        if self._stack:
+            self.profiles[self._stack[-1]].disable()
+        if name not in self.profiles:
+            self.profiles[name] = cProfile.Profile()
+        self._stack.append(name)
+        self.profiles[name].enable()
+
+    def exit(self):
+        """Stop the profile of the current phase and resume the enclosing one."""
+        self.profiles[self._stack.pop()].disable()
+        if self._stack:
+            self.profiles[self._stack[-1]].enable()
+
+    def pause(self):
+        """Stop the running profile, if any (e.g. in a forked child, which inherits its parent's)."""
+        if self._stack:
+            self.profiles[self._stack[-1]].disable()
+            self._stack = []
+
+    def dump(self, suffix=''):
+        """Write the profile of each phase to <phase><suffix>.prof inside profiledir."""
+        for name, profile in self.profiles.items():
+            profile.create_stats()
+            # Phases that were entered but never called anything have no stats to write
+            if profile.stats:
+                profile.dump_stats(os.path.join(self.profiledir, name + suffix + PROFILE_SUFFIX))
+
+def start(profiledir):
+    """Start profiling the current process; profiles are written inside profiledir (created if needed) by stop.
+    Everything until stop is attributed to the 'other' phase, unless it's inside a more specific phase.
+    """
+    global _active
+    if not os.path.isdir(profiledir):
+        os.makedirs(profiledir)
+    # Remove the profiles of a previous run, so that they aren't merged into this one
+    for name in PHASES:
+        for path in _phase_profiles(profiledir, name) + [os.path.join(profiledir, name + PROFILE_SUFFIX)]:
+            if os.path.exists(path):
+                os.remove(path)
+    _active = PhaseProfiler(profiledir)
+    _active.enter('other')
+
+def stop():
+    """Stop profiling the current process, and write the profile of each phase to <phase>.prof inside profiledir,
+    merged with the profiles written by worker processes (which are removed). Return the profile folder.
+    """
+    global _active
+    profiler = _active
+    _active = None
+    profiler.pause()
+    profiler.dump('.main')
+    for name in PHASES:
+        paths = _phase_profiles(profiler.profiledir, name)
+        if not paths:
+            continue
+        stats = pstats.Stats(*paths)
+        stats.dump_stats(os.path.join(profiler.profiledir, name + PROFILE_SUFFIX))
+        for path in paths:
+            os.remove(path)
+    return profiler.profiledir
+
+def start_worker(profiledir):
+    """Start profiling a worker process, discarding any profile inherited from its parent
+    (if profiledir is None, the worker is not profiled).
+    """
+    global _active
+    if _active is not None:
+        _active.pause()
+    _active = PhaseProfiler(profiledir) if profiledir is not None else None
+
+def stop_worker():
+    """Stop profiling a worker process, and write its profiles to <phase>.<pid>.prof inside profiledir."""
+    global _active
+    if _active is None:
+        return
+    profiler = _active
+    _active = None
+    profiler.pause()
+    profiler.dump('.' + str(os.getpid()))
+
+def active_profiledir():
+    """Return the folder the current process's profiles are written to, or None if profiling is disabled."""
+    return _active.profiledir if _active is not None else None
+
+def phase(name):
+    """Return a context manager attributing the time spent inside it to phase name, if profiling is enabled."""
+    if _active is None:
+        return _null_context()
+    return _active.phase(name)
+
+def iterate(iterable, name):
+    """Iterate over iterable, attributing the time spent producing each item to phase name
+    (but not the time the caller spends on it).
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def summarize(profiledir, top=10):
+    """Return a short summary of the profiles written to profiledir by stop:
+    the time spent in each phase, and the top functions by internal time across all phases.
+    """
+    lines = []
+    merged = None
+    for name in PHASES:
+        path = os.path.join(profiledir, name + PROFILE_SUFFIX)
+        if not os.path.exists(path):
+            continue
+        stats = pstats.Stats(path)
+        lines.append('{:<16} {:>10.3f} s  ({})'.format(name, stats.total_tt, path))
+        if merged is None:
+            merged = stats
+        else:
+            merged.add(stats)
+    if merged is None:
+        return 'No profile was recorded'
+
+    lines.append('')
+    lines.append('{:>10} {:>10} {:>10}  {}'.format('calls', 'tottime', 'cumtime', 'function'))
+    # stats maps (filename, line, function) to (primitive calls, calls, internal time, cumulative time, callers)
+    hotspots = sorted(merged.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    for (filename, line, function), (_, calls, tottime, cumtime, _) in hotspots:
+        lines.append('{:>10} {:>10.3f} {:>10.3f}  {}:{}({})'.format(calls, tottime, cumtime,
+                                                                   filename, line, function))
+    return '\n'.join(lines)
+
+def _phase_profiles(profiledir, name):
+    """Return the paths of the per-process profiles (<phase>.<process>.prof) of phase name inside profiledir."""
+    return sorted(glob.glob(os.path.join(profiledir, name + '.*' + PROFILE_SUFFIX)))
+
+@contextlib.contextmanager
+def _null_context():
+    yield
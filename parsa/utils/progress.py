@@ -0,0 +1,189 @@
+"""utils/progress.py - Progress and throughput reporting for parsa
+
+Classes:
+    Progress - counters of a run's progress, reported periodically by a background thread
+
+Functions:
+    format_duration - format a number of seconds as H:MM:SS
+"""
+
+import json
+import os
+import sys
+import threading
+
+from parsa.utils import trace as tr
+
+class Progress(object):
+    """Counters of a run's progress, reported to stream every interval seconds by a background thread.
+
+    The extraction loop only updates counters (started, finished, skipped), so reporting costs nothing
+    on the hot path, and a file that takes a long time to extract doesn't stop the display from updating.
+
+    If stream is a terminal, progress is shown as a single line that is rewritten in place;
+    otherwise (or if machine_readable is set) a JSON line is written every interval (see snapshot).
+
+    The ETA is based on the bytes left of each file type: the time taken so far per byte of each type
+    is applied to the bytes of that type left to extract, and divided by the parallelism observed so far.
+    The totals are counted as the input folder is walked (see discovered), so the folder isn't walked twice;
+    until the walk is over (see discovery_finished), they only cover the files found so far,
+    and the ETA is a lower bound.
+    """
+
+    def __init__(self, stream=None, interval=1.0, machine_readable=None):
+        self.stream = stream if stream is not None else sys.stderr
+        self.interval = interval
+        if machine_readable is None:
+            machine_readable = not (hasattr(self.stream, 'isatty') and self.stream.isatty())
+        self.machine_readable = machine_readable
+
+        self.started_at = tr.clock()
+        self.files_started = 0
+        self.files_done = 0
+        self.files_failed = 0
+        self.bytes_done = 0
+        # Totals of the input found by the walk so far, by file type; final once discovery_done is set
+        self.total_files = 0
+        self.total_bytes_by_type = {}
+        self.discovery_done = False
+        # Files and bytes done, and extraction time spent (summed across workers), by file type
+        self.files_done_by_type = {}
+        self.bytes_done_by_type = {}
+        self.seconds_by_type = {}
+
+        self._stop = threading.Event()
+        self._reporter = None
+
+    def discovered(self, infile, size):
+        """Record that the walk of the input found infile (of size bytes), whether it's extracted or skipped."""
+        filetype = _filetype(infile)
+        self.total_bytes_by_type[filetype] = self.total_bytes_by_type.get(filetype, 0) + size
+        self.total_files += 1
+
+    def discovery_finished(self):
+        """Record that the walk of the input is over, so that the totals are final."""
+        self.discovery_done = True
+
+    def start(self):
+        """Start reporting progress every interval seconds."""
+        self._reporter = threading.Thread(target=self._report_periodically)
+        self._reporter.daemon = True
+        self._reporter.start()
+
+    def stop(self):
+        """Stop reporting progress, after reporting it one last time."""
+        self._stop.set()
+        if self._reporter is not None:
+            self._reporter.join()
+        self.report()
+        if not self.machine_readable:
+            self.stream.write('\n')
+            self.stream.flush()
+
+    def started(self, infile):
+        """Record that infile has been handed over to be extracted."""
+        self.files_started += 1
+
+    def finished(self, infile, size, seconds, failed=False):
+        """Record that infile (of size bytes) has been extracted in seconds (spent extracting it, not waiting)."""
+        filetype = _filetype(infile)
+        self.files_done += 1
+        self.bytes_done += size
+        if failed:
+            self.files_failed += 1
+        self.files_done_by_type[filetype] = self.files_done_by_type.get(filetype, 0) + 1
+        self.bytes_done_by_type[filetype] = self.bytes_done_by_type.get(filetype, 0) + size
+        self.seconds_by_type[filetype] = self.seconds_by_type.get(filetype, 0) + seconds
+
+    def skipped(self, infile, size):
+        """Record that infile (of size bytes) has been skipped (e.g. unchanged in incremental mode)."""
+        self.started(infile)
+        self.finished(infile, size, 0)
+
+    def snapshot(self):
+        """Return the current progress as a dict:
+            elapsed - seconds since the run started
+            files_done, files_failed, bytes_done - files extracted (or skipped) so far, failures among them,
+                                                   and their size
+            files_in_flight - files handed over to be extracted, but not done yet
+            files_total, bytes_total - totals of the input found so far
+            discovery_done - whether the input has been fully walked (so that the totals are final)
+            files_per_second, bytes_per_second - throughput so far
+            eta - estimated seconds left (None if it can't be estimated yet;
+                  a lower bound until discovery_done is set)
+        """
+        elapsed = tr.clock() - self.started_at
+        # Copied, as the walk may add file types while the reporting thread reads them
+        total_bytes_by_type = dict(self.total_bytes_by_type)
+        return {
+            'elapsed': round(elapsed, 3),
+            'files_done': self.files_done,
+            'files_failed': self.files_failed,
+            'bytes_done': self.bytes_done,
+            'files_in_flight': self.files_started - self.files_done,
+            'files_total': self.total_files,
+            'bytes_total': sum(total_bytes_by_type.values()),
+            'discovery_done': self.discovery_done,
+            'files_per_second': round(self.files_done / elapsed, 3) if elapsed > 0 else 0.0,
+            'bytes_per_second': round(self.bytes_done / elapsed, 1) if elapsed > 0 else 0.0,
+            'eta': self._eta(elapsed, total_bytes_by_type),
+        }
+
+    def report(self):
+        """Write the current progress to stream."""
+        snapshot = self.snapshot()
+        if self.machine_readable:
+            self.stream.write(json.dumps(snapshot, sort_keys=True) + '\n')
+        else:
+            # Pad the line, so that a shorter line fully overwrites the previous one
+            self.stream.write('\r' + _format_line(snapshot).ljust(79))
+        self.stream.flush()
+
+    def _report_periodically(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def _eta(self, elapsed, total_bytes_by_type):
+        """Return the estimated number of seconds left, or None if it can't be estimated yet."""
+        seconds_done = sum(self.seconds_by_type.values())
+        if not total_bytes_by_type or self.bytes_done == 0 or seconds_done == 0 or elapsed <= 0:
+            return None
+        # Time per byte of the types seen so far, falling back to the overall one for the others
+        overall_rate = seconds_done / float(self.bytes_done)
+        seconds_left = 0.0
+        for filetype, total_bytes in total_bytes_by_type.items():
+            bytes_done = self.bytes_done_by_type.get(filetype, 0)
+            bytes_left = max(0, total_bytes - bytes_done)
+            if bytes_done:
+                rate = self.seconds_by_type.get(filetype, 0) / float(bytes_done)
+            else:
+                rate = overall_rate
+            seconds_left += bytes_left * rate
+        # Extraction time is summed across workers; the wall-clock time left depends on how many run at once
+        parallelism = max(1.0, seconds_done / elapsed)
+        return round(seconds_left / parallelism, 1)
+
+def format_duration(seconds):
+    """Format a number of seconds as H:MM:SS."""
+    seconds = int(round(seconds))
+    return '{}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+def _format_line(snapshot):
+    """Format a snapshot (see Progress.snapshot) as a single human-readable line."""
+    # Totals and ETA still growing with the walk are marked as such
+    more = '' if snapshot['discovery_done'] else '+'
+    if snapshot['files_total']:
+        done = '{}/{}{} files'.format(snapshot['files_done'], snapshot['files_total'], more)
+    else:
+        done = '{} files'.format(snapshot['files_done'])
+    if snapshot['eta'] is not None:
+        eta = ('>' if more else '') + format_duration(snapshot['eta'])
+    else:
+        eta = '?'
+    return '{}  {:.1f} files/s  {:.2f} MB/s  {} in flight  {} failed  ETA {}'.format(
+        done, snapshot['files_per_second'], snapshot['bytes_per_second'] / 1024 ** 2,
+        snapshot['files_in_flight'], snapshot['files_failed'], eta)
+
+def _filetype(filename):
+    """Return the type of a file used to group its statistics: its lowercase extension."""
+    return os.path.splitext(filename)[1].lower()
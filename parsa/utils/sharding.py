@@ -0,0 +1,60 @@
+"""utils/sharding.py - Deterministic splitting of an input folder into shards, to be extracted by separate runs
+
+Classes:
+    Shard - one of several disjoint shards covering an input folder
+
+Functions:
+    shard_of - return the shard a file belongs to, from a stable hash of its relative path
+    balanced_assignment - assign files to shards so that every shard holds about the same number of bytes
+"""
+
+import hashlib
+import heapq
+
+class Shard(object):
+    """Shard number index (1-based) out of count, covering a disjoint part of an input folder:
+    the shards of every index from 1 to count together hold every file exactly once.
+
+    By default, files are assigned by a stable hash of their path relative to the input folder (see shard_of),
+    so runs on different machines agree on the assignment without talking to each other, and without
+    walking the whole folder first. If assignment (see balanced_assignment) is given, it's used instead.
+    """
+
+    def __init__(self, index, count, assignment=None):
+        if not 1 <= index <= count:
+            raise ValueError('shard index must be between 1 and {}: {}'.format(count, index))
+        self.index = index
+        self.count = count
+        self.assignment = assignment
+
+    def contains(self, relpath):
+        """Return True if the file at relpath (relative to the input folder, with forward slashes) is in this shard."""
+        if self.assignment is not None:
+            return self.assignment.get(relpath) == self.index
+        return shard_of(relpath, self.count) == self.index
+
+    def __str__(self):
+        return '{}/{}'.format(self.index, self.count)
+
+def shard_of(relpath, count):
+    """Return the shard (1 to count) of the file at relpath (relative to the input folder, with forward slashes).
+    The hash doesn't depend on the platform, the Python version or PYTHONHASHSEED, unlike hash().
+    """
+    digest = hashlib.sha1(relpath.encode('utf-8')).hexdigest()
+    return int(digest[:16], 16) % count + 1
+
+def balanced_assignment(files, count):
+    """Assign files (an iterable of (relative path, size) pairs) to count shards, so that every shard
+    holds about the same number of bytes, and return a dict mapping each relative path to its shard (1 to count).
+
+    Files are assigned largest first to the shard holding the fewest bytes so far (ties broken by path
+    and shard number), so the assignment only depends on the files, not on the order they're listed in.
+    """
+    # (bytes held, shard) of every shard, the emptiest first
+    shards = [(0, shard) for shard in range(1, count + 1)]
+    assignment = {}
+    for relpath, size in sorted(files, key=lambda item: (-item[1], item[0])):
+        shard_bytes, shard = heapq.heappop(shards)
+        assignment[relpath] = shard
+        heapq.heappush(shards, (shard_bytes + size, shard))
+    return assignment
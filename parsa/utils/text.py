@@ -2,56 +2,433 @@
 
 Functions:
     get_text - extract text from the input file
+    get_text_encoded - extract text from the input file, UTF-8 encoded
+    write_text - extract text from the input file, writing it to a file in chunks
+    preload_parsers - import textract's parser modules ahead of time
+    needs_textract - return whether extracting a file may go through textract
+    process_extracted - process text returned by textract the way get_text does
+    _iter_text - extract text from the input file, yielding it in one or more pieces
+    _stream_plaintext - read and decode a plain-text file in chunks
+    _detect_encoding - detect the encoding of a plain-text file, reading it in chunks
+    _decode_chunks - decode bytes in chunks
+    _timed_chunks - record the time spent producing chunks of text
+    _strip_chunks - strip leading and trailing whitespace from chunks of text
+    _normalise_extension - normalise an extension to lowercase, with a leading dot
+    _get_plaintext - extract text from plain-text formats without going through textract
+    _read_file - read a file's content, memory-mapping large files
+    _decode - decode the content of a plain-text file
+    _csv_to_text - convert delimiter-separated values to text, as textract does
+    _json_to_text - convert deserialized JSON to text, as textract does
+    _collect_json_strings - collect the string values of deserialized JSON
     _process_text - process extracted text and return it as a simple string
+    _process_encoded - process extracted text and return it UTF-8 encoded, without copying it
+    _strip_encoded - strip leading and trailing whitespace from UTF-8 encoded text, without copying it
 """
 
+import codecs
+import csv
+import io
+import json
+import mmap
 import os
-import textract
 
-def get_text(infile, _infile_extension=None, disable_no_ext_prompt=False):
+from parsa.utils import filetype
+from parsa.utils import profiling
+from parsa.utils import trace as tr
+
+# Plain-text formats extracted by _get_plaintext instead of textract
+# (mapped to the delimiter of delimiter-separated formats, or None)
+_PLAINTEXT_EXTENSIONS = {
+    '.txt': None,
+    '.log': None,
+    '.md': None,
+    '.csv': ',',
+    '.tsv': '\t',
+    '.tab': '\t',
+    '.psv': '|',
+    '.json': None,
+}
+
+# Plain-text formats that write_text streams from the input file, rather than reading them whole
+# (delimiter-separated values and JSON have to be parsed, so they're read whole)
+_STREAMED_EXTENSIONS = ('.txt', '.log', '.md')
+
+# Number of bytes of input decoded (and written) at a time by write_text
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Files larger than this (in bytes) are memory-mapped instead of being read into memory
+_MMAP_THRESHOLD = 1024 * 1024
+
+# Minimum confidence for chardet's detected encoding to be used, as in textract
+_CHARDET_MIN_CONFIDENCE = 0.8
+
+# Whether preload_parsers has already run in this process
+_parsers_preloaded = False
+
+def get_text(infile, _infile_extension=None, disable_no_ext_prompt=False, trace=None, raise_errors=False):
     """Extract text from the input file using textract, returning an empty string if failing to do so.
-    If the infile does not explicitly have an extension (UnicodeDecodeError), 
+    If the infile does not explicitly have an extension, its type is detected from its first few KB
+    (see filetype.sniff_extension) before any parsing is attempted.
+    If its type can't be detected either (UnicodeDecodeError), 
     the user will be prompted to input the correct extension (either with or without a dot). 
     get_text is then recursively called with _infile_extension set to the input extension.
 
     The caller should never set _infile_extension to anything in most cases, 
     unless they want to skip the prompt for input extension and the entirety of the input is of the same format.
+
+    If trace (a record from trace.new_record) is provided, the detected type, the extractor used
+    and the time spent sniffing, extracting and decoding are recorded in it.
+
+    If raise_errors is set, failures that are otherwise printed (unsupported extensions, failing programs,
+    and files whose extension is unknown when the user can't be prompted for it) raise instead,
+    so that the caller can report them.
+    """
+    # The text comes in a single piece, so joining it doesn't copy it
+    return ''.join(_iter_text(infile, _infile_extension, disable_no_ext_prompt, trace, raise_errors=raise_errors))
+
+def get_text_encoded(infile, _infile_extension=None, disable_no_ext_prompt=False, trace=None, raise_errors=False):
+    """Extract text from the input file like get_text, but return it UTF-8 encoded, as a bytes-like object
+    (empty if failing to do so), ready to be written out as it is (see fs.write_bytes_to_file).
+
+    textract's output is only validated as UTF-8, rather than decoded to a string and encoded again,
+    and .pdf whitespace is trimmed on a memoryview, so the text is never copied.
+    """
+    # The text comes in a single piece, and joining bytes would copy it
+    return next(_iter_text(infile, _infile_extension, disable_no_ext_prompt, trace, encoded=True,
+                           raise_errors=raise_errors), b'')
+
+def write_text(infile, outfile, _infile_extension=None, disable_no_ext_prompt=False, trace=None, raise_errors=False):
+    """Extract text from the input file like get_text, but write it to outfile in chunks as it's decoded
+    instead of returning it, so that memory use stays bounded however large the text is.
+    Return True if any text was written (outfile is left empty otherwise).
+
+    Plain-text files are read, decoded and written STREAM_CHUNK_SIZE bytes at a time; for other formats,
+    only textract's output is held in memory, and it's decoded and written one chunk at a time.
+    If trace is provided, the time spent writing is recorded in it as well.
     """
-    # If text is not extracted or the infile is empty, the function will just return an empty string
-    text = ''   
+    written = False
+    with io.open(outfile, 'w', encoding='utf-8', newline='') as fout:
+        for chunk in _iter_text(infile, _infile_extension, disable_no_ext_prompt, trace, STREAM_CHUNK_SIZE,
+                                raise_errors=raise_errors):
+            with tr.timed(trace, 'write'):
+                fout.write(chunk)
+            written = True
+    return written
 
+def _iter_text(infile, _infile_extension=None, disable_no_ext_prompt=False, trace=None, chunk_size=None,
+               encoded=False, raise_errors=False):
+    """Extract text from the input file (see get_text), yielding it in pieces.
+    If chunk_size is None, the text is yielded in a single piece, UTF-8 encoded if encoded is set
+    (see get_text_encoded); otherwise, it's decoded and yielded chunk_size bytes (of encoded input) at a time.
+    """
+    # Files without an extension are identified by their content, which only takes a small read
+    if not _infile_extension and not os.path.splitext(infile)[1]:
+        with tr.timed(trace, 'sniff'):
+            _infile_extension = filetype.sniff_extension(infile)
+
+    if trace is not None:
+        trace['type'] = (_infile_extension or os.path.splitext(infile)[1]).lower() or None
+
+    # Plain-text formats are read directly, skipping textract's parser dispatch
+    extension = _normalise_extension(_infile_extension or os.path.splitext(infile)[1])
+    if chunk_size is not None and extension in _STREAMED_EXTENSIONS:
+        if trace is not None:
+            trace['extractor'] = 'plaintext'
+        for chunk in _stream_plaintext(infile, chunk_size, trace):
+            yield chunk
+        return
+    try:
+        text = _get_plaintext(infile, extension, trace)
+    except (NotImplementedError, ValueError):
+        # Not a plain-text format, or a malformed one: leave it to textract
+        pass
+    else:
+        if trace is not None:
+            trace['extractor'] = 'plaintext'
+        if text:
+            # Plain text may be in any encoding, so it always has to be decoded (and encoded again)
+            yield text.encode('utf-8') if encoded else text
+        return
+
+    # textract (and the parser it picks) is only imported once a file actually needs it,
+    # so that parsa starts quickly (e.g. for --help, argument errors or plain-text inputs)
+    import textract
+
+    if trace is not None:
+        trace['extractor'] = 'textract'
     try:
-        text = textract.process(infile, extension=_infile_extension)
+        with tr.timed(trace, 'extract'):
+            text = textract.process(infile, extension=_infile_extension)
     # File existence gets checked in parsa.py
     except textract.exceptions.ExtensionNotSupported:
+        if raise_errors:
+            raise
         print("Error while parsing file: " + infile)
         print("Extension not supported\n")
     # Skip file if parsing has failed
     except textract.exceptions.ShellError as e: # pragma: no cover
         # Reason for no coverage: cannot be tested, as it cannot be reproduced.
         # The only reason this exception is caught is to not block the flow of the program in case it happens.
+        if raise_errors:
+            raise
         print("Error while parsing file: " + infile)
         print(e)
     # If the file has no explicit extension, prompt the user for it
     except UnicodeDecodeError: # pragma: no cover
         # Reason for no coverage: it's tested in get_text_no_extension in test_text.py
         # but it's not counted by coverage.py, probably because mock.patch is used.
+        if raise_errors and disable_no_ext_prompt:
+            raise ValueError('file has no extension, and its type could not be detected')
         print("Error while parsing file: " + infile)
         print("File has no extension\n")
         if not disable_no_ext_prompt:
             # Prompt the user for the input file's extension
             # textract.process adds a dot before the input extension if it's not already present (e.g. txt -> .txt)
             _infile_extension = input("Please input the file's extension (e.g. .pdf or pdf):")
-            # Call the function again; an exception will be raised on failure
-            text = get_text(infile, _infile_extension)
+            # Extract the text again; an exception will be raised on failure
+            for chunk in _iter_text(infile, _infile_extension, trace=trace, chunk_size=chunk_size, encoded=encoded,
+                                    raise_errors=raise_errors):
+                yield chunk
     # If no exceptions happened, format text adeguately
     else:
         # Extract input file's extension unless it has already been specified
         if not _infile_extension:
             _infile_extension = os.path.splitext(infile)[1]
 
-        text = _process_text(text, _infile_extension)
-    return text
+        if chunk_size is None:
+            with tr.timed(trace, 'decode'), profiling.phase('post-processing'):
+                if encoded:
+                    text = _process_encoded(text, _infile_extension)
+                else:
+                    text = _process_text(text, _infile_extension)
+            if text:
+                yield text
+        else:
+            chunks = _timed_chunks(_decode_chunks(text, 'utf-8', 'strict', chunk_size), trace)
+            # Remove unnecessary leading and trailing space, as _process_text does
+            if _infile_extension == '.pdf' or _infile_extension == 'pdf':
+                chunks = _strip_chunks(chunks)
+            for chunk in chunks:
+                yield chunk
+
+def preload_parsers():
+    """Import textract's parser modules (and their dependencies) ahead of time.
+
+    textract imports the parser of each format on first use, which is slow; processes that extract many files
+    (such as worker processes) call this once at startup, so no file pays for it. Parsers whose dependencies
+    are missing are skipped, so that textract can report the problem when (and if) one of their files is parsed.
+    """
+    global _parsers_preloaded
+    if _parsers_preloaded:
+        return
+    _parsers_preloaded = True
+    # Imported here rather than at the top, as pkgutil alone noticeably slows down parsa's startup
+    import importlib
+    import pkgutil
+    import textract.parsers
+    for module in pkgutil.iter_modules(textract.parsers.__path__):
+        if module.name.endswith('_parser'):
+            try:
+                importlib.import_module('textract.parsers.' + module.name)
+            except Exception:
+                pass
+
+def needs_textract(infile):
+    """Return True if extracting infile may go through textract: unless it's of a plain-text format
+    parsa reads itself (see _get_plaintext). Files without an extension may be of any format.
+    """
+    return _normalise_extension(os.path.splitext(infile)[1]) not in _PLAINTEXT_EXTENSIONS
+
+def process_extracted(text, extension, encoded=False):
+    """Process text, as returned by textract.process for a file with the given extension, into the text
+    get_text returns (or get_text_encoded, if encoded is set): used for text extracted in pieces
+    by other means (see pdf.join_pages).
+    """
+    if encoded:
+        return _process_encoded(text, extension)
+    return _process_text(text, extension)
+
+def _stream_plaintext(infile, chunk_size, trace=None):
+    """Yield the text of a plain-text file, reading and decoding it chunk_size bytes at a time.
+    The encoding is the one _decode would pick, and is settled (see _detect_encoding)
+    before any text is yielded, so that no text ever has to be taken back.
+    """
+    with tr.timed(trace, 'decode'), profiling.phase('post-processing'):
+        encoding, errors = _detect_encoding(infile, chunk_size)
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    with open(infile, 'rb') as fin:
+        while True:
+            with tr.timed(trace, 'extract'):
+                data = fin.read(chunk_size)
+            with tr.timed(trace, 'decode'), profiling.phase('post-processing'):
+                chunk = decoder.decode(data, final=not data)
+            if chunk:
+                yield chunk
+            if not data:
+                return
+
+def _detect_encoding(infile, chunk_size):
+    """Return the (encoding, errors) pair _decode would use for infile's content,
+    reading infile chunk_size bytes at a time instead of all at once.
+    """
+    with open(infile, 'rb') as fin:
+        # utf-8-sig strips the byte order mark, if there is one
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        try:
+            for data in iter(lambda: fin.read(chunk_size), b''):
+                decoder.decode(data)
+            decoder.decode(b'', final=True)
+            return 'utf-8-sig', 'strict'
+        except UnicodeDecodeError:
+            pass
+
+        fin.seek(0)
+        from chardet.universaldetector import UniversalDetector
+        detector = UniversalDetector()
+        for data in iter(lambda: fin.read(chunk_size), b''):
+            detector.feed(data)
+            if detector.done:
+                break
+        detection = detector.close()
+    if detection['encoding'] and detection['confidence'] > _CHARDET_MIN_CONFIDENCE:
+        return detection['encoding'], 'replace'
+    return 'utf-8', 'replace'
+
+def _decode_chunks(data, encoding, errors, chunk_size):
+    """Decode data (a bytes-like object) chunk_size bytes at a time, yielding the decoded chunks."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    # Slicing a memoryview doesn't copy the data
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        chunk = decoder.decode(view[start:start + chunk_size])
+        if chunk:
+            yield chunk
+    chunk = decoder.decode(b'', final=True)
+    if chunk:
+        yield chunk
+
+def _timed_chunks(chunks, trace=None):
+    """Yield the items of chunks, recording the time spent producing them as decoding."""
+    iterator = iter(chunks)
+    while True:
+        with tr.timed(trace, 'decode'), profiling.phase('post-processing'):
+            chunk = next(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+def _strip_chunks(chunks):
+    """Yield chunks of text with the leading and trailing whitespace of their concatenation removed,
+    as str.strip would, without ever joining them.
+    """
+    started = False
+    # Whitespace that will only be yielded if some non-whitespace text follows it
+    pending = []
+    for chunk in chunks:
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        stripped = chunk.rstrip()
+        if stripped:
+            for whitespace in pending:
+                yield whitespace
+            pending = []
+            yield stripped
+        pending.append(chunk[len(stripped):])
+
+def _normalise_extension(extension):
+    """Return extension in lowercase, with a leading dot (e.g. 'TXT' -> '.txt')."""
+    extension = extension.lower()
+    if extension and not extension.startswith('.'):
+        extension = '.' + extension
+    return extension
+
+def _get_plaintext(infile, extension, trace=None):
+    """Extract text from a plain-text format (see _PLAINTEXT_EXTENSIONS) without going through textract,
+    producing the same text textract would. If trace is provided, the time spent reading
+    and decoding infile is recorded in it (see get_text).
+    Raise NotImplementedError if extension is not a plain-text format,
+    and ValueError if infile's content can't be parsed as such.
+    """
+    extension = _normalise_extension(extension)
+    if extension not in _PLAINTEXT_EXTENSIONS:
+        raise NotImplementedError(extension)
+
+    with tr.timed(trace, 'extract'):
+        data = _read_file(infile)
+    with tr.timed(trace, 'decode'), profiling.phase('post-processing'):
+        try:
+            text = _decode(data)
+        finally:
+            # Unmap large files as soon as they've been decoded
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+        if extension == '.json':
+            # json.loads raises ValueError for malformed JSON
+            return _json_to_text(json.loads(text))
+        delimiter = _PLAINTEXT_EXTENSIONS[extension]
+        if delimiter is not None:
+            return _csv_to_text(text, delimiter)
+        return text
+
+def _read_file(infile):
+    """Return infile's content as a bytes-like object.
+    Files larger than _MMAP_THRESHOLD are memory-mapped, so that decoding them doesn't need an extra copy.
+    """
+    with open(infile, 'rb') as fin:
+        size = os.fstat(fin.fileno()).st_size
+        if size < _MMAP_THRESHOLD:
+            return fin.read()
+        # The mapping stays valid after the file is closed
+        return mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _decode(data):
+    """Decode the content of a plain-text file, normalising it to a unicode string.
+
+    UTF-8 (with or without a byte order mark) is tried first, as it's by far the most common encoding;
+    otherwise the encoding is detected with chardet (falling back to UTF-8 with replacement characters
+    if the detection isn't confident enough), which is what textract does.
+    """
+    try:
+        # utf-8-sig strips the byte order mark, if there is one;
+        # codecs.decode accepts memory-mapped files as well as bytes, without copying them
+        return codecs.decode(data, 'utf-8-sig')
+    except UnicodeDecodeError:
+        pass
+    data = bytes(data)
+    import chardet
+    detection = chardet.detect(data)
+    if detection['encoding'] and detection['confidence'] > _CHARDET_MIN_CONFIDENCE:
+        return data.decode(detection['encoding'], 'replace')
+    return data.decode('utf-8', 'replace')
+
+def _csv_to_text(text, delimiter):
+    """Convert delimiter-separated values to text, joining each row's fields with tabs, as textract does."""
+    reader = csv.reader(io.StringIO(text, newline=None), delimiter=delimiter)
+    return '\n'.join(['\t'.join(row) for row in reader])
+
+def _json_to_text(deserialized_json):
+    """Convert deserialized JSON to text, keeping only its string values (in key order), as textract does."""
+    parts = []
+    _collect_json_strings(deserialized_json, parts)
+    # Joining once is much cheaper than concatenating at every level of nesting
+    return ''.join(parts)
+
+def _collect_json_strings(deserialized_json, parts):
+    """Append the string values of deserialized JSON to parts, each container item followed by a space."""
+    if isinstance(deserialized_json, dict):
+        for key in sorted(deserialized_json):
+            _collect_json_strings(deserialized_json[key], parts)
+            parts.append(' ')
+    elif isinstance(deserialized_json, list):
+        for item in deserialized_json:
+            _collect_json_strings(item, parts)
+            parts.append(' ')
+    elif isinstance(deserialized_json, str):
+        parts.append(deserialized_json)
 
 def _process_text(text, _infile_extension):
     """Process extracted text and return it as a simple string."""
@@ -60,4 +437,38 @@ def _process_text(text, _infile_extension):
     # Remove unnecessary trailing space caused by the form feed (\x0c, \f) character at the end of .pdf files
     if _infile_extension == '.pdf' or _infile_extension == 'pdf':
         text = text.strip()
-    return text
\ No newline at end of file
+    return text
+
+def _process_encoded(text, _infile_extension):
+    """Process extracted text like _process_text, but return it UTF-8 encoded, as a memoryview of text.
+    text is validated as UTF-8 (raising UnicodeDecodeError, as _process_text would) one chunk at a time,
+    so that no full-size string is ever built.
+    """
+    for _ in _decode_chunks(text, 'utf-8', 'strict', STREAM_CHUNK_SIZE):
+        pass
+    view = memoryview(text)
+    if _infile_extension == '.pdf' or _infile_extension == 'pdf':
+        view = _strip_encoded(view)
+    return view
+
+def _strip_encoded(view):
+    """Return view (a memoryview of valid UTF-8 text) without its leading and trailing whitespace,
+    as str.strip would remove it, by slicing it instead of copying it.
+    """
+    start, end = 0, len(view)
+    while start < end:
+        # Continuation bytes of a multi-byte character are 0b10xxxxxx
+        char_end = start + 1
+        while char_end < end and view[char_end] & 0xC0 == 0x80:
+            char_end += 1
+        if not codecs.decode(view[start:char_end], 'utf-8').isspace():
+            break
+        start = char_end
+    while end > start:
+        char_start = end - 1
+        while char_start > start and view[char_start] & 0xC0 == 0x80:
+            char_start -= 1
+        if not codecs.decode(view[char_start:end], 'utf-8').isspace():
+            break
+        end = char_start
+    return view[start:end]
@@ -0,0 +1,76 @@
+"""utils/trace.py - Per-file trace log for parsa
+
+Classes:
+    TraceLog - JSONL log with one record per processed file
+
+Functions:
+    clock - return the current time of a monotonic, high-resolution clock, in seconds
+    new_record - return an empty trace record for a file
+    timed - context manager adding the time spent in a phase to a trace record
+"""
+
+import contextlib
+import io
+import json
+import time
+
+# Monotonic, high-resolution clock used to time phases
+clock = time.perf_counter
+
+class TraceLog(object):
+    """JSONL log with one record (a dict, see new_record) per processed file.
+
+    Records are appended to path, so the traces of successive runs accumulate in the same file.
+    Writes are buffered, and each record costs a single json.dumps, so tracing can be left on.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = io.open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        """Append record to the log."""
+        # Microsecond resolution is plenty, and keeps records short
+        timings = dict((phase, round(seconds, 6)) for phase, seconds in record['timings'].items())
+        line = json.dumps(dict(record, timings=timings), sort_keys=True)
+        self._file.write(line + '\n')
+
+    def close(self):
+        """Flush the log and close it."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+def new_record(infile, size=None):
+    """Return an empty trace record for infile (size is its size in bytes, if known).
+
+    Records are filled in as the file goes through each phase:
+        input, size - the input file and its size
+        type - the extension the file was extracted as (detected from its content if it had none)
+        extractor - what extracted its text: 'plaintext' (parsa's own reader), 'textract' or 'cache'
+        timings - wall time spent in each phase, in seconds (walk, sniff, extract, decode, cache, name, write)
+        output, output_size - the output file and its size, if text was written
+        outcome - 'ok', 'empty' (no text was extracted), 'unchanged' (skipped in incremental mode) or 'error'
+        error - why the extraction failed, if it did
+    """
+    return {'input': infile, 'size': size, 'timings': {}}
+
+@contextlib.contextmanager
+def timed(record, phase):
+    """Add the wall time spent inside the with block to record's timings for phase.
+    If record is None, nothing is timed, so callers don't need to check whether tracing is enabled.
+    """
+    if record is None:
+        yield
+        return
+    start = clock()
+    try:
+        yield
+    finally:
+        timings = record['timings']
+        timings[phase] = timings.get(phase, 0) + (clock() - start)
@@ -0,0 +1,298 @@
+"""utils/watch.py - Watching a folder for new and modified files, for parsa's watch mode
+
+Classes:
+    Watcher - report the files of a folder that are created or modified, once they're done being written
+    _Inotify - minimal ctypes binding to Linux's inotify
+    _Entry - DirEntry-like view of a path, for filters.FileFilter
+
+Constants:
+    DEFAULT_SETTLE_TIME - seconds a file must go unmodified before it's reported
+    DEFAULT_POLL_INTERVAL - seconds between scans of the folder when inotify is not available
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+from parsa.utils import filesystem as fs
+
+DEFAULT_SETTLE_TIME = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+
+# inotify event flags (see inotify(7))
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+# Events that may mean a file has new content
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_ONLYDIR
+
+# Header of an inotify event (wd, mask, cookie, len), followed by len bytes of NUL-padded name
+_EVENT_HEADER = struct.Struct('iIII')
+
+class Watcher(object):
+    """Report the files of the folder indir that are created or modified (including files moved into it,
+    and the files of new subfolders), once they're done being written.
+
+    Changes are received from inotify on Linux, so that a change costs the same however large indir is,
+    and nothing is ever rescanned, except when the kernel's event queue overflows. Where inotify isn't
+    available (or its watch limit is reached), indir is scanned every poll_interval seconds instead.
+
+    A file is reported once it has gone settle_time seconds without being modified, so that a file still
+    being written (or copied) is not extracted half-written, and a file modified many times in a row
+    is reported once. Only the files file_filter (a FileFilter) accepts are reported, and the folders
+    it prunes are not watched.
+    """
+
+    def __init__(self, indir, file_filter=None, settle_time=DEFAULT_SETTLE_TIME, poll_interval=DEFAULT_POLL_INTERVAL,
+                 use_inotify=True):
+        self.indir = indir
+        self.file_filter = file_filter
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        # Time of the last change seen for each file that hasn't been reported yet
+        self._pending = {}
+        # Watched folders by watch descriptor
+        self._folders = {}
+        self._inotify = None
+        # (size, modification time) of every file found by the last scan, when polling
+        self._snapshot = None
+        self._next_poll = 0
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except OSError:
+                self._inotify = None
+        if self._inotify is not None:
+            self._watch_tree(indir)
+        if self._inotify is None:
+            self._snapshot = self._scan()
+            self._next_poll = time.time() + poll_interval
+
+    @property
+    def polling(self):
+        """True if indir is being scanned periodically, rather than watched with inotify."""
+        return self._inotify is None
+
+    def wait(self, timeout=None):
+        """Wait until at least one file has settled (or until timeout seconds have passed, if it's not None),
+        and return the list of settled files (empty if the timeout expired first).
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            now = time.time()
+            settled = self._settled(now)
+            if settled or (deadline is not None and now >= deadline):
+                return settled
+            # Sleep until the first pending file may have settled, the next scan, or the deadline
+            wake_times = [changed + self.settle_time for changed in self._pending.values()]
+            if deadline is not None:
+                wake_times.append(deadline)
+            if self._inotify is None:
+                wake_times.append(self._next_poll)
+            wait_time = max(0, min(wake_times) - now) if wake_times else None
+            if self._inotify is not None:
+                self._read_events(wait_time)
+            else:
+                time.sleep(wait_time)
+                if time.time() >= self._next_poll:
+                    self._poll()
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _settled(self, now):
+        """Return the pending files that haven't changed for settle_time seconds (and that file_filter accepts),
+        removing them from the pending files.
+        """
+        settled = []
+        for path, changed in list(self._pending.items()):
+            if now - changed < self.settle_time:
+                continue
+            del self._pending[path]
+            entry = _Entry(path)
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                # Removed (or moved away) before it settled
+                continue
+            # Written without any event being seen since (e.g. by a writer that pauses, with inotify's
+            # events coalesced), so it's given more time
+            if now - mtime < self.settle_time:
+                self._pending[path] = mtime
+                continue
+            if self.file_filter is None or self.file_filter.accept(entry):
+                settled.append(path)
+        return settled
+
+    def _read_events(self, timeout):
+        """Wait up to timeout seconds (forever if it's None) for inotify events, and record the changes they report."""
+        now = time.time()
+        for wd, mask, name in self._inotify.read(timeout):
+            if mask & _IN_Q_OVERFLOW:
+                # Events have been lost: every file is checked again (unchanged ones are skipped by the caller)
+                self._pend_tree(self.indir)
+                continue
+            folder = self._folders.get(wd)
+            if folder is None:
+                continue
+            if mask & _IN_IGNORED:
+                # The folder has been removed, or moved away
+                del self._folders[wd]
+                continue
+            path = os.path.join(folder, name)
+            if mask & _IN_ISDIR:
+                # Files may have been written into a new folder before it was watched
+                if mask & (_IN_CREATE | _IN_MOVED_TO) and not self._is_pruned(path):
+                    self._watch_tree(path)
+                    self._pend_tree(path)
+            else:
+                self._pending[path] = now
+            if self._inotify is None:
+                # The watch limit was reached while watching a new folder: polling took over
+                return
+
+    def _watch_tree(self, path):
+        """Watch path and every subfolder of it that file_filter doesn't prune, switching to polling
+        if inotify's watch limit is reached.
+        """
+        # An explicit stack is used instead of recursion, as in fs.iter_files
+        dirs_to_watch = [path]
+        while dirs_to_watch and self._inotify is not None:
+            folder = dirs_to_watch.pop()
+            try:
+                wd = self._inotify.add_watch(folder, _WATCH_MASK)
+            except OSError as e:
+                if e.errno in (errno.ENOSPC, errno.ENOMEM):
+                    self.close()
+                    self._snapshot = self._scan()
+                    self._next_poll = time.time() + self.poll_interval
+                # Otherwise, the folder is already gone
+                continue
+            self._folders[wd] = folder
+            try:
+                for entry in os.scandir(folder):
+                    try:
+                        is_dir = entry.is_dir() and not entry.is_symlink()
+                    except OSError:
+                        continue
+                    if is_dir and not self._is_pruned(entry.path, entry):
+                        dirs_to_watch.append(entry.path)
+            except OSError:
+                continue
+
+    def _pend_tree(self, path):
+        """Mark every file inside path as changed."""
+        now = time.time()
+        prune = self.file_filter.prune if self.file_filter is not None else None
+        for entry in fs.iter_files(path, prune):
+            self._pending.setdefault(entry.path, now)
+
+    def _is_pruned(self, path, entry=None):
+        return self.file_filter is not None and self.file_filter.prune(entry or _Entry(path))
+
+    def _scan(self):
+        """Return the (size, modification time) of every file in indir, by path."""
+        prune = self.file_filter.prune if self.file_filter is not None else None
+        snapshot = {}
+        for entry in fs.iter_files(self.indir, prune):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            snapshot[entry.path] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    def _poll(self):
+        """Scan indir, marking the files that are new or changed since the last scan as changed."""
+        now = time.time()
+        snapshot = self._scan()
+        for path, state in snapshot.items():
+            if self._snapshot.get(path) != state:
+                self._pending[path] = now
+        self._snapshot = snapshot
+        self._next_poll = now + self.poll_interval
+
+class _Inotify(object):
+    """Minimal ctypes binding to Linux's inotify (see inotify(7)). Raises OSError if it's not available."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        try:
+            self._libc = ctypes.CDLL(libc_name, use_errno=True)
+            inotify_init1 = self._libc.inotify_init1
+        except (OSError, AttributeError):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.fd = inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path, mask):
+        """Watch path for the events in mask, and return the watch descriptor."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def read(self, timeout=None):
+        """Wait up to timeout seconds (forever if it's None) for events, and return them as a list of
+        (watch descriptor, mask, name) tuples (empty if the timeout expired first).
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class _Entry(object):
+    """DirEntry-like view of path, with the attributes and methods filters.FileFilter uses."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._stat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def inode(self):
+        return os.lstat(self.path).st_ino
@@ -0,0 +1,745 @@
+"""utils/workers.py - Parallel extraction utilities for parsa
+
+Classes:
+    ExtractionResult - result of the extraction of a single file
+    _Worker - worker process extracting the files sent to it over a pipe
+    _SplitFile - large PDF (or long audio file) being extracted one part at a time, by several workers
+
+Functions:
+    default_jobs - return the default number of worker processes
+    extract_files - extract text from multiple files, yielding the results in input (or completion) order
+    get_text_cached - extract text from a file, going through the extraction cache if one is provided
+    write_text_cached - extract text from a file to another file, going through the extraction cache if one is provided
+    _cache_extension - return the extension a file is extracted and cached as
+    _extract_in_line - extract text from a single file in the current process
+    _error_message - return the message recorded in the result of an extraction that raised an exception
+    _stream_text - stream the text of a file to a temporary file
+    _stream_prefix - return the prefix of the temporary files a call of extract_files streams text to
+    _stream_path - return the temporary file the text of an input is streamed to
+    _remove_file - remove a file if it exists
+    _extract_in_workers - extract text from multiple files using isolated worker processes
+    _split_file - return the parts (page ranges or segments) a file is split into, or its cached result
+    _cache_lookup - look up a file extracted outside of the worker processes' cache lookups
+    _join_split_file - return the ExtractionResult of a split file, joining the text of its parts
+    _batch_task - return the task of a batch of images to OCR with a single tesseract invocation
+    _batch_result - return the ExtractionResult of an image OCRed as part of a batch
+    _split_result - return the ExtractionResult of a split (or batched) file from its text
+    _worker_main - main loop of a worker process
+    _limit_memory - limit the memory of the current process
+    _init_worker - set up a worker process
+    _extract - extract text from a single file inside a worker process
+    _extract_part - extract the text of part of a file (or of a batch of images) inside a worker process
+"""
+
+import codecs
+import collections
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import time
+
+try:
+    import resource
+except ImportError: # pragma: no cover
+    # Reason for no coverage: resource is available on every supported platform (Linux)
+    resource = None
+
+from parsa.utils import audio
+from parsa.utils import filesystem as fs
+from parsa.utils import filetype
+from parsa.utils import ocr
+from parsa.utils import pdf
+from parsa.utils import profiling
+from parsa.utils import text as txt
+from parsa.utils import trace as tr
+
+# Maximum number of finished results per job kept while waiting for the result of an earlier (slower) file,
+# so that a single straggler can't make the results of every other file pile up in memory
+_REORDER_BUFFER_PER_JOB = 64
+
+# Seconds a worker is given to exit cleanly before being killed
+_SHUTDOWN_GRACE_PERIOD = 1
+
+# Numbers the calls of extract_files made by the current process, for the names of their temporary files
+_stream_calls = itertools.count()
+
+# Extraction cache of the current worker process, set by _init_worker
+_worker_cache = None
+
+ExtractionResult = collections.namedtuple('ExtractionResult', ['infile', 'text', 'error', 'trace', 'textfile'])
+ExtractionResult.__doc__ = """Result of the extraction of a single file.
+text is the extracted text (an empty string if there was none, or if it was streamed to textfile),
+error describes why the extraction failed (None if it didn't),
+trace is the file's trace record (see trace.new_record), or None if tracing is disabled,
+and textfile is the temporary file the text was streamed to, or None if it wasn't (see extract_files).
+"""
+# trace and textfile are optional
+ExtractionResult.__new__.__defaults__ = (None, None)
+
+def default_jobs():
+    """Return the default number of worker processes, equal to the number of CPUs."""
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError: # pragma: no cover
+        # Reason for no coverage: cpu_count is implemented on every supported platform.
+        return 1
+
+def extract_files(filelist, jobs=None, disable_no_ext_prompt=False, cache=None, timeout=None, memory_limit=None,
+                  max_tasks_per_worker=None, trace=False, stream_dir=None, encoded=False, ordered=True,
+                  pdf_pages_per_job=None, audio_seconds_per_job=None, ocr_batch_size=None):
+    """Extract text from every file in filelist, yielding an ExtractionResult for each in input order.
+
+    If jobs is greater than 1, or if a timeout or memory limit is set, each file is extracted
+    by one of jobs isolated worker processes; otherwise, the files are extracted one at a time
+    in the current process. Results are yielded in the same order as filelist, so that output names
+    stay deterministic, unless ordered is False, in which case worker results are yielded as soon as
+    they're finished, so that a slow file doesn't hold back the results of the files after it.
+
+    timeout is the maximum number of seconds (wall-clock) and memory_limit the maximum number of bytes
+    of memory the extraction of a single file may take. The worker extracting a file that exceeds
+    either limit is killed (along with any program it started) and replaced with a new one,
+    and the file's result records the failure; the other files are not affected.
+
+    Worker processes are long-lived: they are forked once, with textract's parsers already imported,
+    and extract files until the run is over. If max_tasks_per_worker is set, each worker is replaced
+    with a fresh one after extracting that many files, to bound the memory leaked by parsers.
+
+    Worker processes cannot prompt the user, so files without an extension (whose type can't be
+    detected from their content) are handed back to the current process, which extracts them in-line
+    (prompting for their extension), unless disable_no_ext_prompt is set.
+
+    If cache (an ExtractionCache) is provided, text is looked up in it before being extracted.
+
+    If trace is set, each result holds a trace record of the file's extraction (see trace.new_record).
+
+    If stream_dir is set, text is not held in memory: it's written as it's decoded (see txt.write_text)
+    to a temporary file inside stream_dir, which is the result's textfile (None if there was no text).
+    The caller takes ownership of the temporary file, and must rename or remove it.
+
+    If encoded is set, text is UTF-8 encoded, as a bytes-like object (see txt.get_text_encoded).
+
+    If pdf_pages_per_job is set and files are extracted by worker processes, large PDFs (see pdf.page_ranges)
+    are split into ranges of pdf_pages_per_job pages, extracted by as many workers at once, and their texts
+    are joined back in page order into the text the whole PDF would have produced. If the extraction of any
+    range fails, the PDF is extracted again as a whole, so that failures are reported as they would be anyway.
+    Likewise, if audio_seconds_per_job is set, long audio files (see audio.segments) are split into segments
+    of about audio_seconds_per_job seconds, transcribed by as many workers at once and joined back in order.
+
+    If ocr_batch_size is set and files are extracted by worker processes, images (see ocr.batchable) are OCRed
+    in batches of up to ocr_batch_size images, each by a single tesseract invocation, so that tesseract's
+    start-up is paid once per batch; each image's result is the one it would have had alone. If a batch fails,
+    its images are OCRed again one at a time, so that only the images that fail are reported as failures.
+    """
+    if jobs is None:
+        jobs = default_jobs()
+    stream_prefix = _stream_prefix(stream_dir)
+
+    if jobs <= 1 and timeout is None and memory_limit is None:
+        results = (_extract_in_line(infile, disable_no_ext_prompt, cache, trace, _stream_path(stream_prefix, index),
+                                    encoded)
+                   for index, infile in enumerate(filelist))
+    else:
+        results = _extract_in_workers(filelist, jobs, not disable_no_ext_prompt, cache, timeout, memory_limit,
+                                      max_tasks_per_worker, trace, stream_prefix, encoded, ordered, pdf_pages_per_job,
+                                      audio_seconds_per_job, ocr_batch_size)
+
+    for result in results:
+        # The worker deferred this file, as its extension is unknown
+        if result.text is None:
+            result = _extract_in_line(result.infile, disable_no_ext_prompt, cache, trace, result.textfile, encoded)
+        yield result
+
+def get_text_cached(infile, disable_no_ext_prompt=False, cache=None, trace=None, encoded=False):
+    """Extract text from infile with txt.get_text, going through cache (an ExtractionCache) if it's not None.
+
+    Only non-empty text is cached, so files that failed to parse are retried on the next run.
+    Files without an extension are cached under the extension detected from their content;
+    if it can't be detected and the user may be prompted for it, they are not cached,
+    as the extension they input is not known in advance.
+
+    If trace (a record from trace.new_record) is provided, the extraction is recorded in it (see txt.get_text);
+    cache hits are recorded with 'cache' as their extractor.
+
+    If encoded is set, the text is extracted with txt.get_text_encoded instead, and cache entries are read
+    and written as UTF-8 bytes, without being decoded.
+
+    Failures raise (see txt.get_text's raise_errors), including unsupported extensions,
+    so that callers report them in the file's result.
+    """
+    get_text = txt.get_text_encoded if encoded else txt.get_text
+    extension = _cache_extension(infile, trace)
+    if cache is None or not (extension or disable_no_ext_prompt):
+        return get_text(infile, extension, disable_no_ext_prompt=disable_no_ext_prompt, trace=trace, raise_errors=True)
+
+    with tr.timed(trace, 'cache'):
+        key = cache.key(infile, extension or '')
+        text = cache.get(key, encoded)
+    if text is None:
+        text = get_text(infile, extension, disable_no_ext_prompt=disable_no_ext_prompt, trace=trace,
+                        raise_errors=True)
+        if text:
+            with tr.timed(trace, 'cache'):
+                cache.put(key, text)
+    elif trace is not None:
+        trace['type'] = extension.lower() or None
+        trace['extractor'] = 'cache'
+    return text
+
+def write_text_cached(infile, outfile, disable_no_ext_prompt=False, cache=None, trace=None):
+    """Extract text from infile like get_text_cached, but write it to outfile in chunks (see txt.write_text)
+    instead of returning it. Return True if any text was written.
+    """
+    extension = _cache_extension(infile, trace)
+    if cache is None or not (extension or disable_no_ext_prompt):
+        return txt.write_text(infile, outfile, extension, disable_no_ext_prompt=disable_no_ext_prompt, trace=trace,
+                              raise_errors=True)
+
+    with tr.timed(trace, 'cache'):
+        key = cache.key(infile, extension or '')
+        hit = cache.get_file(key, outfile)
+    if not hit:
+        written = txt.write_text(infile, outfile, extension, disable_no_ext_prompt=disable_no_ext_prompt,
+                                 trace=trace, raise_errors=True)
+        if written:
+            with tr.timed(trace, 'cache'):
+                cache.put_file(key, outfile)
+        return written
+    if trace is not None:
+        trace['type'] = extension.lower() or None
+        trace['extractor'] = 'cache'
+    return True
+
+def _cache_extension(infile, trace=None):
+    """Return the extension infile is extracted (and cached) as: its own, or the one detected from its content."""
+    extension = os.path.splitext(infile)[1]
+    if not extension:
+        with tr.timed(trace, 'sniff'):
+            extension = filetype.sniff_extension(infile)
+    return extension
+
+def _extract_in_line(infile, disable_no_ext_prompt, cache, trace, textfile=None, encoded=False):
+    """Extract text from infile in the current process, returning its ExtractionResult.
+    If textfile is set, the text is streamed to it instead (see extract_files).
+    Failures are recorded in the result, as workers record them (see _worker_main).
+    """
+    record = tr.new_record(infile) if trace else None
+    try:
+        if textfile is None:
+            text = get_text_cached(infile, disable_no_ext_prompt, cache, record, encoded)
+            return ExtractionResult(infile, text, None, record)
+        textfile = _stream_text(infile, textfile, disable_no_ext_prompt, cache, record)
+    except Exception as e:
+        return ExtractionResult(infile, '', _error_message(e), record)
+    return ExtractionResult(infile, '', None, record, textfile)
+
+def _error_message(error):
+    """Return the message an extraction's result records for error, the exception it raised."""
+    return type(error).__name__ + ': ' + str(error)
+
+def _stream_text(infile, textfile, disable_no_ext_prompt=False, cache=None, trace=None):
+    """Stream the text of infile to textfile (see write_text_cached), returning textfile,
+    or None (removing textfile) if there was no text or the extraction failed.
+    """
+    try:
+        written = write_text_cached(infile, textfile, disable_no_ext_prompt, cache, trace)
+    except BaseException:
+        _remove_file(textfile)
+        raise
+    if not written:
+        _remove_file(textfile)
+        return None
+    return textfile
+
+def _stream_prefix(stream_dir):
+    """Return the prefix of the temporary files (see _stream_path) a call of extract_files streams text to
+    inside stream_dir, or None if stream_dir is None. The prefix holds the current process's ID and the number
+    of the call, so that concurrent runs, and concurrent calls of the same process (e.g. several
+    api.extract_many iterators), sharing stream_dir don't clash.
+    """
+    if stream_dir is None:
+        return None
+    return os.path.join(stream_dir, '.parsa-{}-{}-'.format(os.getpid(), next(_stream_calls)))
+
+def _stream_path(stream_prefix, index):
+    """Return the temporary file the text of the index-th input is streamed to, or None if stream_prefix
+    (see _stream_prefix) is None. The name doesn't end with .txt, so that it can't be mistaken for
+    (or collide with) an output.
+    """
+    if stream_prefix is None:
+        return None
+    return '{}{}.tmp'.format(stream_prefix, index)
+
+def _remove_file(path):
+    """Remove path if it exists."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class _Worker(object):
+    """Worker process extracting the files sent to it over a pipe, one at a time.
+    The worker runs in a process group of its own, so that killing it also kills
+    the programs (e.g. pdftotext, tesseract) it started.
+    """
+
+    def __init__(self, defer_no_ext, cache, memory_limit, trace=False, profiledir=None, encoded=False):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main,
+                                               args=(child_conn, defer_no_ext, cache, memory_limit, trace,
+                                                     profiledir, encoded))
+        self.process.daemon = True
+        self.process.start()
+        # Only the worker uses its end of the pipe; closing ours lets us notice if the worker dies
+        child_conn.close()
+        # (index, infile, textfile, part) of the file being extracted (see send), and the time its extraction started
+        self.task = None
+        self.started = None
+        # Number of files sent to the worker
+        self.tasks_sent = 0
+
+    def send(self, index, infile, textfile=None, part=None):
+        """Send infile (the index-th input) to the worker, which streams its text to textfile if it's set.
+        If part is set, only the text of that part of infile is extracted: part is either ('pdf', (first, last)),
+        a page range of a PDF, extracted as pdf.extract_pages returns it, ('audio', (start, end)), a segment
+        of an audio file, transcribed as audio.transcribe_segment returns it, or ('ocr', images), a batch of images
+        (see _batch_task) OCRed at once, whose texts are returned as a list by ocr.ocr_batch.
+        """
+        self.task = (index, infile, textfile, part)
+        self.started = time.time()
+        self.tasks_sent += 1
+        self.conn.send(self.task)
+
+    def kill(self):
+        """Kill the worker and every program it started."""
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            # The worker hasn't got a process group of its own (yet), or it's already gone
+            try:
+                os.kill(self.process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        """Ask the worker to exit, killing it if it doesn't within the grace period."""
+        try:
+            self.conn.send(None)
+        except (OSError, IOError):
+            # The worker has already exited
+            pass
+        self.process.join(_SHUTDOWN_GRACE_PERIOD)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+class _SplitFile(object):
+    """Large PDF (if kind is 'pdf') or long audio file (if kind is 'audio') infile, extracted one of ranges
+    (its page ranges, see pdf.page_ranges, or its segments, see audio.segments) per task, by several workers.
+    record is its trace record (None if tracing is disabled), which accumulates the time spent extracting
+    each range, and cache_key is its key in the extraction cache (None if there is no cache).
+    """
+
+    def __init__(self, infile, ranges, record=None, cache_key=None, kind='pdf'):
+        self.infile = infile
+        self.ranges = ranges
+        self.kind = kind
+        self.record = record
+        self.cache_key = cache_key
+        if record is not None:
+            record['extractor'] = 'textract'
+        # Text of each range extracted so far, by range
+        self._texts = {}
+        self.failed = False
+
+    @property
+    def done(self):
+        """True once every range has been extracted (or has failed)."""
+        return len(self._texts) == len(self.ranges)
+
+    def add(self, span, text, error=None, record=None):
+        """Record the result of the extraction of the range span: its text, or its error,
+        and its trace record (whose extraction time is added to the file's).
+        """
+        self._texts[span] = text
+        if error is not None:
+            self.failed = True
+        if self.record is not None and record is not None:
+            timings = self.record['timings']
+            timings['extract'] = timings.get('extract', 0) + record['timings'].get('extract', 0)
+
+    def texts(self):
+        """Return the texts of the ranges, in order."""
+        return [self._texts[span] for span in self.ranges]
+
+def _extract_in_workers(filelist, jobs, defer_no_ext, cache, timeout, memory_limit, max_tasks_per_worker=None,
+                        trace=False, stream_prefix=None, encoded=False, ordered=True, pdf_pages_per_job=None,
+                        audio_seconds_per_job=None, ocr_batch_size=None):
+    """Extract text from every file in filelist using jobs isolated worker processes,
+    yielding an ExtractionResult for each file in input order, or in completion order if ordered is False
+    (see extract_files). Text is streamed to temporary files named after stream_prefix, if it's set (see _stream_path).
+    """
+
+    # Workers profile themselves if the current process is being profiled
+    profiledir = profiling.active_profiledir()
+    new_worker = lambda: _Worker(defer_no_ext, cache, memory_limit, trace, profiledir, encoded)
+
+    files = enumerate(filelist)
+    # Import textract's parsers before forking the workers, so that they (and their replacements) start with them
+    # loaded, but only if the first file needs them: a run of plain-text files never imports them
+    first_file = next(files, None)
+    if first_file is not None:
+        if txt.needs_textract(first_file[1]):
+            txt.preload_parsers()
+        files = itertools.chain([first_file], files)
+    files_left = True
+    workers = [new_worker() for _ in range(jobs)]
+    # Large PDFs (and long audio files) being extracted one part at a time, by index, and the tasks of their parts
+    # (or of whole files, if their ranges failed) waiting for a worker; they're handed out before new files,
+    # so that a split file is finished as soon as possible
+    splits = {}
+    queued_tasks = collections.deque()
+    # Images waiting for their batch to fill up, as (index, infile, cache key) tuples
+    images = []
+    # Finished results waiting for the results of earlier files, by index
+    finished = {}
+    next_index = 0
+    max_finished = _REORDER_BUFFER_PER_JOB * jobs
+
+    try:
+        while True:
+            # Hand a file to each idle worker
+            for worker in workers:
+                while worker.task is None:
+                    # Queued tasks belong to files already started, which the reorder buffer may be waiting for
+                    if queued_tasks:
+                        worker.send(*queued_tasks.popleft())
+                        break
+                    if not files_left or len(finished) >= max_finished:
+                        # No more images may come (or the reorder buffer may be waiting for them): the batch is sent
+                        if images:
+                            queued_tasks.append(_batch_task(images))
+                            images = []
+                            continue
+                        break
+                    try:
+                        index, infile = next(files)
+                    except StopIteration:
+                        files_left = False
+                        continue
+                    # Workers forked from now on (to replace others) start with the parsers loaded;
+                    # those already running import the parser of each format on first use
+                    if txt.needs_textract(infile):
+                        txt.preload_parsers()
+                    if ocr_batch_size is not None and ocr.batchable(infile):
+                        record = tr.new_record(infile) if trace else None
+                        if record is not None:
+                            record['type'] = os.path.splitext(infile)[1].lower()
+                        cache_key, result = _cache_lookup(infile, cache, record, _stream_path(stream_prefix, index),
+                                                          encoded)
+                        if result is not None:
+                            finished[index] = result
+                            continue
+                        images.append((index, infile, cache_key))
+                        if len(images) >= ocr_batch_size:
+                            queued_tasks.append(_batch_task(images))
+                            images = []
+                        continue
+                    split = _split_file(infile, pdf_pages_per_job, cache, trace, _stream_path(stream_prefix, index),
+                                        encoded, audio_seconds_per_job)
+                    if isinstance(split, ExtractionResult):
+                        # Served by the cache: the worker is still idle
+                        finished[index] = split
+                    elif split is not None:
+                        splits[index] = split
+                        queued_tasks.extend((index, infile, None, (split.kind, span)) for span in split.ranges)
+                    else:
+                        worker.send(index, infile, _stream_path(stream_prefix, index))
+
+            busy_workers = [worker for worker in workers if worker.task is not None]
+            if not busy_workers:
+                # Every file handed out so far is finished (results served by the cache leave the workers idle),
+                # so they're all yielded in order, which empties the reorder buffer for the files left, if any
+                for index in sorted(finished):
+                    yield finished.pop(index)
+                    next_index = index + 1
+                if not files_left:
+                    break
+                continue
+
+            # Wait until a worker is done, or until the earliest deadline
+            wait_timeout = None
+            if timeout is not None:
+                earliest_start = min(worker.started for worker in busy_workers)
+                wait_timeout = max(0, earliest_start + timeout - time.time())
+            ready_conns = multiprocessing.connection.wait([worker.conn for worker in busy_workers], wait_timeout)
+
+            for i, worker in enumerate(workers):
+                if worker.task is None:
+                    continue
+                index, infile, textfile, part = worker.task
+                record = None
+                if worker.conn in ready_conns:
+                    try:
+                        index, text, error, record, textfile = worker.conn.recv()
+                    except (EOFError, OSError):
+                        # The worker died without sending a result (e.g. it was killed by the OS)
+                        text, error = '', 'worker process died'
+                elif timeout is not None and time.time() - worker.started >= timeout:
+                    text, error = '', 'timed out after {:g} seconds'.format(timeout)
+                else:
+                    continue
+
+                # Failed files still get a record, timing the whole attempt
+                if trace and record is None:
+                    record = tr.new_record(infile)
+                    record['timings']['extract'] = time.time() - worker.started
+                worker.task = None
+                # Replace workers that timed out, died or ran out of memory
+                if error is not None:
+                    worker.kill()
+                    workers[i] = new_worker()
+                    # The worker may have left a partially written text file behind
+                    if textfile is not None:
+                        _remove_file(textfile)
+                        textfile = None
+                # Recycle workers that have extracted their share of files
+                elif max_tasks_per_worker is not None and worker.tasks_sent >= max_tasks_per_worker:
+                    worker.stop()
+                    workers[i] = new_worker()
+                if part is None:
+                    finished[index] = ExtractionResult(infile, text, error, record, textfile)
+                    continue
+                if part[0] == 'ocr':
+                    if error is None:
+                        for (image_index, image, cache_key), image_text in zip(part[1], text):
+                            finished[image_index] = _batch_result(image, image_text, len(part[1]), record, cache,
+                                                                  cache_key, _stream_path(stream_prefix, image_index),
+                                                                  encoded)
+                    else:
+                        # OCRed again one image at a time, ahead of new files, so that the reorder buffer isn't held up
+                        queued_tasks.extendleft(reversed([(image_index, image, _stream_path(stream_prefix, image_index),
+                                                           None) for image_index, image, _ in part[1]]))
+                    continue
+                split = splits[index]
+                split.add(part[1], text, error, record)
+                if not split.done:
+                    continue
+                del splits[index]
+                if split.failed:
+                    # Extracted again as a whole, so that the failure is reported as it would be otherwise
+                    queued_tasks.appendleft((index, infile, _stream_path(stream_prefix, index), None))
+                else:
+                    finished[index] = _join_split_file(split, cache, _stream_path(stream_prefix, index), encoded)
+
+            # Yield the results that are next in input order (or every finished result, if order doesn't matter)
+            if not ordered:
+                for index in sorted(finished):
+                    yield finished.pop(index)
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+    finally:
+        # Stop the workers, even if the caller stops consuming results early
+        for worker in workers:
+            if worker.task is not None:
+                worker.kill()
+                if worker.task[2] is not None:
+                    _remove_file(worker.task[2])
+            else:
+                worker.stop()
+
+def _split_file(infile, pages_per_range, cache=None, trace=False, textfile=None, encoded=False,
+                seconds_per_segment=None):
+    """Return the _SplitFile of infile if it's a PDF large enough to be extracted one range of pages_per_range
+    pages at a time (see pdf.page_ranges), or an audio file long enough to be transcribed one segment of about
+    seconds_per_segment seconds at a time (see audio.segments), or None if it isn't (or if the matching
+    setting is None).
+    If its text is in cache (an ExtractionCache), its ExtractionResult is returned instead
+    (with its text written to textfile, if it's set; see extract_files).
+    """
+    kind = 'pdf'
+    ranges = pdf.page_ranges(infile, pages_per_range) if pages_per_range is not None else None
+    if ranges is None and seconds_per_segment is not None:
+        kind = 'audio'
+        ranges = audio.segments(infile, seconds_per_segment)
+    if ranges is None:
+        return None
+    record = tr.new_record(infile) if trace else None
+    if record is not None:
+        record['type'] = os.path.splitext(infile)[1].lower()
+        if kind == 'pdf':
+            record['pages'] = ranges[-1][1]
+        else:
+            record['duration'] = ranges[-1][1]
+    cache_key, result = _cache_lookup(infile, cache, record, textfile, encoded)
+    if result is not None:
+        return result
+    return _SplitFile(infile, ranges, record, cache_key, kind)
+
+def _cache_lookup(infile, cache=None, record=None, textfile=None, encoded=False):
+    """Look infile up in cache (an ExtractionCache), for a file extracted in parts (see _split_file) or in a batch,
+    whose cache lookups are made by the current process rather than by the worker processes.
+    Return its cache key (None if cache is None) and, if its text is cached, its ExtractionResult (None otherwise),
+    with its text written to textfile if it's set (see extract_files).
+    record is its trace record (None if tracing is disabled).
+    """
+    if cache is None:
+        return None, None
+    with tr.timed(record, 'cache'):
+        cache_key = cache.key(infile)
+        text = cache.get(cache_key, encoded=True)
+    if text is None:
+        return cache_key, None
+    if record is not None:
+        record['extractor'] = 'cache'
+    return cache_key, _split_result(infile, text, record, textfile, encoded)
+
+def _join_split_file(split, cache=None, textfile=None, encoded=False):
+    """Return the ExtractionResult of split (a _SplitFile whose ranges have all been extracted), joining the
+    texts of its ranges in order and processing them as txt.get_text would process the whole file's,
+    storing the text in cache (an ExtractionCache) if it's not None.
+    """
+    with tr.timed(split.record, 'decode'), profiling.phase('post-processing'):
+        if split.kind == 'pdf':
+            text = pdf.join_pages(split.texts())
+        else:
+            text = audio.join_segments(split.ranges, split.texts())
+        text = txt.process_extracted(text, os.path.splitext(split.infile)[1].lower(), encoded=True)
+    if text and cache is not None:
+        with tr.timed(split.record, 'cache'):
+            cache.put(split.cache_key, text)
+    return _split_result(split.infile, text, split.record, textfile, encoded)
+
+def _batch_task(images):
+    """Return the task (see _Worker.send) of the batch images, a list of (index, infile, cache key) tuples
+    of the images to OCR with a single tesseract invocation. The task is named after the first image.
+    """
+    index, infile, _ = images[0]
+    return (index, infile, None, ('ocr', tuple(images)))
+
+def _batch_result(infile, text, batch_size, batch_record=None, cache=None, cache_key=None, textfile=None,
+                  encoded=False):
+    """Return the ExtractionResult of infile, an image OCRed as part of a batch of batch_size images
+    (see ocr.ocr_batch), processing text as txt.get_text would and storing it in cache (an ExtractionCache)
+    under cache_key if cache is not None. If batch_record (the batch's trace record) is set, the image's
+    record is given an even share of the batch's extraction time.
+    """
+    extension = os.path.splitext(infile)[1].lower()
+    record = None
+    if batch_record is not None:
+        record = tr.new_record(infile)
+        record['type'] = extension
+        record['extractor'] = 'textract'
+        record['batch'] = batch_size
+        record['timings']['extract'] = batch_record['timings'].get('extract', 0) / batch_size
+    with tr.timed(record, 'decode'), profiling.phase('post-processing'):
+        text = txt.process_extracted(text, extension, encoded=True)
+    if text and cache is not None:
+        with tr.timed(record, 'cache'):
+            cache.put(cache_key, text)
+    return _split_result(infile, text, record, textfile, encoded)
+
+def _split_result(infile, text, record=None, textfile=None, encoded=False):
+    """Return the ExtractionResult of infile, a split (or batched) file whose text (UTF-8 encoded) is text,
+    writing it to textfile instead if it's set (see extract_files).
+    """
+    if textfile is not None:
+        if not text:
+            return ExtractionResult(infile, '', None, record)
+        with tr.timed(record, 'write'):
+            fs.write_bytes_to_file(text, textfile)
+        return ExtractionResult(infile, '', None, record, textfile)
+    if not encoded:
+        text = codecs.decode(text, 'utf-8')
+    return ExtractionResult(infile, text, None, record)
+
+def _worker_main(conn, defer_no_ext, cache, memory_limit, trace=False, profiledir=None, encoded=False):
+    """Main loop of a worker process: extract each file received over conn and send back its result
+    (along with its trace record if trace is set), until None is received or the pipe is closed.
+    If profiledir is set, the worker profiles its extractions and writes its profiles there when it exits
+    (workers that are killed, e.g. on timeout, lose theirs).
+    """
+    # Run in a process group of our own, so that the parent can kill us along with any program we start
+    os.setpgid(0, 0)
+    # Interrupting a run is handled by the parent process, which stops its workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Forked workers inherit the parent's profiler, which must not record the worker's activity
+    profiling.start_worker(profiledir)
+    # textract's parsers are not imported here: they're inherited if the parent imported them before forking,
+    # and otherwise textract imports the parser of each format on first use
+    if memory_limit is not None:
+        _limit_memory(memory_limit)
+    _init_worker(cache)
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        index, infile, textfile, part = task
+        record = tr.new_record(infile) if trace else None
+        try:
+            with profiling.phase('extraction'):
+                if part is not None:
+                    with tr.timed(record, 'extract'):
+                        text = _extract_part(infile, *part)
+                else:
+                    text = _extract(infile, defer_no_ext, record, textfile, encoded)[1]
+        except MemoryError:
+            conn.send((index, '', 'memory limit exceeded', record, None))
+            # The process may be left in an inconsistent state, so let the parent replace it
+            break
+        except Exception as e:
+            conn.send((index, '', _error_message(e), record, None))
+        else:
+            # The text file is only left behind if there was text
+            if textfile is not None and text is not None and not os.path.exists(textfile):
+                textfile = None
+            # Memoryviews can't be pickled; sending the text copies it anyway
+            if isinstance(text, memoryview):
+                text = text.tobytes()
+            conn.send((index, text, None, record, textfile))
+    profiling.stop_worker()
+    conn.close()
+
+def _limit_memory(memory_limit):
+    """Limit the address space of the current process (and of the programs it starts) to memory_limit bytes."""
+    if resource is None: # pragma: no cover
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+def _init_worker(cache):
+    """Set up a worker process, storing the extraction cache it has to use."""
+    global _worker_cache
+    _worker_cache = cache
+
+def _extract(infile, defer_no_ext=False, trace=None, textfile=None, encoded=False):
+    """Extract text from infile inside a worker process, returning an (infile, text) tuple.
+    If defer_no_ext is set and infile has neither an extension nor a type detectable from its content,
+    text is None, signalling that the file must be extracted by the parent process.
+    If trace (a record from trace.new_record) is provided, the extraction is recorded in it.
+    If textfile is set, the text is streamed to it (see _stream_text) and text is an empty string;
+    if encoded is set, text is UTF-8 encoded (see get_text_cached).
+    """
+    if defer_no_ext and not os.path.splitext(infile)[1] and filetype.sniff_extension(infile) is None:
+        return infile, None
+    if textfile is not None:
+        _stream_text(infile, textfile, disable_no_ext_prompt=True, cache=_worker_cache, trace=trace)
+        return infile, ''
+    return infile, get_text_cached(infile, disable_no_ext_prompt=True, cache=_worker_cache, trace=trace,
+                                   encoded=encoded)
+
+def _extract_part(infile, kind, detail):
+    """Extract the text of the part of infile given by kind and detail (see _Worker.send) inside a worker process."""
+    if kind == 'pdf':
+        return pdf.extract_pages(infile, *detail)
+    if kind == 'audio':
+        return audio.transcribe_segment(infile, *detail)
+    return ocr.ocr_batch([image for _, image, _ in detail])
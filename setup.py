@@ -19,6 +19,7 @@ setup(name='parsa',
                   'parsa=parsa.parsa:main',
             ],
       },
+      python_requires='>=3.5',
       zip_safe=False,
       classifiers=[
             "Development Status :: 5 - Production/Stable",
@@ -28,8 +29,8 @@ setup(name='parsa',
             "Intended Audience :: Science/Research",
             "Intended Audience :: System Administrators",
             "Intended Audience :: Other Audience",
-            "Programming Language :: Python :: 2.7", 
             "Programming Language :: Python :: 3",
+            "Programming Language :: Python :: 3 :: Only",
             "License :: OSI Approved :: MIT License",
             "Operating System :: POSIX",
             "Topic :: Text Processing",
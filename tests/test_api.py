@@ -0,0 +1,152 @@
+"""Tests for api.py.
+Tests:
+    extract_many:
+        folder
+        file_list
+        single_file
+        missing_input
+        unordered_yields_every_file
+        filters
+        outdir
+        outdir_not_walked
+        interleaved_calls_share_outdir
+        errors_in_results
+        errors_in_results_in_line
+        unsupported_extension_error
+        lazy
+"""
+
+import unittest
+import io
+import os
+import sys
+import tempfile
+import shutil
+
+from unittest import mock
+
+sys.path.append(os.path.abspath('..'))
+import parsa
+from parsa import api
+
+class ExtractManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.indir = tempfile.mkdtemp()
+        self.outdir = tempfile.mkdtemp()
+        self.filelist = [self.create_file('foo' + str(i) + '.txt', 'text' + str(i)) for i in range(4)]
+
+    def tearDown(self):
+        shutil.rmtree(self.indir, ignore_errors=True)
+        shutil.rmtree(self.outdir, ignore_errors=True)
+
+    def create_file(self, filename, text):
+        """Create a file named filename inside the temporary input directory, and return its path."""
+        filepath = os.path.join(self.indir, filename)
+        with open(filepath, 'wb') as f_in:
+            f_in.write(text.encode('utf-8'))
+        return filepath
+
+    def test_extract_many_folder(self):
+        results = sorted(parsa.extract_many(self.indir, jobs=2))
+        self.assertEqual([result.input for result in results], self.filelist)
+        self.assertEqual([result.text for result in results], ['text' + str(i) for i in range(4)])
+        self.assertEqual([result.error for result in results], [None] * 4)
+        self.assertEqual([result.output for result in results], [None] * 4)
+        self.assertIn('extract', results[0].timings)
+
+    def test_extract_many_file_list(self):
+        """Results are yielded in input order by default."""
+        filelist = list(reversed(self.filelist))
+        results = list(parsa.extract_many(filelist, jobs=2))
+        self.assertEqual([result.input for result in results], filelist)
+
+    def test_extract_many_single_file(self):
+        results = list(parsa.extract_many(self.filelist[0], jobs=1))
+        self.assertEqual(results, [api.ExtractedFile(self.filelist[0], 'text0', None, None, results[0].timings)])
+
+    def test_extract_many_missing_input(self):
+        self.assertRaises(ValueError, parsa.extract_many, os.path.join(self.indir, 'missing'))
+
+    def test_extract_many_unordered_yields_every_file(self):
+        results = list(parsa.extract_many(self.filelist, jobs=2, ordered=False))
+        self.assertEqual(sorted(result.input for result in results), self.filelist)
+
+    def test_extract_many_filters(self):
+        self.create_file('bar.csv', 'a,b')
+        results = list(parsa.extract_many(self.indir, jobs=1, extensions=['csv']))
+        self.assertEqual([os.path.basename(result.input) for result in results], ['bar.csv'])
+
+    def test_extract_many_outdir(self):
+        """With an output folder, text is written to files named as the parsa command names them."""
+        self.create_file('empty.txt', '')
+        results = dict((os.path.basename(result.input), result)
+                       for result in parsa.extract_many(self.indir, jobs=2, outdir=self.outdir))
+        self.assertEqual(results['foo0.txt'].output, os.path.join(self.outdir, 'foo0.txt'))
+        self.assertIsNone(results['foo0.txt'].text)
+        with open(results['foo0.txt'].output) as fin:
+            self.assertEqual(fin.read(), 'text0')
+        self.assertIsNone(results['empty.txt'].output)
+        # No temporary file is left behind
+        self.assertEqual(sorted(os.listdir(self.outdir)), ['foo' + str(i) + '.txt' for i in range(4)])
+
+    def test_extract_many_outdir_not_walked(self):
+        outdir = os.path.join(self.indir, 'out')
+        list(parsa.extract_many(self.indir, jobs=1, outdir=outdir))
+        results = list(parsa.extract_many(self.indir, jobs=1, outdir=outdir))
+        self.assertEqual(len(results), 4)
+
+    def test_extract_many_interleaved_calls_share_outdir(self):
+        """Iterators consumed in turn, streaming to the same output folder, don't share temporary files."""
+        indirs = [os.path.join(self.indir, name) for name in ['a', 'b']]
+        for indir in indirs:
+            os.mkdir(indir)
+            for i in range(6):
+                with open(os.path.join(indir, 'f' + str(i) + '.txt'), 'w') as fout:
+                    fout.write(os.path.basename(indir) + str(i) * 1000)
+        iterators = [parsa.extract_many(indir, jobs=2, outdir=self.outdir) for indir in indirs]
+        results = []
+        for pair in zip(*iterators):
+            results.extend(pair)
+        self.assertEqual(len(results), 12)
+        for result in results:
+            self.assertIsNone(result.error)
+            with open(result.input) as fin, open(result.output) as fout:
+                self.assertEqual(fout.read(), fin.read())
+
+    def test_extract_many_errors_in_results(self):
+        """Failures don't raise: they're reported in the results."""
+        missing = os.path.join(self.indir, 'missing.txt')
+        results = list(parsa.extract_many([missing, self.filelist[0]], jobs=2))
+        self.assertIsNotNone(results[0].error)
+        self.assertEqual(results[1].text, 'text0')
+
+    def test_extract_many_errors_in_results_in_line(self):
+        """Files extracted in the current process report their failures the same way."""
+        missing = os.path.join(self.indir, 'missing.pdf')
+        results = list(parsa.extract_many([missing, self.filelist[0]], jobs=1))
+        self.assertTrue(results[0].error.startswith('MissingFileError: '))
+        self.assertEqual(results[1].text, 'text0')
+
+    def test_extract_many_unsupported_extension_error(self):
+        """Unsupported extensions are reported in the results rather than printed."""
+        infile = self.create_file('foo.xyz', 'text')
+        for jobs in [1, 2]:
+            with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                result, = parsa.extract_many([infile], jobs=jobs)
+            self.assertEqual(stdout.getvalue(), '')
+            self.assertTrue(result.error.startswith('ExtensionNotSupported: '))
+            self.assertEqual(result.text, '')
+
+    def test_extract_many_lazy(self):
+        """Inputs are only consumed as results are."""
+        consumed = []
+        def inputs():
+            for infile in self.filelist:
+                consumed.append(infile)
+                yield infile
+        results = parsa.extract_many(inputs(), jobs=1)
+        self.assertEqual(consumed, [])
+        self.assertEqual(next(results).input, self.filelist[0])
+        results.close()
+        self.assertLess(len(consumed), 4)
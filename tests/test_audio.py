@@ -0,0 +1,127 @@
+"""Tests for utils/audio.py.
+Tests:
+    segments:
+        cut_at_silences
+        overlap_without_silences
+        cut_in_complete_silence
+        not_audio
+        too_short
+        malformed
+
+    duration:
+        wav
+
+    transcribe_segment:
+        wav_segment
+
+    join_segments:
+        drops_overlapping_words
+        no_overlap_keeps_repeated_words
+"""
+
+import unittest
+import array
+import contextlib
+import math
+import os
+import sys
+import tempfile
+import shutil
+import wave
+
+from unittest import mock
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import audio
+
+RATE = 8000
+
+def make_wav(path, parts):
+    """Write a mono 16-bit WAV file to path, made of parts: (seconds, loud) pairs of tone (if loud) or silence."""
+    samples = array.array('h')
+    for seconds, loud in parts:
+        for i in range(int(seconds * RATE)):
+            samples.append(int(8000 * math.sin(2 * math.pi * 440 * i / RATE)) if loud else 0)
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    with contextlib.closing(wave.open(path, 'wb')) as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(samples.tobytes())
+    return path
+
+class AudioTest(unittest.TestCase):
+
+    def setUp(self):
+        self.indir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.indir, ignore_errors=True)
+
+    def test_segments_cut_at_silences(self):
+        # Silences from 9.5 to 10.2 and from 19.6 to 20.4 seconds
+        infile = make_wav(os.path.join(self.indir, 'foo.wav'),
+                          [(9.5, True), (0.7, False), (9.4, True), (0.8, False), (9.6, True)])
+        spans = audio.segments(infile, 10)
+        self.assertEqual(len(spans), 3)
+        # Consecutive segments meet (without overlapping) inside the silences
+        self.assertEqual(spans[0][1], spans[1][0])
+        self.assertEqual(spans[1][1], spans[2][0])
+        self.assertTrue(9.5 <= spans[0][1] <= 10.2)
+        self.assertTrue(19.6 <= spans[1][1] <= 20.4)
+        self.assertEqual(spans[2][1], 30)
+
+    def test_segments_overlap_without_silences(self):
+        infile = make_wav(os.path.join(self.indir, 'foo.wav'), [(25, True)])
+        self.assertEqual(audio.segments(infile, 10, overlap=1), [(0, 10.5), (9.5, 25)])
+
+    def test_segments_cut_in_complete_silence(self):
+        infile = make_wav(os.path.join(self.indir, 'foo.wav'), [(25, False)])
+        spans = audio.segments(infile, 10)
+        self.assertEqual(len(spans), 2)
+        # Cut near the nominal end of the first segment, without overlapping
+        self.assertEqual(spans[0][1], spans[1][0])
+        self.assertTrue(9.5 <= spans[0][1] <= 10.5)
+        self.assertEqual(spans[1][1], 25)
+
+    def test_segments_not_audio(self):
+        infile = os.path.join(self.indir, 'foo.txt')
+        with open(infile, 'w') as fout:
+            fout.write('foo')
+        self.assertIsNone(audio.segments(infile, 10))
+
+    def test_segments_too_short(self):
+        infile = make_wav(os.path.join(self.indir, 'foo.wav'), [(19, True)])
+        self.assertIsNone(audio.segments(infile, 10))
+
+    def test_segments_malformed(self):
+        infile = os.path.join(self.indir, 'foo.wav')
+        with open(infile, 'wb') as fout:
+            fout.write(b'not really audio')
+        self.assertIsNone(audio.segments(infile, 10))
+
+    def test_duration_wav(self):
+        infile = make_wav(os.path.join(self.indir, 'foo.wav'), [(1.5, True), (1, False)])
+        self.assertEqual(audio.duration(infile), 2.5)
+
+    def test_transcribe_segment_wav_segment(self):
+        """The segment is handed to textract as a WAV file of its own."""
+        infile = make_wav(os.path.join(self.indir, 'foo.wav'), [(3, True)])
+        durations = []
+        def process(segment_file):
+            durations.append(audio.duration(segment_file))
+            return b'foo\n'
+        with mock.patch('textract.process', side_effect=process):
+            self.assertEqual(audio.transcribe_segment(infile, 1, 2.5), b'foo\n')
+        self.assertEqual(durations, [1.5])
+
+    def test_join_segments_drops_overlapping_words(self):
+        text = audio.join_segments([(0, 10.5), (9.5, 20.5), (19.5, 25)],
+                                   [b'the quick brown fox\n', b'brown fox jumps over\n', u'the lazy dog\n'])
+        self.assertEqual(text, b'the quick brown fox jumps over the lazy dog\n')
+
+    def test_join_segments_no_overlap_keeps_repeated_words(self):
+        """Segments cut at a silence don't overlap, so words they both hold were said twice."""
+        text = audio.join_segments([(0, 10), (10, 20)], [b'yes yes\n', b'yes no\n'])
+        self.assertEqual(text, b'yes yes yes no\n')
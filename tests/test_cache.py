@@ -0,0 +1,150 @@
+"""Tests for utils/cache.py.
+Tests:
+    ExtractionCache:
+        key_same_content_different_path
+        key_different_content
+        key_different_extension
+        get_missing
+        put_and_get
+        put_and_get_keeps_newlines
+        put_and_get_encoded
+        put_file_and_get_file
+        put_file_keeps_newlines
+        get_file_missing
+        evict_least_recently_used
+        evict_skipped_while_locked
+        put_entry_evicted_by_other_process
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+from unittest import mock
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import cache as cache_module
+from parsa.utils import filesystem as fs
+from parsa.utils.cache import ExtractionCache
+
+class ExtractionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cachedir = os.path.join(self.tmpdir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def create_file(self, filename, text):
+        filepath = os.path.join(self.tmpdir, filename)
+        with open(filepath, 'w') as fout:
+            fout.write(text)
+        return filepath
+
+    def test_key_same_content_different_path(self):
+        cache = ExtractionCache(self.cachedir)
+        key1 = cache.key(self.create_file('foo.pdf', 'foo'))
+        key2 = cache.key(self.create_file('bar.pdf', 'foo'))
+        self.assertEqual(key1, key2)
+
+    def test_key_different_content(self):
+        cache = ExtractionCache(self.cachedir)
+        key1 = cache.key(self.create_file('foo.pdf', 'foo'))
+        key2 = cache.key(self.create_file('bar.pdf', 'bar'))
+        self.assertNotEqual(key1, key2)
+
+    def test_key_different_extension(self):
+        cache = ExtractionCache(self.cachedir)
+        key1 = cache.key(self.create_file('foo.pdf', 'foo'))
+        key2 = cache.key(self.create_file('foo.docx', 'foo'))
+        self.assertNotEqual(key1, key2)
+
+    def test_get_missing(self):
+        cache = ExtractionCache(self.cachedir)
+        self.assertIsNone(cache.get('0' * 64))
+
+    def test_put_and_get(self):
+        cache = ExtractionCache(self.cachedir)
+        key = cache.key(self.create_file('foo.pdf', 'foo'))
+        cache.put(key, u'text è')
+        # A new instance (e.g. from another process) sees the entry as well
+        self.assertEqual(ExtractionCache(self.cachedir).get(key), u'text è')
+
+    def test_put_and_get_keeps_newlines(self):
+        cache = ExtractionCache(self.cachedir)
+        cache.put('a' * 64, u'foo\r\nbar\n')
+        self.assertEqual(cache.get('a' * 64), u'foo\r\nbar\n')
+
+    def test_put_and_get_encoded(self):
+        """Encoded text is stored and returned as it is, and is the same as the text it encodes."""
+        cache = ExtractionCache(self.cachedir)
+        cache.put('a' * 64, memoryview(u'text \xe8\r\n'.encode('utf-8')))
+        self.assertEqual(cache.get('a' * 64, encoded=True), u'text \xe8\r\n'.encode('utf-8'))
+        self.assertEqual(cache.get('a' * 64), u'text \xe8\r\n')
+
+    def test_put_file_and_get_file(self):
+        cache = ExtractionCache(self.cachedir)
+        textfile = self.create_file('foo_pdf.txt', u'text è\nbar\n')
+        with mock.patch.object(cache_module, '_COPY_CHUNK_SIZE', 2):
+            cache.put_file('a' * 64, textfile)
+            outfile = os.path.join(self.tmpdir, 'bar_pdf.txt')
+            self.assertTrue(cache.get_file('a' * 64, outfile))
+        with open(outfile, 'rb') as fout, open(textfile, 'rb') as fin:
+            self.assertEqual(fout.read(), fin.read())
+        self.assertEqual(cache.get('a' * 64), u'text è\nbar\n')
+
+    def test_put_file_keeps_newlines(self):
+        """Entries stored from a file hold its bytes, so hits return the same text as the first extraction."""
+        cache = ExtractionCache(self.cachedir)
+        textfile = os.path.join(self.tmpdir, 'foo_pdf.txt')
+        fs.write_str_to_file(u'a\r\nb\r\n\u00e8', textfile)
+        cache.put_file('a' * 64, textfile)
+        outfile = os.path.join(self.tmpdir, 'bar_pdf.txt')
+        self.assertTrue(cache.get_file('a' * 64, outfile))
+        with open(outfile, 'rb') as fout:
+            self.assertEqual(fout.read(), u'a\r\nb\r\n\u00e8'.encode('utf-8'))
+        self.assertEqual(cache.get('a' * 64, encoded=True), u'a\r\nb\r\n\u00e8'.encode('utf-8'))
+
+    def test_get_file_missing(self):
+        cache = ExtractionCache(self.cachedir)
+        outfile = os.path.join(self.tmpdir, 'foo_pdf.txt')
+        self.assertFalse(cache.get_file('0' * 64, outfile))
+        self.assertFalse(os.path.exists(outfile))
+
+    def test_evict_least_recently_used(self):
+        cache = ExtractionCache(self.cachedir, max_size=25)
+        cache.put('a' * 64, u'0123456789')
+        cache.put('b' * 64, u'0123456789')
+        # Make 'a' the most recently used entry
+        entry_a = cache._entry_path('a' * 64)
+        os.utime(entry_a, (0, 0))
+        os.utime(cache._entry_path('b' * 64), (0, 0))
+        cache.get('a' * 64)
+        # Going beyond max_size evicts the least recently used entry ('b')
+        cache.put('c' * 64, u'0123456789')
+        self.assertIsNotNone(cache.get('a' * 64))
+        self.assertIsNone(cache.get('b' * 64))
+        self.assertIsNotNone(cache.get('c' * 64))
+
+    def test_evict_skipped_while_locked(self):
+        cache = ExtractionCache(self.cachedir, max_size=5)
+        lock_path = os.path.join(self.cachedir, cache_module._LOCK_FILENAME)
+        with cache_module._EvictionLock(lock_path) as acquired:
+            self.assertTrue(acquired)
+            # Another process is evicting, so the entry is not removed
+            cache.put('a' * 64, u'0123456789')
+        self.assertIsNotNone(cache.get('a' * 64))
+
+    def test_put_entry_evicted_by_other_process(self):
+        """An entry evicted by another process as soon as it's stored still counts towards the cache's size."""
+        cache = ExtractionCache(self.cachedir, max_size=100)
+        def replace_and_evict(src, dst):
+            os.replace(src, dst)
+            os.remove(dst)
+        with mock.patch('parsa.utils.filesystem.replace_file', side_effect=replace_and_evict):
+            cache.put('a' * 64, u'0123456789')
+        self.assertIsNone(cache.get('a' * 64))
+        self.assertEqual(cache._size_estimate, 10)
@@ -7,10 +7,14 @@ Tests:
 
     _set_arguments:
         tested implicitly in the parse_arguments test
+
+    startup:
+        no_textract_on_import
 """
 
 import unittest
 import os
+import subprocess
 import sys
 
 try:
@@ -21,6 +25,9 @@ except ImportError:
 sys.path.append(os.path.abspath('..'))
 from parsa.utils import cli
 
+# Root of the repository, so that parsa can be imported from a fresh interpreter
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
 class CLITest(unittest.TestCase):
 
     def test_parse_arguments_empty_args(self): 
@@ -51,4 +58,10 @@ class CLITest(unittest.TestCase):
         with mock.patch.object(sys, 'argv', testargs):
             args = vars(cli.parse_arguments())
             self.assertEqual(args['input'], cli_input_arg)
-            self.assertEqual(args['output'], cli_output_arg)
\ No newline at end of file
+            self.assertEqual(args['output'], cli_output_arg)
+
+    def test_startup_no_textract_on_import(self):
+        """Importing parsa (e.g. to print --help) must not import textract or its parsers."""
+        code = "import sys, parsa.parsa; print(any(m.split('.')[0] in ('textract', 'chardet') for m in sys.modules))"
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=REPO_ROOT)
+        self.assertEqual(output.strip(), b'False')
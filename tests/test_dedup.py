@@ -0,0 +1,85 @@
+"""Tests for utils/dedup.py.
+Tests:
+    DuplicateFinder:
+        unique_size_not_read
+        same_content
+        same_size_different_content
+        same_partial_hash_different_content
+        first_file_is_original
+        different_extensions_not_duplicates
+        unreadable_file_not_duplicate
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+from unittest import mock
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils.dedup import DuplicateFinder
+
+class DuplicateFinderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def create_file(self, filename, data):
+        filepath = os.path.join(self.tmpdir, filename)
+        with open(filepath, 'wb') as fout:
+            fout.write(data)
+        return filepath
+
+    def find(self, finder, filepath):
+        return finder.find(filepath, os.path.getsize(filepath))
+
+    def test_unique_size_not_read(self):
+        """Files with a size no other file has are never opened."""
+        finder = DuplicateFinder()
+        filelist = [self.create_file('foo' + str(i), b'x' * i) for i in range(5)]
+        with mock.patch('parsa.utils.dedup.open', create=True) as mock_open:
+            self.assertEqual([self.find(finder, filepath) for filepath in filelist], [None] * 5)
+        self.assertFalse(mock_open.called)
+
+    def test_same_content(self):
+        finder = DuplicateFinder()
+        original = self.create_file('foo', b'foo')
+        self.assertIsNone(self.find(finder, original))
+        self.assertEqual(self.find(finder, self.create_file('bar', b'foo')), original)
+
+    def test_same_size_different_content(self):
+        finder = DuplicateFinder()
+        self.assertIsNone(self.find(finder, self.create_file('foo', b'foo')))
+        self.assertIsNone(self.find(finder, self.create_file('bar', b'bar')))
+
+    def test_same_partial_hash_different_content(self):
+        """Files that only differ after their first partial_size bytes are told apart by their full hash."""
+        finder = DuplicateFinder(partial_size=4)
+        original = self.create_file('foo', b'headfoo')
+        self.assertIsNone(self.find(finder, original))
+        self.assertIsNone(self.find(finder, self.create_file('bar', b'headbar')))
+        self.assertEqual(self.find(finder, self.create_file('baz', b'headfoo')), original)
+
+    def test_first_file_is_original(self):
+        finder = DuplicateFinder(partial_size=4)
+        filelist = [self.create_file('foo' + str(i), b'same content') for i in range(4)]
+        results = [self.find(finder, filepath) for filepath in filelist]
+        self.assertEqual(results, [None] + [filelist[0]] * 3)
+
+    def test_different_extensions_not_duplicates(self):
+        """The extension picks the extractor, so only files with the same extension (in any case) are duplicates."""
+        finder = DuplicateFinder()
+        original = self.create_file('data.csv', b'a,b\nc,d\n')
+        self.assertIsNone(self.find(finder, original))
+        self.assertIsNone(self.find(finder, self.create_file('data.txt', b'a,b\nc,d\n')))
+        self.assertEqual(self.find(finder, self.create_file('copy.CSV', b'a,b\nc,d\n')), original)
+
+    def test_unreadable_file_not_duplicate(self):
+        finder = DuplicateFinder()
+        self.assertIsNone(self.find(finder, self.create_file('foo', b'foo')))
+        self.assertIsNone(finder.find(os.path.join(self.tmpdir, 'missing'), 3))
@@ -6,6 +6,14 @@ Tests:
         two_conflicts_in_outdir
         ten_conflicts_in_outdir
     
+    OutputNameIndex:
+        same_names_as_compose_unique_filepath
+        existing_conflicts_in_outdir
+        claim_creates_file
+        claimed_file_permissions
+        name_taken_after_listing
+        concurrent_allocations_are_unique
+
     get_filelist:
         1_file_in_folder
         2_files_in_folder
@@ -16,6 +24,11 @@ Tests:
         10000_files_in_2_layers_of_subfolders_99_files_each
         1000_files_in_10_layers_of_subfolders_10_files_each
         10000_files_in_100_layers_of_subfolders_10_files_each
+
+    iter_files:
+        is_lazy
+        same_order_as_os_walk
+        symlinked_folder_not_followed
     
     set_outdir:
         with_outdir_provided
@@ -25,6 +38,15 @@ Tests:
     write_str_to_file:
         basic test
         outfile_exists
+        same_as_write_bytes_to_file
+
+    write_bytes_to_file:
+        memoryview
+
+    link_file:
+        hardlink
+        overwrites_destination
+        falls_back_to_copy
     
 Tests for test_filesystem.py:
     generate_conflicts:
@@ -37,6 +59,10 @@ import os
 import sys
 import tempfile
 import shutil
+import stat
+import threading
+
+from unittest import mock
 
 sys.path.append(os.path.abspath('..'))
 from parsa.utils import filesystem as fs
@@ -78,9 +104,7 @@ class FilepathCompositionTestCase(unittest.TestCase):
 class FilepathCompositionTest(FilepathCompositionTestCase):
     """Tests involving compose_unique_filepath.
     No setUp or tearDown functions are present,
-    as for most of these tests a different setUp and tearDown
-    is required for Python 2.x and Python 3.x.
-    Moreover, the tests involve operating
+    as the tests involve operating
     inside with statements, which need to be 
     inside the test functions themselves
     (also causing a deal of code repetition)
@@ -100,22 +124,9 @@ class FilepathCompositionTest(FilepathCompositionTestCase):
         """Compose an output filepath for 'foo.pdf', with no file named 'foo.txt' in the output directory.
         Expected output: 'foo.txt'
         """
-        # Python 2.x
-        # Differences with the Python 3.x test:
-        #   tempfile.mkdtemp() is used instead of tempfile.TemporaryDirectory()
-        #   shutil.rmtree is used instead of os.remove to remove the temporary directory
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            outdir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as outdir:
             outfile = fs.compose_unique_filepath(self.infile, outdir)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(outdir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as outdir:
-                outfile = fs.compose_unique_filepath(self.infile, outdir)
         expected_outfile = os.path.join(outdir, 'foo.txt')
         self.assertEqual(outfile, expected_outfile)
 
@@ -124,32 +135,14 @@ class FilepathCompositionTest(FilepathCompositionTestCase):
         when a file named 'foo.txt' is already present in the output directory.
         Expected output: 'foo.pdf.txt'
         """
-        # Python 2.x
-        # Differences with the Python 3.x test:
-        #   tempfile.mkdtemp() is used instead of tempfile.TemporaryDirectory()
-        #   shutil.rmtree is used instead of os.remove to remove the temporary directory
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            outdir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as outdir:
             # Create a temporary file named 'foo.txt'
             conflicts = self.generate_conflicts(1, outdir)
             with open(conflicts[0], 'w'):
                 outfile = fs.compose_unique_filepath(self.infile, outdir)
             # Remove the temporary file
             os.remove(conflicts[0])
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(outdir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as outdir:
-                # Create a temporary file named 'foo.txt'
-                conflicts = self.generate_conflicts(1, outdir)
-                with open(conflicts[0], 'w'):
-                    outfile = fs.compose_unique_filepath(self.infile, outdir)
-                # Remove the temporary file
-                os.remove(conflicts[0])
         expected_outfile = os.path.join(outdir, 'foo.pdf.txt')
         self.assertEqual(outfile, expected_outfile)
 
@@ -158,31 +151,15 @@ class FilepathCompositionTest(FilepathCompositionTestCase):
         when two files, named 'foo.txt' and 'foo.pdf.txt' respectively, are already present in the output directory.
         Expected output: 'foo.pdf2.txt'
         """
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            outdir = tempfile.mkdtemp()
-            # Create two temporary files named 'foo.txt' and 'foo.pdf.txt'
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as outdir:
+            # Create a temporary file named 'foo.txt'
             conflicts = self.generate_conflicts(2, outdir)
             with open(conflicts[0], 'w'), open (conflicts[1], 'w'):
                 outfile = fs.compose_unique_filepath(self.infile, outdir)
             # Remove the temporary files
             for conflict in conflicts:
                 os.remove(conflict)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(outdir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as outdir:
-                # Create a temporary file named 'foo.txt'
-                conflicts = self.generate_conflicts(2, outdir)
-                with open(conflicts[0], 'w'), open (conflicts[1], 'w'):
-                    outfile = fs.compose_unique_filepath(self.infile, outdir)
-                # Remove the temporary files
-                for conflict in conflicts:
-                    os.remove(conflict)
         expected_outfile = os.path.join(outdir, 'foo.pdf2.txt')
         self.assertEqual(outfile, expected_outfile)
 
@@ -192,13 +169,10 @@ class FilepathCompositionTest(FilepathCompositionTestCase):
         and 'foo.pdf2.txt' through 'foo.pdf9.txt' are present.
         Expected output: 'foo.pdf10.txt'
         """
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            outdir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as outdir:
             # Create the temp files
             conflicts = self.generate_conflicts(10, outdir)
-            # AFAIK, there is no completely safe way of opening a list of files using a with statement in Python 2.x
             with open(conflicts[0], 'w'), \
                  open (conflicts[1], 'w'), \
                  open (conflicts[2], 'w'), \
@@ -213,29 +187,6 @@ class FilepathCompositionTest(FilepathCompositionTestCase):
             # Remove the temporary files
             for conflict in conflicts:
                 os.remove(conflict)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(outdir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as outdir:
-                # Create the temp files
-                conflicts = self.generate_conflicts(10, outdir)
-                with open(conflicts[0], 'w'), \
-                     open (conflicts[1], 'w'), \
-                     open (conflicts[2], 'w'), \
-                     open (conflicts[3], 'w'), \
-                     open (conflicts[4], 'w'), \
-                     open (conflicts[5], 'w'), \
-                     open (conflicts[6], 'w'), \
-                     open (conflicts[7], 'w'), \
-                     open (conflicts[8], 'w'), \
-                     open (conflicts[9], 'w'):
-                    outfile = fs.compose_unique_filepath(self.infile, outdir)
-                # Remove the temporary files
-                for conflict in conflicts:
-                    os.remove(conflict)
         expected_outfile = os.path.join(outdir, 'foo.pdf10.txt')
         self.assertEqual(outfile, expected_outfile)
     
@@ -250,19 +201,9 @@ class FileSystemTest(unittest.TestCase):
         the test and fill the list.
         Expected output: empty list []
         """
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            indir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as indir:
             filelist = fs.get_filelist(indir)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(indir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as indir:
-                filelist = fs.get_filelist(indir)
         # Empty lists evaluate to false
         self.assertFalse(filelist)
 
@@ -271,30 +212,15 @@ class FileSystemTest(unittest.TestCase):
         Expected output: list with one string, equal to the filepath of the temporary file created
         """
         files_created = []
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            indir = tempfile.mkdtemp()
-            # delete is set to False to avoid OSError at the end of the test
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as indir:
+            # delete is set to False to avoid FileNotFoundError at the end of the test
             file1 = tempfile.NamedTemporaryFile(dir=indir, delete=False)
             files_created.append(file1.name)
             filelist = fs.get_filelist(indir)
             # Remove the temporary file manually as a precaution 
+            # (the with statement automatically deletes the folder)
             os.remove(file1.name)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(indir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as indir:
-                # delete is set to False to avoid FileNotFoundError at the end of the test
-                file1 = tempfile.NamedTemporaryFile(dir=indir, delete=False)
-                files_created.append(file1.name)
-                filelist = fs.get_filelist(indir)
-                # Remove the temporary file manually as a precaution 
-                # (the with statement automatically deletes the folder)
-                os.remove(file1.name)
         self.assertEqual(files_created, filelist)
     
     def test_get_filelist_2_files_in_folder(self):
@@ -302,34 +228,17 @@ class FileSystemTest(unittest.TestCase):
         Expected output: list with two strings, equal to the filepaths of the temporary files created
         """
         files_created = []
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            indir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as indir:
             for _ in range(2):
                 # delete is set to False to avoid OSError at the end of the test
                 file_handler = tempfile.NamedTemporaryFile(dir=indir, delete=False)
                 files_created.append(file_handler.name)
             filelist = fs.get_filelist(indir)
-            # Remove the temporary files manually as a precaution 
+            # Remove the temporary file manually as a precaution 
+            # (the with statement automatically deletes the folder)
             for filepath in files_created:
                 os.remove(filepath)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(indir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as indir:
-                for _ in range(2):
-                    # delete is set to False to avoid OSError at the end of the test
-                    file_handler = tempfile.NamedTemporaryFile(dir=indir, delete=False)
-                    files_created.append(file_handler.name)
-                filelist = fs.get_filelist(indir)
-                # Remove the temporary file manually as a precaution 
-                # (the with statement automatically deletes the folder)
-                for filepath in files_created:
-                    os.remove(filepath)
         # Typecast both lists to sets to make an unordered comparison
         self.assertEqual(set(files_created), set(filelist))
 
@@ -338,34 +247,17 @@ class FileSystemTest(unittest.TestCase):
         Expected output: list with 10 strings, equal to the filepaths of the temporary files created
         """
         files_created = []
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            indir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as indir:
             for _ in range(10):
                 # delete is set to False to avoid OSError at the end of the test
                 file_handler = tempfile.NamedTemporaryFile(dir=indir, delete=False)
                 files_created.append(file_handler.name)
             filelist = fs.get_filelist(indir)
-            # Remove the temporary files manually as a precaution 
+            # Remove the temporary file manually as a precaution 
+            # (the with statement automatically deletes the folder)
             for filepath in files_created:
                 os.remove(filepath)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(indir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as indir:
-                for _ in range(10):
-                    # delete is set to False to avoid OSError at the end of the test
-                    file_handler = tempfile.NamedTemporaryFile(dir=indir, delete=False)
-                    files_created.append(file_handler.name)
-                filelist = fs.get_filelist(indir)
-                # Remove the temporary file manually as a precaution 
-                # (the with statement automatically deletes the folder)
-                for filepath in files_created:
-                    os.remove(filepath)
         # Typecast both lists to sets to make an unordered comparison
         self.assertEqual(set(files_created), set(filelist))
 
@@ -374,34 +266,17 @@ class FileSystemTest(unittest.TestCase):
         Expected output: list with 1000 strings, equal to the filepaths of the temporary files created
         """
         files_created = []
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            indir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as indir:
             for _ in range(1000):
                 # delete is set to False to avoid OSError at the end of the test
                 file_handler = tempfile.NamedTemporaryFile(dir=indir, delete=False)
                 files_created.append(file_handler.name)
             filelist = fs.get_filelist(indir)
-            # Remove the temporary files manually as a precaution 
+            # Remove the temporary file manually as a precaution 
+            # (the with statement automatically deletes the folder)
             for filepath in files_created:
                 os.remove(filepath)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(indir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as indir:
-                for _ in range(1000):
-                    # delete is set to False to avoid OSError at the end of the test
-                    file_handler = tempfile.NamedTemporaryFile(dir=indir, delete=False)
-                    files_created.append(file_handler.name)
-                filelist = fs.get_filelist(indir)
-                # Remove the temporary file manually as a precaution 
-                # (the with statement automatically deletes the folder)
-                for filepath in files_created:
-                    os.remove(filepath)
         # Typecast both lists to sets to make an unordered comparison
         self.assertEqual(set(files_created), set(filelist))
 
@@ -410,35 +285,18 @@ class FileSystemTest(unittest.TestCase):
         Expected output: list with 10 strings, equal to the filepaths of the temporary files created
         """
         files_created = []
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            indir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as indir:
+            # Create ten temporary subdirectories inside the temporary directory
             for _ in range(10):
                 subdir = tempfile.mkdtemp(dir=indir)
                 file_handler = tempfile.NamedTemporaryFile(dir=subdir, delete=False)
                 files_created.append(file_handler.name)
             filelist = fs.get_filelist(indir)
-            # Remove the temporary files manually as a precaution 
+            # Remove the temporary file manually as a precaution 
+            # (the with statement automatically deletes a TemporaryDirectory type of folder)
             for filepath in files_created:
                 os.remove(filepath)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(indir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as indir:
-                # Create ten temporary subdirectories inside the temporary directory
-                for _ in range(10):
-                    subdir = tempfile.mkdtemp(dir=indir)
-                    file_handler = tempfile.NamedTemporaryFile(dir=subdir, delete=False)
-                    files_created.append(file_handler.name)
-                filelist = fs.get_filelist(indir)
-                # Remove the temporary file manually as a precaution 
-                # (the with statement automatically deletes a TemporaryDirectory type of folder)
-                for filepath in files_created:
-                    os.remove(filepath)
         # Typecast both lists to sets to make an unordered comparison
         self.assertEqual(set(files_created), set(filelist))
         
@@ -447,11 +305,9 @@ class FileSystemTest(unittest.TestCase):
         Expected output: list with 100 strings, equal to the filepaths of the temporary files created
         """
         files_created = []
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            indir = tempfile.mkdtemp()
-            # Create ten temporary subdirectories
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as indir:
+            # Create ten temporary subdirectories inside the temporary directory
             for _ in range(10):
                 subdir = tempfile.mkdtemp(dir=indir)
                 # Create ten temporary files inside each temporary subdirectory
@@ -459,28 +315,10 @@ class FileSystemTest(unittest.TestCase):
                     file_handler = tempfile.NamedTemporaryFile(dir=subdir, delete=False)
                     files_created.append(file_handler.name)
             filelist = fs.get_filelist(indir)
-            # Remove the temporary files manually as a precaution 
+            # Remove the temporary file manually as a precaution 
+            # (the with statement automatically deletes a TemporaryDirectory type of folder)
             for filepath in files_created:
                 os.remove(filepath)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(indir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as indir:
-                # Create ten temporary subdirectories inside the temporary directory
-                for _ in range(10):
-                    subdir = tempfile.mkdtemp(dir=indir)
-                    # Create ten temporary files inside each temporary subdirectory
-                    for _ in range(10):
-                        file_handler = tempfile.NamedTemporaryFile(dir=subdir, delete=False)
-                        files_created.append(file_handler.name)
-                filelist = fs.get_filelist(indir)
-                # Remove the temporary file manually as a precaution 
-                # (the with statement automatically deletes a TemporaryDirectory type of folder)
-                for filepath in files_created:
-                    os.remove(filepath)
         # Typecast both lists to sets to make an unordered comparison
         self.assertEqual(set(files_created), set(filelist))
 
@@ -489,10 +327,8 @@ class FileSystemTest(unittest.TestCase):
         Expected output: list with 10000 strings, equal to the filepaths of the temporary files created
         """
         files_created = []
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            indir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as indir:
             # Create ten temporary subdirectories inside the temporary directory
             for _ in range(10):
                 subdir = tempfile.mkdtemp(dir=indir)
@@ -508,35 +344,10 @@ class FileSystemTest(unittest.TestCase):
                         file_handler = tempfile.NamedTemporaryFile(dir=subsubdir, delete=False)
                         files_created.append(file_handler.name)
             filelist = fs.get_filelist(indir)
-            # Remove the temporary files manually as a precaution 
+            # Remove the temporary file manually as a precaution 
+            # (the with statement automatically deletes a TemporaryDirectory type of folder)
             for filepath in files_created:
                 os.remove(filepath)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(indir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as indir:
-                # Create ten temporary subdirectories inside the temporary directory
-                for _ in range(10):
-                    subdir = tempfile.mkdtemp(dir=indir)
-                    # Create ten temporary files inside each temporary subdirectory
-                    for _ in range(10):
-                        file_handler = tempfile.NamedTemporaryFile(dir=subdir, delete=False)
-                        files_created.append(file_handler.name)
-                    # Create ten temporary subsubdirectories
-                    for _ in range(10):
-                        subsubdir = tempfile.mkdtemp(dir=subdir)
-                        # Create 99 temporary files inside each temporary subsubdirectory
-                        for _ in range(99):
-                            file_handler = tempfile.NamedTemporaryFile(dir=subsubdir, delete=False)
-                            files_created.append(file_handler.name)
-                filelist = fs.get_filelist(indir)
-                # Remove the temporary file manually as a precaution 
-                # (the with statement automatically deletes a TemporaryDirectory type of folder)
-                for filepath in files_created:
-                    os.remove(filepath)
         # Typecast both lists to sets to make an unordered comparison
         self.assertEqual(set(files_created), set(filelist))
 
@@ -545,19 +356,20 @@ class FileSystemTest(unittest.TestCase):
         Expected output: list with 10000 strings, equal to the filepaths of the temporary files created
         """
         files_created = []
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            indir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as indir:
+
             # Create 10 base subdirectories
             for _ in range(10):
                 subdirs = []
                 subdir_handler = tempfile.mkdtemp(dir=indir)
                 subdirs.append(subdir_handler)
+
                 # Create 100 temporary files inside each base subdirectory
                 for _ in range(100):
                     file_handler = tempfile.NamedTemporaryFile(dir=subdir_handler, delete=False)
                     files_created.append(file_handler.name)
+
                 # In each base subdirectory, create 9 layers of subdirectories (10 layers total)
                 for i in range(9):
                     # The first subdir is created inside the base subdirectory;
@@ -565,52 +377,17 @@ class FileSystemTest(unittest.TestCase):
                     # The variable i is equal to the current layer - 1
                     subdir_handler = tempfile.mkdtemp(dir=subdirs[i])
                     subdirs.append(subdir_handler)
+
                     # Create 100 temporary files inside each layer
                     for _ in range(100):
                         file_handler = tempfile.NamedTemporaryFile(dir=subdir_handler, delete=False)
                         files_created.append(file_handler.name)
 
             filelist = fs.get_filelist(indir)
-            # Remove the temporary files manually as a precaution 
+            # Remove the temporary file manually as a precaution 
+            # (the with statement automatically deletes a TemporaryDirectory type of folder)
             for filepath in files_created:
                 os.remove(filepath)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(indir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as indir:
-
-                # Create 10 base subdirectories
-                for _ in range(10):
-                    subdirs = []
-                    subdir_handler = tempfile.mkdtemp(dir=indir)
-                    subdirs.append(subdir_handler)
-
-                    # Create 100 temporary files inside each base subdirectory
-                    for _ in range(100):
-                        file_handler = tempfile.NamedTemporaryFile(dir=subdir_handler, delete=False)
-                        files_created.append(file_handler.name)
-
-                    # In each base subdirectory, create 9 layers of subdirectories (10 layers total)
-                    for i in range(9):
-                        # The first subdir is created inside the base subdirectory;
-                        # each subsequent subdir is created inside the previous one.
-                        # The variable i is equal to the current layer - 1
-                        subdir_handler = tempfile.mkdtemp(dir=subdirs[i])
-                        subdirs.append(subdir_handler)
-
-                        # Create 100 temporary files inside each layer
-                        for _ in range(100):
-                            file_handler = tempfile.NamedTemporaryFile(dir=subdir_handler, delete=False)
-                            files_created.append(file_handler.name)
-
-                filelist = fs.get_filelist(indir)
-                # Remove the temporary file manually as a precaution 
-                # (the with statement automatically deletes a TemporaryDirectory type of folder)
-                for filepath in files_created:
-                    os.remove(filepath)
         # Typecast both lists to sets to make an unordered comparison
         self.assertEqual(set(files_created), set(filelist))
 
@@ -619,19 +396,20 @@ class FileSystemTest(unittest.TestCase):
         Expected output: list with 10000 strings, equal to the filepaths of the temporary files created
         """
         files_created = []
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            indir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as indir:
+
             # Create 10 base subdirectories
             for _ in range(10):
                 subdirs = []
                 subdir_handler = tempfile.mkdtemp(dir=indir)
                 subdirs.append(subdir_handler)
+
                 # Create ten temporary files inside each base subdirectory
                 for _ in range(10):
                     file_handler = tempfile.NamedTemporaryFile(dir=subdir_handler, delete=False)
                     files_created.append(file_handler.name)
+
                 # In each base subdirectory, create 99 layers of subdirectories (10 layers total)
                 for i in range(99):
                     # The first subdir is created inside the base subdirectory;
@@ -639,55 +417,134 @@ class FileSystemTest(unittest.TestCase):
                     # The variable i is equal to the current layer - 1
                     subdir_handler = tempfile.mkdtemp(dir=subdirs[i])
                     subdirs.append(subdir_handler)
+
                     # Create ten temporary files inside each layer
                     for _ in range(10):
                         file_handler = tempfile.NamedTemporaryFile(dir=subdir_handler, delete=False)
                         files_created.append(file_handler.name)
 
             filelist = fs.get_filelist(indir)
-            # Remove the temporary files manually as a precaution 
+            # Remove the temporary file manually as a precaution 
+            # (the with statement automatically deletes a TemporaryDirectory type of folder)
             for filepath in files_created:
                 os.remove(filepath)
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
-            shutil.rmtree(indir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as indir:
-
-                # Create 10 base subdirectories
-                for _ in range(10):
-                    subdirs = []
-                    subdir_handler = tempfile.mkdtemp(dir=indir)
-                    subdirs.append(subdir_handler)
-
-                    # Create ten temporary files inside each base subdirectory
-                    for _ in range(10):
-                        file_handler = tempfile.NamedTemporaryFile(dir=subdir_handler, delete=False)
-                        files_created.append(file_handler.name)
-
-                    # In each base subdirectory, create 99 layers of subdirectories (10 layers total)
-                    for i in range(99):
-                        # The first subdir is created inside the base subdirectory;
-                        # each subsequent subdir is created inside the previous one.
-                        # The variable i is equal to the current layer - 1
-                        subdir_handler = tempfile.mkdtemp(dir=subdirs[i])
-                        subdirs.append(subdir_handler)
-
-                        # Create ten temporary files inside each layer
-                        for _ in range(10):
-                            file_handler = tempfile.NamedTemporaryFile(dir=subdir_handler, delete=False)
-                            files_created.append(file_handler.name)
-
-                filelist = fs.get_filelist(indir)
-                # Remove the temporary file manually as a precaution 
-                # (the with statement automatically deletes a TemporaryDirectory type of folder)
-                for filepath in files_created:
-                    os.remove(filepath)
         # Typecast both lists to sets to make an unordered comparison
         self.assertEqual(set(files_created), set(filelist))
 
+    def test_output_name_index_same_names_as_compose_unique_filepath(self):
+        """Allocating names for a sequence of inputs gives the same names as compose_unique_filepath."""
+        infiles = ['foo.pdf', 'a/foo.pdf', 'foo.docx', 'b/foo.pdf', 'foo', 'foo', 'bar.pdf']
+        outdir = tempfile.mkdtemp()
+        expected_outfiles = []
+        for infile in infiles:
+            outfile = fs.compose_unique_filepath(infile, outdir)
+            open(outfile, 'w').close()
+            expected_outfiles.append(outfile)
+        shutil.rmtree(outdir, ignore_errors=True)
+        os.makedirs(outdir)
+        outnames = fs.OutputNameIndex(outdir)
+        outfiles = [outnames.allocate(infile) for infile in infiles]
+        shutil.rmtree(outdir, ignore_errors=True)
+        self.assertEqual(outfiles, expected_outfiles)
+
+    def test_output_name_index_existing_conflicts_in_outdir(self):
+        outdir = tempfile.mkdtemp()
+        for conflict in FilepathCompositionTestCase.generate_conflicts(10, outdir):
+            open(conflict, 'w').close()
+        outfile = fs.OutputNameIndex(outdir).allocate('foo.pdf')
+        shutil.rmtree(outdir, ignore_errors=True)
+        self.assertEqual(outfile, os.path.join(outdir, 'foo.pdf10.txt'))
+
+    def test_output_name_index_claim_creates_file(self):
+        outdir = tempfile.mkdtemp()
+        outnames = fs.OutputNameIndex(outdir)
+        claimed_outfile = outnames.allocate('foo.pdf')
+        unclaimed_outfile = outnames.allocate('bar.pdf', claim=False)
+        claimed_exists = os.path.exists(claimed_outfile)
+        unclaimed_exists = os.path.exists(unclaimed_outfile)
+        shutil.rmtree(outdir, ignore_errors=True)
+        self.assertTrue(claimed_exists)
+        self.assertFalse(unclaimed_exists)
+
+    def test_output_name_index_claimed_file_permissions(self):
+        """Claimed outputs get the same permissions as files created with open()."""
+        outdir = tempfile.mkdtemp()
+        claimed_outfile = fs.OutputNameIndex(outdir).allocate('foo.pdf')
+        opened_outfile = os.path.join(outdir, 'bar.txt')
+        open(opened_outfile, 'w').close()
+        claimed_mode = stat.S_IMODE(os.stat(claimed_outfile).st_mode)
+        opened_mode = stat.S_IMODE(os.stat(opened_outfile).st_mode)
+        shutil.rmtree(outdir, ignore_errors=True)
+        self.assertEqual(claimed_mode, opened_mode)
+        self.assertFalse(claimed_mode & stat.S_IXUSR)
+
+    def test_output_name_index_name_taken_after_listing(self):
+        """A name taken by another process after the output directory was listed is not allocated."""
+        outdir = tempfile.mkdtemp()
+        outnames = fs.OutputNameIndex(outdir)
+        open(os.path.join(outdir, 'foo.txt'), 'w').close()
+        outfile = outnames.allocate('foo.pdf')
+        shutil.rmtree(outdir, ignore_errors=True)
+        self.assertEqual(outfile, os.path.join(outdir, 'foo.pdf.txt'))
+
+    def test_output_name_index_concurrent_allocations_are_unique(self):
+        outdir = tempfile.mkdtemp()
+        outnames = fs.OutputNameIndex(outdir)
+        outfiles = []
+        def allocate():
+            for _ in range(100):
+                outfiles.append(outnames.allocate('foo.pdf'))
+        threads = [threading.Thread(target=allocate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        shutil.rmtree(outdir, ignore_errors=True)
+        self.assertEqual(len(set(outfiles)), 400)
+
+    def test_iter_files_is_lazy(self):
+        """The first file is yielded before the subfolders are scanned."""
+        indir = tempfile.mkdtemp()
+        subdir = tempfile.mkdtemp(dir=indir)
+        file_handler = tempfile.NamedTemporaryFile(dir=indir, delete=False)
+        file_handler.close()
+        files = fs.iter_files(indir)
+        first_entry = next(files)
+        # A file created after the first one was yielded is still found, as its folder hasn't been scanned yet
+        late_file_handler = tempfile.NamedTemporaryFile(dir=subdir, delete=False)
+        late_file_handler.close()
+        remaining_paths = [entry.path for entry in files]
+        shutil.rmtree(indir, ignore_errors=True)
+        self.assertEqual(first_entry.path, file_handler.name)
+        self.assertEqual(remaining_paths, [late_file_handler.name])
+
+    def test_iter_files_same_order_as_os_walk(self):
+        indir = tempfile.mkdtemp()
+        for _ in range(5):
+            subdir = tempfile.mkdtemp(dir=indir)
+            tempfile.mkdtemp(dir=subdir)
+            for _ in range(5):
+                tempfile.NamedTemporaryFile(dir=subdir, delete=False).close()
+            tempfile.NamedTemporaryFile(dir=indir, delete=False).close()
+        expected_filelist = []
+        for root, dirs, files in os.walk(indir):
+            for filename in files:
+                expected_filelist.append(os.path.join(root, filename))
+        filelist = [entry.path for entry in fs.iter_files(indir)]
+        shutil.rmtree(indir, ignore_errors=True)
+        self.assertEqual(filelist, expected_filelist)
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'requires os.symlink')
+    def test_iter_files_symlinked_folder_not_followed(self):
+        indir = tempfile.mkdtemp()
+        subdir = tempfile.mkdtemp(dir=indir)
+        file_handler = tempfile.NamedTemporaryFile(dir=subdir, delete=False)
+        file_handler.close()
+        os.symlink(subdir, os.path.join(indir, 'link'))
+        filelist = [entry.path for entry in fs.iter_files(indir)]
+        shutil.rmtree(indir, ignore_errors=True)
+        self.assertEqual(filelist, [file_handler.name])
+
     def test_set_outdir_with_outdir_provided(self):
         indir = 'bar'
         args_outdir = 'foo'
@@ -713,23 +570,75 @@ class FileSystemTest(unittest.TestCase):
     
     def test_write_str_to_file(self):
         expected_text = 'test'
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            # Work in a temporary directory
-            outdir = tempfile.mkdtemp()
+        # Work in a temporary directory
+        with tempfile.TemporaryDirectory() as outdir:
             outfile = os.path.join(outdir, 'foo.txt')
             fs.write_str_to_file(expected_text, outfile)
             with open(outfile, 'r') as f_out:
                 actual_text = f_out.read()
-            # Remove the temporary directory (mdktemp must be manually deleted)
-            # shutil.rmtree is used instead of os.remove to avoid OSError
+        self.assertEqual(actual_text, expected_text)
+
+    def test_write_str_to_file_same_as_write_bytes_to_file(self):
+        """Text is written UTF-8 encoded, whatever the locale, and newlines are not translated."""
+        text = u'r\xe9sum\xe9\r\nna\xefve\n'
+        outdir = tempfile.mkdtemp()
+        try:
+            str_outfile = os.path.join(outdir, 'str.txt')
+            bytes_outfile = os.path.join(outdir, 'bytes.txt')
+            fs.write_str_to_file(text, str_outfile)
+            fs.write_bytes_to_file(text.encode('utf-8'), bytes_outfile)
+            with open(str_outfile, 'rb') as f_str, open(bytes_outfile, 'rb') as f_bytes:
+                self.assertEqual(f_str.read(), f_bytes.read())
+        finally:
+            shutil.rmtree(outdir, ignore_errors=True)
+
+    def test_write_bytes_to_file_memoryview(self):
+        outdir = tempfile.mkdtemp()
+        try:
+            outfile = os.path.join(outdir, 'foo.txt')
+            fs.write_bytes_to_file(memoryview(b'  foo  ')[2:5], outfile)
+            with open(outfile, 'rb') as f_out:
+                self.assertEqual(f_out.read(), b'foo')
+        finally:
+            shutil.rmtree(outdir, ignore_errors=True)
+
+    def test_link_file_hardlink(self):
+        outdir = tempfile.mkdtemp()
+        try:
+            src = os.path.join(outdir, 'foo.txt')
+            dst = os.path.join(outdir, 'bar.txt')
+            fs.write_str_to_file('foo', src)
+            self.assertEqual(fs.link_file(src, dst), 'hardlink')
+            self.assertTrue(os.path.samefile(src, dst))
+        finally:
+            shutil.rmtree(outdir, ignore_errors=True)
+
+    def test_link_file_overwrites_destination(self):
+        outdir = tempfile.mkdtemp()
+        try:
+            src = os.path.join(outdir, 'foo.txt')
+            dst = os.path.join(outdir, 'bar.txt')
+            fs.write_str_to_file('foo', src)
+            fs.write_str_to_file('bar', dst)
+            fs.link_file(src, dst)
+            with open(dst, 'r') as f_out:
+                self.assertEqual(f_out.read(), 'foo')
+            self.assertEqual(sorted(os.listdir(outdir)), ['bar.txt', 'foo.txt'])
+        finally:
+            shutil.rmtree(outdir, ignore_errors=True)
+
+    def test_link_file_falls_back_to_copy(self):
+        """Files are copied if the filesystem supports neither hard links nor reflinks."""
+        outdir = tempfile.mkdtemp()
+        try:
+            src = os.path.join(outdir, 'foo.txt')
+            dst = os.path.join(outdir, 'bar.txt')
+            fs.write_str_to_file('foo', src)
+            with mock.patch('os.link', side_effect=OSError('not supported')), \
+                    mock.patch('fcntl.ioctl', side_effect=OSError('not supported')):
+                self.assertEqual(fs.link_file(src, dst), 'copy')
+            self.assertFalse(os.path.samefile(src, dst))
+            with open(dst, 'r') as f_out:
+                self.assertEqual(f_out.read(), 'foo')
+        finally:
             shutil.rmtree(outdir, ignore_errors=True)
-        # Python 3.x
-        else:
-            # Work in a temporary directory
-            with tempfile.TemporaryDirectory() as outdir:
-                outfile = os.path.join(outdir, 'foo.txt')
-                fs.write_str_to_file(expected_text, outfile)
-                with open(outfile, 'r') as f_out:
-                    actual_text = f_out.read()
-        self.assertEqual(actual_text, expected_text)
\ No newline at end of file
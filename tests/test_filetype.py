@@ -0,0 +1,121 @@
+"""Tests for utils/filetype.py.
+Tests:
+    sniff_extension:
+        signatures
+        wav
+        mp3_without_id3
+        mpeg_header_reserved_values
+        utf16_text_not_mp3
+        html
+        text
+        binary
+        empty_file
+        missing_file
+        docx
+        docx_from_central_directory
+        ole_doc
+"""
+
+import unittest
+import codecs
+import os
+import sys
+import tempfile
+import shutil
+import struct
+import zipfile
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import filetype
+
+class SniffExtensionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def create_file(self, content):
+        """Create a file without an extension holding content, and return its path."""
+        filepath = os.path.join(self.tmpdir, 'foo')
+        with open(filepath, 'wb') as fout:
+            fout.write(content)
+        return filepath
+
+    def test_sniff_extension_signatures(self):
+        samples = {
+            b'%PDF-1.7\n': '.pdf',
+            b'\x89PNG\r\n\x1a\n\x00\x00': '.png',
+            b'\xff\xd8\xff\xe0\x00\x10JFIF': '.jpg',
+            b'GIF89a\x01\x00': '.gif',
+            b'II*\x00\x08\x00': '.tiff',
+            b'OggS\x00\x02': '.ogg',
+            b'ID3\x03\x00': '.mp3',
+            b'{\\rtf1\\ansi': '.rtf',
+            b'%!PS-Adobe-3.0': '.ps',
+        }
+        for content, expected_extension in samples.items():
+            self.assertEqual(filetype.sniff_extension(self.create_file(content)), expected_extension)
+
+    def test_sniff_extension_wav(self):
+        content = b'RIFF' + struct.pack('<I', 36) + b'WAVEfmt '
+        self.assertEqual(filetype.sniff_extension(self.create_file(content)), '.wav')
+
+    def test_sniff_extension_mp3_without_id3(self):
+        self.assertEqual(filetype.sniff_extension(self.create_file(b'\xff\xfb\x90\x64\x00')), '.mp3')
+
+    def test_sniff_extension_mpeg_header_reserved_values(self):
+        # Reserved version, reserved layer, bad bitrate index, reserved sample rate
+        for content in (b'\xff\xeb\x90\x64', b'\xff\xf9\x90\x64', b'\xff\xfb\xf0\x64', b'\xff\xfb\x9c\x64'):
+            self.assertIsNone(filetype.sniff_extension(self.create_file(content)))
+
+    def test_sniff_extension_utf16_text_not_mp3(self):
+        for encoding in ('utf-16-le', 'utf-16-be'):
+            content = codecs.BOM_UTF16_LE if encoding == 'utf-16-le' else codecs.BOM_UTF16_BE
+            content += u'hello world'.encode(encoding)
+            self.assertIsNone(filetype.sniff_extension(self.create_file(content)))
+
+    def test_sniff_extension_html(self):
+        content = b'\n  <!DOCTYPE html>\n<html><body>foo</body></html>'
+        self.assertEqual(filetype.sniff_extension(self.create_file(content)), '.html')
+
+    def test_sniff_extension_text(self):
+        content = u'résumé\nfoo bar\n'.encode('utf-8')
+        self.assertEqual(filetype.sniff_extension(self.create_file(content)), '.txt')
+
+    def test_sniff_extension_binary(self):
+        self.assertIsNone(filetype.sniff_extension(self.create_file(b'\x00\x01\x02\x03')))
+
+    def test_sniff_extension_empty_file(self):
+        self.assertIsNone(filetype.sniff_extension(self.create_file(b'')))
+
+    def test_sniff_extension_missing_file(self):
+        self.assertIsNone(filetype.sniff_extension(os.path.join(self.tmpdir, 'missing')))
+
+    def test_sniff_extension_docx(self):
+        filepath = os.path.join(self.tmpdir, 'foo')
+        with zipfile.ZipFile(filepath, 'w') as docx:
+            docx.writestr('[Content_Types].xml', '<Types/>')
+            docx.writestr('word/document.xml', '<document/>')
+        self.assertEqual(filetype.sniff_extension(filepath), '.docx')
+
+    def test_sniff_extension_docx_from_central_directory(self):
+        """The type is detected from the central directory if the head doesn't identify it."""
+        filepath = os.path.join(self.tmpdir, 'foo')
+        with zipfile.ZipFile(filepath, 'w') as docx:
+            # Incompressible padding, pushing the document's entries beyond the sniffed head
+            docx.writestr('[Content_Types].xml', os.urandom(filetype.SNIFF_SIZE * 2))
+            docx.writestr('word/document.xml', '<document/>')
+        self.assertEqual(filetype.sniff_extension(filepath), '.docx')
+
+    def test_sniff_extension_ole_doc(self):
+        # OLE2 header with 512 byte sectors and the directory in sector 0 (right after the header)
+        header = bytearray(512)
+        header[0:8] = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+        header[30:32] = struct.pack('<H', 9)
+        header[48:52] = struct.pack('<I', 0)
+        directory = u'Root Entry'.encode('utf-16-le').ljust(128, b'\x00')
+        directory += u'WordDocument'.encode('utf-16-le').ljust(128, b'\x00')
+        content = bytes(header) + directory.ljust(512, b'\x00')
+        self.assertEqual(filetype.sniff_extension(self.create_file(content)), '.doc')
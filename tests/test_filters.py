@@ -0,0 +1,99 @@
+"""Tests for utils/filters.py.
+Tests:
+    FileFilter:
+        accept_everything_by_default
+        include_name_glob
+        include_path_glob
+        exclude_name_glob
+        size_limits
+        extensions
+        exclude_extensions
+        prune_excluded_folder
+        prune_exclude_dirs
+        walk_skips_pruned_folders
+        shards_cover_every_file_once
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import filesystem as fs
+from parsa.utils.filters import FileFilter
+from parsa.utils.sharding import Shard
+
+class FileFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.indir = tempfile.mkdtemp()
+        for relpath, size in [('foo.pdf', 10), ('bar.txt', 1000), ('noext', 1), ('docs/report.PDF', 100),
+                              ('.git/objects/blob', 5), ('parsaoutput/foo.txt', 10)]:
+            filepath = os.path.join(self.indir, *relpath.split('/'))
+            if not os.path.isdir(os.path.dirname(filepath)):
+                os.makedirs(os.path.dirname(filepath))
+            with open(filepath, 'wb') as fout:
+                fout.write(b'x' * size)
+
+    def tearDown(self):
+        shutil.rmtree(self.indir, ignore_errors=True)
+
+    def walk(self, file_filter):
+        """Return the relative paths of the files file_filter lets through, walking the input folder with it."""
+        entries = fs.iter_files(self.indir, file_filter.prune)
+        relpaths = [os.path.relpath(entry.path, self.indir).replace(os.sep, '/')
+                    for entry in entries if file_filter.accept(entry)]
+        return sorted(relpaths)
+
+    def test_accept_everything_by_default(self):
+        self.assertEqual(len(self.walk(FileFilter(self.indir))), 6)
+
+    def test_include_name_glob(self):
+        self.assertEqual(self.walk(FileFilter(self.indir, include=['*.pdf'])), ['foo.pdf'])
+
+    def test_include_path_glob(self):
+        self.assertEqual(self.walk(FileFilter(self.indir, include=['docs/*'])), ['docs/report.PDF'])
+
+    def test_exclude_name_glob(self):
+        self.assertEqual(self.walk(FileFilter(self.indir, exclude=['*.txt', 'noext', '.git'])),
+                         ['docs/report.PDF', 'foo.pdf'])
+
+    def test_size_limits(self):
+        self.assertEqual(self.walk(FileFilter(self.indir, min_size=10, max_size=100)),
+                         ['docs/report.PDF', 'foo.pdf', 'parsaoutput/foo.txt'])
+
+    def test_extensions(self):
+        """Extensions are compared in lowercase, with or without their dot; '' stands for no extension."""
+        self.assertEqual(self.walk(FileFilter(self.indir, extensions=['PDF', ''])),
+                         ['.git/objects/blob', 'docs/report.PDF', 'foo.pdf', 'noext'])
+
+    def test_exclude_extensions(self):
+        self.assertEqual(self.walk(FileFilter(self.indir, exclude_extensions=['.txt', 'pdf'])),
+                         ['.git/objects/blob', 'noext'])
+
+    def test_prune_excluded_folder(self):
+        self.assertEqual(self.walk(FileFilter(self.indir, exclude=['.git', 'parsaoutput'])),
+                         ['bar.txt', 'docs/report.PDF', 'foo.pdf', 'noext'])
+
+    def test_prune_exclude_dirs(self):
+        outdir = os.path.join(self.indir, 'parsaoutput')
+        self.assertNotIn('parsaoutput/foo.txt', self.walk(FileFilter(self.indir, exclude_dirs=[outdir])))
+
+    def test_walk_skips_pruned_folders(self):
+        """Pruned folders are not scanned at all."""
+        scanned = []
+        def prune(entry):
+            scanned.append(entry.name)
+            return entry.name == '.git'
+        relpaths = [os.path.relpath(entry.path, self.indir) for entry in fs.iter_files(self.indir, prune)]
+        self.assertEqual(sorted(scanned), ['.git', 'docs', 'parsaoutput'])
+        self.assertNotIn(os.path.join('.git', 'objects', 'blob'), relpaths)
+        self.assertNotIn('objects', scanned)
+
+    def test_shards_cover_every_file_once(self):
+        relpaths = []
+        for index in range(1, 4):
+            relpaths.extend(self.walk(FileFilter(self.indir, shard=Shard(index, 3))))
+        self.assertEqual(sorted(relpaths), self.walk(FileFilter(self.indir)))
@@ -0,0 +1,101 @@
+"""Tests for utils/jobqueue.py.
+Tests:
+    JobQueue:
+        add_ignores_duplicates
+        claim_in_order
+        claim_nothing_left
+        expired_lease_claimed_again
+        renew_keeps_lease
+        abandoned_job_fails
+        finish
+        finish_by_other_worker
+        settings
+        shared_between_connections
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import jobqueue as jq
+
+class JobQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'jobs.db')
+        self.queue = jq.JobQueue(self.path, max_attempts=2)
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_add_ignores_duplicates(self):
+        self.assertEqual(self.queue.add(['a.pdf', 'b.pdf']), 2)
+        self.assertEqual(self.queue.add(['b.pdf', 'c.pdf']), 1)
+        self.assertEqual(self.queue.counts(), {'pending': 3, 'claimed': 0, 'done': 0, 'failed': 0})
+
+    def test_claim_in_order(self):
+        self.queue.add(['a.pdf', 'b.pdf', 'c.pdf'])
+        self.assertEqual([job.input for job in self.queue.claim('w1', 60, limit=2)], ['a.pdf', 'b.pdf'])
+        self.assertEqual([job.input for job in self.queue.claim('w2', 60, limit=2)], ['c.pdf'])
+        self.assertEqual(self.queue.unfinished(), 3)
+
+    def test_claim_nothing_left(self):
+        self.assertEqual(self.queue.claim('w1', 60), [])
+
+    def test_expired_lease_claimed_again(self):
+        self.queue.add(['a.pdf'])
+        job, = self.queue.claim('w1', -1)
+        self.assertEqual(self.queue.claim('w2', 60), [job])
+        # The first worker doesn't hold the job anymore
+        self.assertFalse(self.queue.finish('w1', job.id, 'a.txt'))
+        self.assertTrue(self.queue.finish('w2', job.id, 'a.txt'))
+
+    def test_renew_keeps_lease(self):
+        self.queue.add(['a.pdf'])
+        job, = self.queue.claim('w1', -1)
+        self.queue.renew('w1', [job.id], 60)
+        self.assertEqual(self.queue.claim('w2', 60), [])
+
+    def test_abandoned_job_fails(self):
+        """A job whose lease expired max_attempts times is marked as failed instead of being claimed again."""
+        self.queue.add(['a.pdf'])
+        self.queue.claim('w1', -1)
+        self.queue.claim('w2', -1)
+        self.assertEqual(self.queue.claim('w3', 60), [])
+        self.assertEqual(self.queue.counts()['failed'], 1)
+        self.assertEqual(self.queue.unfinished(), 0)
+
+    def test_finish(self):
+        self.queue.add(['a.pdf', 'b.pdf'])
+        job_a, job_b = self.queue.claim('w1', 60, limit=2)
+        self.assertTrue(self.queue.finish('w1', job_a.id, 'a.txt'))
+        self.assertTrue(self.queue.finish('w1', job_b.id, error='ExtractionError: corrupt'))
+        self.assertEqual(self.queue.counts(), {'pending': 0, 'claimed': 0, 'done': 1, 'failed': 1})
+        # Finished jobs are never claimed again
+        self.assertEqual(self.queue.claim('w1', 60), [])
+
+    def test_finish_by_other_worker(self):
+        self.queue.add(['a.pdf'])
+        job, = self.queue.claim('w1', 60)
+        self.assertFalse(self.queue.finish('w2', job.id, 'a.txt'))
+        self.assertEqual(self.queue.counts()['claimed'], 1)
+
+    def test_settings(self):
+        self.assertIsNone(self.queue.get_setting('output'))
+        self.queue.set_setting('output', '/out')
+        self.assertEqual(self.queue.get_setting('output'), '/out')
+        self.assertFalse(self.queue.is_filled())
+        self.queue.mark_filled()
+        self.assertTrue(self.queue.is_filled())
+
+    def test_shared_between_connections(self):
+        """Jobs claimed through one connection (e.g. another worker's) can't be claimed through another."""
+        self.queue.add(['a.pdf', 'b.pdf'])
+        with jq.JobQueue(self.path) as other:
+            self.assertEqual([job.input for job in other.claim('w2', 60)], ['a.pdf'])
+        self.assertEqual([job.input for job in self.queue.claim('w1', 60, limit=2)], ['b.pdf'])
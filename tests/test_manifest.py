@@ -0,0 +1,95 @@
+"""Tests for utils/manifest.py.
+Tests:
+    Manifest:
+        new_file_is_changed
+        recorded_file_is_unchanged
+        modified_file_is_changed
+        removed_output_is_changed
+        touched_file_with_hash_is_unchanged
+        touched_file_without_hash_is_changed
+        save_and_load
+        get_output
+        corrupted_manifest_is_ignored
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils.manifest import Manifest, MANIFEST_FILENAME
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.infile = os.path.join(self.tmpdir, 'foo.txt')
+        self.outfile = os.path.join(self.tmpdir, 'foo.out.txt')
+        self.write(self.infile, 'foo')
+        self.write(self.outfile, 'foo')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    @staticmethod
+    def write(filepath, text):
+        with open(filepath, 'w') as fout:
+            fout.write(text)
+
+    def touch(self, filepath):
+        """Move filepath's modification time one second forward."""
+        stat = os.stat(filepath)
+        os.utime(filepath, (stat.st_atime, stat.st_mtime + 1))
+
+    def test_new_file_is_changed(self):
+        manifest = Manifest(self.tmpdir)
+        self.assertFalse(manifest.is_unchanged(self.infile))
+
+    def test_recorded_file_is_unchanged(self):
+        manifest = Manifest(self.tmpdir)
+        manifest.record(self.infile, self.outfile)
+        self.assertTrue(manifest.is_unchanged(self.infile))
+
+    def test_modified_file_is_changed(self):
+        manifest = Manifest(self.tmpdir)
+        manifest.record(self.infile, self.outfile)
+        self.write(self.infile, 'foobar')
+        self.assertFalse(manifest.is_unchanged(self.infile))
+
+    def test_removed_output_is_changed(self):
+        manifest = Manifest(self.tmpdir)
+        manifest.record(self.infile, self.outfile)
+        os.remove(self.outfile)
+        self.assertFalse(manifest.is_unchanged(self.infile))
+
+    def test_touched_file_with_hash_is_unchanged(self):
+        manifest = Manifest(self.tmpdir, use_hash=True)
+        manifest.record(self.infile, self.outfile)
+        self.touch(self.infile)
+        self.assertTrue(manifest.is_unchanged(self.infile))
+
+    def test_touched_file_without_hash_is_changed(self):
+        manifest = Manifest(self.tmpdir)
+        manifest.record(self.infile, self.outfile)
+        self.touch(self.infile)
+        self.assertFalse(manifest.is_unchanged(self.infile))
+
+    def test_save_and_load(self):
+        manifest = Manifest(self.tmpdir)
+        manifest.record(self.infile, self.outfile)
+        manifest.save()
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, MANIFEST_FILENAME)))
+        self.assertTrue(Manifest(self.tmpdir).is_unchanged(self.infile))
+
+    def test_get_output(self):
+        manifest = Manifest(self.tmpdir)
+        self.assertIsNone(manifest.get_output(self.infile))
+        manifest.record(self.infile, self.outfile)
+        self.assertEqual(manifest.get_output(self.infile), os.path.abspath(self.outfile))
+
+    def test_corrupted_manifest_is_ignored(self):
+        self.write(os.path.join(self.tmpdir, MANIFEST_FILENAME), '{not json')
+        manifest = Manifest(self.tmpdir)
+        self.assertEqual(manifest.files, {})
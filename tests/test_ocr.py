@@ -0,0 +1,79 @@
+"""Tests for utils/ocr.py.
+Tests:
+    batchable:
+        images
+        not_batchable
+
+    ocr_batch:
+        separator_after_each_page
+        separator_between_pages
+        page_count_mismatch
+        tesseract_not_installed
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+from unittest import mock
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import ocr
+
+class OcrTest(unittest.TestCase):
+
+    def setUp(self):
+        self.indir = tempfile.mkdtemp()
+        self.images = [os.path.join(self.indir, name) for name in ['a.png', 'b.jpg', 'c.JPEG']]
+        self.listed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.indir, ignore_errors=True)
+
+    def tesseract(self, output):
+        """Return a stand-in for textract's ShellParser.run, recording the images listed to tesseract
+        and returning output as tesseract's.
+        """
+        def run(args):
+            self.assertEqual(args[0], 'tesseract')
+            self.assertEqual(args[2], 'stdout')
+            with open(args[1]) as fin:
+                self.listed.extend(fin.read().splitlines())
+            return output, b''
+        return run
+
+    def test_batchable_images(self):
+        self.assertTrue(all(ocr.batchable(image) for image in self.images))
+
+    def test_batchable_not_batchable(self):
+        # Multi-page and animated formats, other formats, and paths that can't be listed one per line
+        for infile in ['scan.tiff', 'anim.gif', 'doc.pdf', 'line\nbreak.png']:
+            self.assertFalse(ocr.batchable(infile))
+
+    def test_ocr_batch_separator_after_each_page(self):
+        """Each image gets the output tesseract would have written for it alone."""
+        with mock.patch('textract.parsers.utils.ShellParser.run',
+                        side_effect=self.tesseract(b'foo\n\x0c\x0cbar\n\x0c')):
+            self.assertEqual(ocr.ocr_batch(self.images[:3]), [b'foo\n\x0c', b'\x0c', b'bar\n\x0c'])
+        self.assertEqual(self.listed, self.images[:3])
+
+    def test_ocr_batch_separator_between_pages(self):
+        with mock.patch('textract.parsers.utils.ShellParser.run', side_effect=self.tesseract(b'foo\n\x0c\x0cbar\n')):
+            self.assertEqual(ocr.ocr_batch(self.images[:3]), [b'foo\n', b'', b'bar\n'])
+
+    def test_ocr_batch_page_count_mismatch(self):
+        with mock.patch('textract.parsers.utils.ShellParser.run', side_effect=self.tesseract(b'foo\n\x0c')):
+            self.assertRaises(ValueError, ocr.ocr_batch, self.images[:3])
+
+    def test_ocr_batch_tesseract_not_installed(self):
+        """The list file is removed whatever happens."""
+        from textract.exceptions import ShellError
+        listfiles = []
+        def run(args):
+            listfiles.append(args[1])
+            raise ShellError(' '.join(args), 127, b'', b'')
+        with mock.patch('textract.parsers.utils.ShellParser.run', side_effect=run):
+            self.assertRaises(ShellError, ocr.ocr_batch, self.images)
+        self.assertFalse(os.path.exists(listfiles[0]))
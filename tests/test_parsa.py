@@ -0,0 +1,335 @@
+"""Tests for parsa.py.
+Tests:
+    single_file:
+        pdf_pages_counted_once
+
+    progress:
+        folder_walked_once
+
+    incremental:
+        skips_unchanged_inputs
+        changed_input_overwrites_output
+        empty_text_removes_stale_output
+
+    dedup:
+        duplicate_linked_to_original
+        duplicate_copied_without_hard_links
+        duplicate_of_failed_original
+        same_content_different_extensions
+        changed_original_replaced_not_overwritten
+
+    worker:
+        extracts_queue
+        waits_until_queue_filled
+        renews_leases_while_extracting
+        job_claimed_by_other_worker
+        renews_leases_of_jobs_not_handed_out
+        finishes_jobs_as_they_are_extracted
+"""
+
+import unittest
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import shutil
+import time
+
+from unittest import mock
+
+sys.path.append(os.path.abspath('..'))
+from parsa import parsa as parsa_main
+from parsa.utils import cli
+from parsa.utils import filesystem as fs
+from parsa.utils import jobqueue as jq
+from parsa.utils import pdf
+from parsa.utils import workers
+from tests.test_pdf import make_pdf
+
+class ParsaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.indir = tempfile.mkdtemp()
+        self.outdir = tempfile.mkdtemp()
+        self.jobdb = os.path.join(self.outdir, 'jobs.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.indir, ignore_errors=True)
+        shutil.rmtree(self.outdir, ignore_errors=True)
+
+    def create_file(self, filename, content, mtime=None):
+        """Create (or overwrite) a file named filename inside the temporary input directory, with its
+        modification time set to mtime if it's not None, and return its path.
+        """
+        filepath = os.path.join(self.indir, filename)
+        with open(filepath, 'wb') as fout:
+            fout.write(content)
+        if mtime is not None:
+            os.utime(filepath, (mtime, mtime))
+        return filepath
+
+    def run_parsa(self, *args):
+        """Run parsa on the temporary input directory, writing to the temporary output directory."""
+        with mock.patch.object(sys, 'argv', ['parsa', self.indir, '-o', self.outdir, '-n'] + list(args)):
+            parsa_main.main()
+
+    def run_worker(self, *args):
+        """Run a parsa worker on the temporary job queue."""
+        with mock.patch.object(sys, 'argv', ['parsa', 'worker', self.jobdb, '-j', '1'] + list(args)):
+            parsa_main.main()
+
+    def read_jsonl(self, filename):
+        """Return the records of the JSON lines file filename inside the temporary output directory."""
+        with open(os.path.join(self.outdir, filename)) as fin:
+            return [json.loads(line) for line in fin]
+
+    def read_output(self, outfile):
+        with open(outfile, 'rb') as fin:
+            return fin.read()
+
+    def test_single_file_pdf_pages_counted_once(self):
+        """Whether a single PDF is split across workers is decided without counting its pages twice."""
+        infile = self.create_file('foo.pdf', make_pdf(['page ' + str(i) for i in range(1, 12)]))
+        argv = ['parsa', infile, '-o', self.outdir, '-n', '-j', '2', '--pdf-pages-per-job', '5']
+        with mock.patch.object(sys, 'argv', argv), mock.patch('parsa.utils.pdf.MIN_SPLIT_SIZE', 0), \
+                mock.patch('parsa.utils.pdf.count_pages', wraps=pdf.count_pages) as mock_count_pages:
+            parsa_main.main()
+
+        self.assertEqual(mock_count_pages.call_count, 1)
+        self.assertIn(b'page 11', self.read_output(os.path.join(self.outdir, 'foo.txt')))
+
+    def test_progress_folder_walked_once(self):
+        """The totals shown by the progress display are counted by the discovery walk, not by a second one."""
+        for filename in ['a.txt', 'b.txt', 'c.txt']:
+            self.create_file(filename, b'foo')
+        stream = io.StringIO()
+        with mock.patch.object(sys, 'stderr', stream), \
+                mock.patch('parsa.utils.filesystem.iter_files', wraps=fs.iter_files) as mock_iter_files:
+            self.run_parsa('--progress', '-j', '1')
+
+        self.assertEqual(mock_iter_files.call_count, 1)
+        snapshot = json.loads(stream.getvalue().splitlines()[-1])
+        self.assertEqual(snapshot['files_done'], 3)
+        self.assertEqual(snapshot['files_total'], 3)
+        self.assertTrue(snapshot['discovery_done'])
+
+    def test_incremental_skips_unchanged_inputs(self):
+        for filename in ['a.txt', 'b.txt']:
+            self.create_file(filename, b'foo', mtime=1000000000)
+        self.run_parsa('--incremental', '-j', '1')
+        self.create_file('b.txt', b'bar', mtime=1000000010)
+        with mock.patch('parsa.utils.text.get_text_encoded', return_value=b'bar') as mock_get_text:
+            self.run_parsa('--incremental', '-j', '1')
+
+        self.assertEqual([call[0][0] for call in mock_get_text.call_args_list], [os.path.join(self.indir, 'b.txt')])
+        self.assertEqual(self.read_output(os.path.join(self.outdir, 'a.txt')), b'foo')
+
+    def test_incremental_changed_input_overwrites_output(self):
+        """The output recorded for a changed input is overwritten, rather than a new output name allocated."""
+        self.create_file('a.txt', b'foo', mtime=1000000000)
+        self.run_parsa('--incremental', '-j', '1')
+        self.create_file('a.txt', b'bar', mtime=1000000010)
+        self.run_parsa('--incremental', '-j', '1')
+
+        self.assertEqual(sorted(os.listdir(self.outdir)), ['a.txt', 'parsamanifest.json'])
+        self.assertEqual(self.read_output(os.path.join(self.outdir, 'a.txt')), b'bar')
+
+    def test_incremental_empty_text_removes_stale_output(self):
+        self.create_file('a.txt', b'foo', mtime=1000000000)
+        self.run_parsa('--incremental', '-j', '1')
+        self.create_file('a.txt', b'', mtime=1000000010)
+        self.run_parsa('--incremental', '-j', '1')
+
+        self.assertEqual(os.listdir(self.outdir), ['parsamanifest.json'])
+        # The input is recorded as processed, so it's skipped until it changes again
+        with mock.patch('parsa.utils.text.get_text_encoded') as mock_get_text:
+            self.run_parsa('--incremental', '-j', '1')
+        self.assertFalse(mock_get_text.called)
+
+    def test_dedup_duplicate_linked_to_original(self):
+        filelist = [self.create_file(filename, b'foo') for filename in ['a.txt', 'b.txt']]
+        self.create_file('c.txt', b'bar')
+        self.run_parsa('--dedup', '-j', '1')
+
+        record, = self.read_jsonl(parsa_main.DUPLICATES_FILENAME)
+        self.assertEqual(sorted([record['input'], record['original']]), filelist)
+        self.assertEqual(record['link'], 'hardlink')
+        original_outfile = os.path.join(self.outdir, os.path.basename(record['original']))
+        self.assertEqual(record['output'], os.path.join(self.outdir, os.path.basename(record['input'])))
+        self.assertTrue(os.path.samefile(record['output'], original_outfile))
+        self.assertEqual(self.read_output(record['output']), b'foo')
+        self.assertEqual(self.read_output(os.path.join(self.outdir, 'c.txt')), b'bar')
+
+    def test_dedup_duplicate_copied_without_hard_links(self):
+        for filename in ['a.txt', 'b.txt']:
+            self.create_file(filename, b'foo')
+        with mock.patch('os.link', side_effect=OSError('hard links are not supported')):
+            self.run_parsa('--dedup', '-j', '1')
+
+        record, = self.read_jsonl(parsa_main.DUPLICATES_FILENAME)
+        self.assertIn(record['link'], ['reflink', 'copy'])
+        original_outfile = os.path.join(self.outdir, os.path.basename(record['original']))
+        self.assertFalse(os.path.samefile(record['output'], original_outfile))
+        self.assertEqual(self.read_output(record['output']), b'foo')
+
+    def test_dedup_duplicate_of_failed_original(self):
+        """Duplicates of an input whose extraction failed are recorded as failures, without an output."""
+        for filename in ['a.docx', 'b.docx']:
+            self.create_file(filename, b'not really a docx')
+        # Failed extractions are reported by worker processes
+        self.run_parsa('--dedup', '-j', '2')
+
+        original, duplicate = self.read_jsonl(parsa_main.FAILURES_FILENAME)
+        self.assertEqual(sorted([original['input'], duplicate['input']]),
+                         [os.path.join(self.indir, filename) for filename in ['a.docx', 'b.docx']])
+        self.assertEqual(duplicate['error'],
+                         'duplicate of {}, whose extraction failed: {}'.format(original['input'], original['error']))
+        self.assertEqual(sorted(os.listdir(self.outdir)), [parsa_main.FAILURES_FILENAME])
+
+    def test_dedup_same_content_different_extensions(self):
+        """Files with the same content but different extensions are extracted by different extractors."""
+        for filename in ['data.csv', 'data.txt']:
+            self.create_file(filename, b'a,b\nc,d\n')
+        self.run_parsa('--dedup', '-j', '1')
+        with_dedup = dict((filename, self.read_output(os.path.join(self.outdir, filename)))
+                          for filename in os.listdir(self.outdir))
+        shutil.rmtree(self.outdir)
+        self.run_parsa('-j', '1')
+        without_dedup = dict((filename, self.read_output(os.path.join(self.outdir, filename)))
+                             for filename in os.listdir(self.outdir))
+
+        self.assertEqual(with_dedup, without_dedup)
+        self.assertNotEqual(len(set(with_dedup.values())), 1)
+
+    def test_dedup_changed_original_replaced_not_overwritten(self):
+        """The previous output of a changed input is replaced, so the output of its unchanged duplicate
+        (a hard link to it) keeps its text.
+        """
+        for filename in ['a.txt', 'b.txt']:
+            self.create_file(filename, b'foo', mtime=1000000000)
+        self.run_parsa('--dedup', '--incremental', '-j', '1')
+        record, = self.read_jsonl(parsa_main.DUPLICATES_FILENAME)
+
+        self.create_file(os.path.basename(record['original']), b'bar', mtime=1000000010)
+        self.run_parsa('--dedup', '--incremental', '-j', '1')
+
+        original_outfile = os.path.join(self.outdir, os.path.basename(record['original']))
+        self.assertEqual(self.read_output(original_outfile), b'bar')
+        self.assertEqual(self.read_output(record['output']), b'foo')
+        self.assertEqual(sorted(os.listdir(self.outdir)),
+                         sorted(['a.txt', 'b.txt', parsa_main.DUPLICATES_FILENAME, 'parsamanifest.json']))
+
+    def test_worker_extracts_queue(self):
+        for filename in ['a.txt', 'b.txt']:
+            self.create_file(filename, filename.encode('ascii'))
+        self.run_parsa('--queue', self.jobdb)
+        # The worker exits once every job is done
+        self.run_worker()
+
+        with jq.JobQueue(self.jobdb) as queue:
+            self.assertEqual(queue.counts(), {'pending': 0, 'claimed': 0, 'done': 2, 'failed': 0})
+        for filename in ['a.txt', 'b.txt']:
+            self.assertEqual(self.read_output(os.path.join(self.outdir, filename)), filename.encode('ascii'))
+
+    def test_worker_waits_until_queue_filled(self):
+        """A worker that drained a queue still being filled waits for more jobs instead of exiting."""
+        with jq.JobQueue(self.jobdb) as queue:
+            queue.set_setting('output', self.outdir)
+            queue.set_setting('filled', '0')
+            queue.add([self.create_file('a.txt', b'foo')])
+        polls = []
+        def poll(seconds):
+            # The producer adds the last file and marks the queue as filled while the worker waits
+            polls.append(seconds)
+            with jq.JobQueue(self.jobdb) as queue:
+                queue.add([self.create_file('b.txt', b'bar')])
+                queue.mark_filled()
+        with mock.patch('time.sleep', side_effect=poll):
+            self.run_worker('--lease', '10')
+
+        self.assertEqual(polls, [5])
+        self.assertEqual(self.read_output(os.path.join(self.outdir, 'b.txt')), b'bar')
+
+    def test_worker_renews_leases_while_extracting(self):
+        """Jobs that take longer to extract than their lease can't be claimed by other workers."""
+        self.create_file('a.txt', b'foo')
+        self.run_parsa('--queue', self.jobdb)
+        claims = []
+        def get_text(infile, *args, **kwargs):
+            time.sleep(1)
+            with jq.JobQueue(self.jobdb) as queue:
+                claims.extend(queue.claim('other', 10))
+            return b'foo'
+        with mock.patch('parsa.utils.text.get_text_encoded', side_effect=get_text):
+            self.run_worker('--lease', '0.3')
+
+        self.assertEqual(claims, [])
+        with jq.JobQueue(self.jobdb) as queue:
+            self.assertEqual(queue.counts()['done'], 1)
+
+    def test_worker_job_claimed_by_other_worker(self):
+        """Jobs whose lease expired and were claimed by another worker are left to it, without an output."""
+        self.create_file('a.txt', b'foo')
+        self.run_parsa('--queue', self.jobdb)
+        def get_text(infile, *args, **kwargs):
+            with jq.JobQueue(self.jobdb) as queue:
+                queue._conn.execute('UPDATE jobs SET lease_expires = 0')
+                queue.claim('other', 10)
+            return b'foo'
+
+        args = cli.parse_worker_arguments([self.jobdb, '-j', '1'])
+        with jq.JobQueue(self.jobdb) as queue:
+            with mock.patch('parsa.utils.text.get_text_encoded', side_effect=get_text):
+                extracted = parsa_main._extract_jobs(queue, 'worker', args, self.outdir,
+                                                     fs.OutputNameIndex(self.outdir))
+            self.assertEqual(extracted, 0)
+            self.assertEqual(queue.counts()['claimed'], 1)
+        self.assertEqual(sorted(os.listdir(self.outdir)), ['jobs.db'])
+
+    def test_worker_renews_leases_of_jobs_not_handed_out(self):
+        """Jobs claimed in a batch are kept from other workers before they're handed to an extraction process."""
+        for filename in ['a.txt', 'b.txt']:
+            self.create_file(filename, b'foo')
+        self.run_parsa('--queue', self.jobdb)
+        claims = []
+        def extract_files(files, *args, **kwargs):
+            first = next(files)
+            time.sleep(1)
+            with jq.JobQueue(self.jobdb) as queue:
+                claims.extend(queue.claim('other', 10))
+            yield workers.ExtractionResult(first, b'foo', None)
+            for infile in files:
+                yield workers.ExtractionResult(infile, b'foo', None)
+
+        args = cli.parse_worker_arguments([self.jobdb, '-j', '2', '--lease', '0.3'])
+        with jq.JobQueue(self.jobdb) as queue:
+            with mock.patch('parsa.utils.workers.extract_files', side_effect=extract_files):
+                extracted = parsa_main._extract_jobs(queue, 'worker', args, self.outdir,
+                                                     fs.OutputNameIndex(self.outdir))
+            self.assertEqual(claims, [])
+            self.assertEqual(extracted, 2)
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork', 'requires forked workers')
+    def test_worker_finishes_jobs_as_they_are_extracted(self):
+        """A slow job doesn't hold back the jobs claimed after it."""
+        with jq.JobQueue(self.jobdb) as queue:
+            queue.set_setting('output', self.outdir)
+            queue.add([self.create_file(filename, b'foo') for filename in ['slow.txt', 'fast.txt']])
+            queue.mark_filled()
+        def get_text(infile, *args, **kwargs):
+            if os.path.basename(infile) == 'slow.txt':
+                time.sleep(1)
+            return b'foo'
+        finished = []
+        finish = jq.JobQueue.finish
+        def record_finish(queue, worker, job_id, *args, **kwargs):
+            finished.append(job_id)
+            return finish(queue, worker, job_id, *args, **kwargs)
+        with mock.patch('parsa.utils.text.get_text_encoded', side_effect=get_text), \
+                mock.patch.object(jq.JobQueue, 'finish', autospec=True, side_effect=record_finish):
+            self.run_worker('-j', '2')
+
+        # Jobs are numbered in the order they were added, and claimed in that order
+        self.assertEqual(finished, [2, 1])
@@ -0,0 +1,153 @@
+"""Tests for utils/pdf.py.
+Tests:
+    splittable:
+        pdf
+        not_pdf_or_too_small
+
+    page_ranges:
+        split
+        not_pdf
+        too_small
+        too_few_pages
+        malformed
+
+    count_pages:
+        pages
+        broken_xref_not_scanned
+        implausible_count
+
+    extract_pages:
+        pdftotext_range_options
+        pdf2txt_range_options
+
+    extract_pages and join_pages:
+        same_text_as_whole_pdf
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+from unittest import mock
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import pdf
+
+def make_pdf(pages):
+    """Return the content of a PDF with one page per string of pages (ASCII only)."""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in pages:
+        stream = b'BT /F1 10 Tf 36 806 Td (' + text.encode('ascii') + b') Tj ET'
+        objects.append(b'<< /Length ' + str(len(stream)).encode('ascii') + b' >>\nstream\n' + stream + b'\nendstream')
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents ' +
+                       str(len(objects)).encode('ascii') + b' 0 R /Resources << /Font << /F1 3 0 R >> >> >>')
+        kids.append(str(len(objects)).encode('ascii') + b' 0 R')
+    objects[1] = (b'<< /Type /Pages /Kids [' + b' '.join(kids) + b'] /Count ' + str(len(pages)).encode('ascii') +
+                  b' >>')
+    content = b'%PDF-1.4\n'
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(content))
+        content += str(number).encode('ascii') + b' 0 obj\n' + obj + b'\nendobj\n'
+    xref = len(content)
+    content += b'xref\n0 ' + str(len(objects) + 1).encode('ascii') + b'\n0000000000 65535 f \n'
+    for offset in offsets:
+        content += '{:010d} 00000 n \n'.format(offset).encode('ascii')
+    content += b'trailer\n<< /Size ' + str(len(objects) + 1).encode('ascii') + b' /Root 1 0 R >>\n'
+    content += b'startxref\n' + str(xref).encode('ascii') + b'\n%%EOF\n'
+    return content
+
+class PdfTest(unittest.TestCase):
+
+    def setUp(self):
+        self.indir = tempfile.mkdtemp()
+        self.infile = self.create_file('foo.pdf', make_pdf(['page ' + str(i) for i in range(1, 24)]))
+
+    def tearDown(self):
+        shutil.rmtree(self.indir, ignore_errors=True)
+
+    def create_file(self, filename, content):
+        """Create a file named filename inside the temporary directory, and return its path."""
+        filepath = os.path.join(self.indir, filename)
+        with open(filepath, 'wb') as fout:
+            fout.write(content)
+        return filepath
+
+    def test_splittable_pdf(self):
+        self.assertTrue(pdf.splittable(self.infile, min_size=0))
+
+    def test_splittable_not_pdf_or_too_small(self):
+        infile = self.create_file('foo.txt', make_pdf(['page'] * 30))
+        self.assertFalse(pdf.splittable(infile, min_size=0))
+        self.assertFalse(pdf.splittable(self.infile))
+        self.assertFalse(pdf.splittable(os.path.join(self.indir, 'missing.pdf'), min_size=0))
+
+    def test_page_ranges_split(self):
+        self.assertEqual(pdf.page_ranges(self.infile, 10, min_size=0), [(1, 10), (11, 20), (21, 23)])
+
+    def test_page_ranges_not_pdf(self):
+        infile = self.create_file('foo.txt', make_pdf(['page'] * 30))
+        self.assertIsNone(pdf.page_ranges(infile, 10, min_size=0))
+
+    def test_page_ranges_too_small(self):
+        self.assertIsNone(pdf.page_ranges(self.infile, 10))
+
+    def test_page_ranges_too_few_pages(self):
+        """PDFs are only split into two ranges or more."""
+        self.assertIsNone(pdf.page_ranges(self.infile, 12, min_size=0))
+
+    def test_page_ranges_malformed(self):
+        infile = self.create_file('bar.pdf', b'%PDF-1.4\nnot really a PDF')
+        self.assertIsNone(pdf.page_ranges(infile, 10, min_size=0))
+
+    def test_count_pages_pages(self):
+        self.assertEqual(pdf.count_pages(self.infile), 23)
+
+    def test_count_pages_broken_xref_not_scanned(self):
+        """PDFs whose cross-reference table is broken aren't scanned for their objects."""
+        content = make_pdf(['page ' + str(i) for i in range(1, 24)])
+        infile = self.create_file('broken.pdf', content[:content.rindex(b'startxref')] + b'startxref\n0\n%%EOF\n')
+        with mock.patch('pdfminer.pdfdocument.PDFXRefFallback.load') as mock_fallback:
+            self.assertRaises(Exception, pdf.count_pages, infile)
+        self.assertFalse(mock_fallback.called)
+        self.assertIsNone(pdf.page_ranges(infile, 10, min_size=0))
+
+    def test_count_pages_implausible_count(self):
+        # Replaced with as many bytes, so that the cross-reference table still points at every object
+        content = make_pdf(['page ' + str(i) for i in range(1, 24)]).replace(b' /Count 23 >>\nendobj',
+                                                                             b'/Count 99999>>endobj')
+        infile = self.create_file('bogus.pdf', content)
+        self.assertRaises(ValueError, pdf.count_pages, infile)
+
+    def test_extract_pages_and_join_pages_same_text_as_whole_pdf(self):
+        import textract
+        parts = [pdf.extract_pages(self.infile, first, last)
+                 for first, last in pdf.page_ranges(self.infile, 5, min_size=0)]
+        self.assertEqual(pdf.join_pages(parts), textract.process(self.infile))
+
+    def test_extract_pages_pdftotext_range_options(self):
+        """The range is added to the command textract's parser builds, which is otherwise kept as it is."""
+        from textract.parsers.pdf_parser import Parser
+        commands = []
+        def run(parser, args):
+            commands.append(args)
+            return b'page 3\x0c', b''
+        with mock.patch('textract.parsers.utils.ShellParser.run', autospec=True, side_effect=run):
+            Parser().extract(self.infile)
+            pdf.extract_pages(self.infile, 3, 5)
+        whole, pages = commands
+        self.assertEqual(pages, whole[:1] + ['-f', '3', '-l', '5'] + whole[1:])
+
+    def test_extract_pages_pdf2txt_range_options(self):
+        """Older textract releases fall back to pdfminer's command-line tool."""
+        commands = []
+        def run(parser, args):
+            commands.append(args)
+            return b'page 3\x0c', b''
+        with mock.patch('textract.parsers.utils.ShellParser.run', autospec=True, side_effect=run):
+            pdf._page_range_parser(3, 5).run(['pdf2txt.py', self.infile])
+        self.assertEqual(commands, [['pdf2txt.py', '-p', '3,4,5', '-m', '5', self.infile]])
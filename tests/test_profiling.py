@@ -0,0 +1,152 @@
+"""Tests for utils/profiling.py.
+Tests:
+    phase:
+        records_only_inside_phase
+        nested_phase_pauses_enclosing
+        disabled_is_noop
+
+    iterate:
+        attributes_producer_only
+
+    start/stop:
+        writes_profile_per_phase
+        merges_worker_profiles
+        removes_previous_profiles
+        worker_pool_profiles_merged
+
+    summarize:
+        lists_phases_and_hotspots
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import pstats
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import profiling
+from parsa.utils import workers
+
+def producer_function():
+    return sum(range(100))
+
+def consumer_function():
+    return sum(range(100))
+
+def called_functions(path):
+    """Return the names of the functions recorded in the profile at path."""
+    return set(function for _, _, function in pstats.Stats(path).stats)
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.profiledir = os.path.join(self.tmpdir, 'profile')
+
+    def tearDown(self):
+        # Never leave profiling enabled for the next tests
+        if profiling.active_profiledir() is not None:
+            profiling.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def profile_path(self, phase):
+        return os.path.join(self.profiledir, phase + profiling.PROFILE_SUFFIX)
+
+    def test_phase_records_only_inside_phase(self):
+        profiling.start(self.profiledir)
+        with profiling.phase('output'):
+            producer_function()
+        consumer_function()
+        profiling.stop()
+        self.assertIn('producer_function', called_functions(self.profile_path('output')))
+        self.assertNotIn('consumer_function', called_functions(self.profile_path('output')))
+        self.assertIn('consumer_function', called_functions(self.profile_path('other')))
+
+    def test_phase_nested_phase_pauses_enclosing(self):
+        profiling.start(self.profiledir)
+        with profiling.phase('extraction'):
+            with profiling.phase('post-processing'):
+                producer_function()
+            consumer_function()
+        profiling.stop()
+        self.assertNotIn('producer_function', called_functions(self.profile_path('extraction')))
+        self.assertIn('producer_function', called_functions(self.profile_path('post-processing')))
+        self.assertIn('consumer_function', called_functions(self.profile_path('extraction')))
+
+    def test_phase_disabled_is_noop(self):
+        with profiling.phase('extraction'):
+            value = producer_function()
+        self.assertEqual(value, 4950)
+        self.assertIsNone(profiling.active_profiledir())
+
+    def test_iterate_attributes_producer_only(self):
+        def produce():
+            for _ in range(3):
+                producer_function()
+                yield None
+
+        profiling.start(self.profiledir)
+        for _ in profiling.iterate(produce(), 'discovery'):
+            consumer_function()
+        profiling.stop()
+        self.assertIn('producer_function', called_functions(self.profile_path('discovery')))
+        self.assertNotIn('consumer_function', called_functions(self.profile_path('discovery')))
+
+    def test_start_stop_writes_profile_per_phase(self):
+        profiling.start(self.profiledir)
+        with profiling.phase('output'):
+            producer_function()
+        profiledir = profiling.stop()
+        self.assertEqual(profiledir, self.profiledir)
+        self.assertEqual(sorted(os.listdir(self.profiledir)), ['other.prof', 'output.prof'])
+
+    def test_start_stop_merges_worker_profiles(self):
+        profiling.start(self.profiledir)
+        # Profiles written by a worker process, as stop_worker would
+        worker_profiler = profiling.PhaseProfiler(self.profiledir)
+        with worker_profiler.phase('extraction'):
+            consumer_function()
+        worker_profiler.dump('.12345')
+        with profiling.phase('extraction'):
+            producer_function()
+        profiling.stop()
+        functions = called_functions(self.profile_path('extraction'))
+        self.assertIn('producer_function', functions)
+        self.assertIn('consumer_function', functions)
+        # Per-process profiles are removed once merged
+        self.assertNotIn('extraction.12345.prof', os.listdir(self.profiledir))
+
+    def test_start_stop_removes_previous_profiles(self):
+        os.makedirs(self.profiledir)
+        unrelated_file = os.path.join(self.profiledir, 'notes.prof')
+        for filename in ['output.prof', 'output.999.prof', 'notes.prof']:
+            open(os.path.join(self.profiledir, filename), 'w').close()
+        profiling.start(self.profiledir)
+        profiling.stop()
+        self.assertNotIn('output.prof', os.listdir(self.profiledir))
+        # Files that aren't phase profiles are left alone
+        self.assertTrue(os.path.exists(unrelated_file))
+
+    def test_start_stop_worker_pool_profiles_merged(self):
+        filelist = []
+        for i in range(4):
+            filelist.append(os.path.join(self.tmpdir, 'foo' + str(i) + '.txt'))
+            with open(filelist[-1], 'w') as fout:
+                fout.write('foo')
+        profiling.start(self.profiledir)
+        with profiling.phase('extraction'):
+            list(workers.extract_files(filelist, jobs=2))
+        profiling.stop()
+        # _extract only runs inside the workers
+        self.assertIn('_extract', called_functions(self.profile_path('extraction')))
+
+    def test_summarize_lists_phases_and_hotspots(self):
+        profiling.start(self.profiledir)
+        with profiling.phase('output'):
+            producer_function()
+        summary = profiling.summarize(profiling.stop(), top=3)
+        self.assertIn('output', summary)
+        self.assertIn('tottime', summary)
+        self.assertEqual(profiling.summarize(self.tmpdir), 'No profile was recorded')
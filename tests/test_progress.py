@@ -0,0 +1,145 @@
+"""Tests for utils/progress.py.
+Tests:
+    Progress:
+        counts_files_and_bytes
+        files_in_flight
+        skipped_files_are_done
+        discovered_totals
+        no_eta_before_discovery
+        eta_by_type
+        eta_accounts_for_parallelism
+        report_json_when_not_a_terminal
+        report_line_on_terminal
+        report_line_during_discovery
+        reports_periodically
+
+    format_duration:
+        hours_minutes_seconds
+"""
+
+import unittest
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import progress as prog
+
+class TerminalStream(io.StringIO):
+    """StringIO pretending to be a terminal."""
+    def isatty(self):
+        return True
+
+class ProgressTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = io.StringIO()
+
+    def test_counts_files_and_bytes(self):
+        progress = prog.Progress(self.stream)
+        progress.started('foo.txt')
+        progress.finished('foo.txt', 100, 0.1)
+        progress.started('bar.pdf')
+        progress.finished('bar.pdf', 50, 0.2, failed=True)
+        snapshot = progress.snapshot()
+        self.assertEqual(snapshot['files_done'], 2)
+        self.assertEqual(snapshot['files_failed'], 1)
+        self.assertEqual(snapshot['bytes_done'], 150)
+
+    def test_files_in_flight(self):
+        progress = prog.Progress(self.stream)
+        for filename in ['foo.txt', 'bar.txt', 'baz.txt']:
+            progress.started(filename)
+        progress.finished('foo.txt', 100, 0.1)
+        self.assertEqual(progress.snapshot()['files_in_flight'], 2)
+
+    def test_skipped_files_are_done(self):
+        progress = prog.Progress(self.stream)
+        progress.skipped('foo.txt', 100)
+        snapshot = progress.snapshot()
+        self.assertEqual(snapshot['files_done'], 1)
+        self.assertEqual(snapshot['files_in_flight'], 0)
+
+    def test_discovered_totals(self):
+        progress = prog.Progress(self.stream)
+        progress.discovered('foo.txt', 100)
+        progress.discovered('bar.PDF', 50)
+        self.assertFalse(progress.snapshot()['discovery_done'])
+        progress.discovery_finished()
+        snapshot = progress.snapshot()
+        self.assertEqual(snapshot['files_total'], 2)
+        self.assertEqual(snapshot['bytes_total'], 150)
+        self.assertTrue(snapshot['discovery_done'])
+        self.assertEqual(progress.total_bytes_by_type, {'.txt': 100, '.pdf': 50})
+
+    def test_no_eta_before_discovery(self):
+        progress = prog.Progress(self.stream)
+        progress.finished('foo.txt', 100, 0.1)
+        self.assertIsNone(progress.snapshot()['eta'])
+
+    def test_eta_by_type(self):
+        """Bytes left of each type are estimated with the time per byte of that type."""
+        progress = prog.Progress(self.stream)
+        progress.total_bytes_by_type = {'.txt': 2000, '.pdf': 2000}
+        progress.total_files = 4
+        progress.finished('foo.txt', 1000, 1)
+        progress.finished('foo.pdf', 1000, 10)
+        # Single worker: 11 seconds spent over 11 seconds
+        progress.started_at = prog.tr.clock() - 11
+        # 1000 .txt bytes left at 1 ms/byte, and 1000 .pdf bytes left at 10 ms/byte
+        self.assertAlmostEqual(progress.snapshot()['eta'], 11, places=0)
+
+    def test_eta_accounts_for_parallelism(self):
+        progress = prog.Progress(self.stream)
+        progress.total_bytes_by_type = {'.txt': 2000}
+        progress.total_files = 2
+        progress.finished('foo.txt', 1000, 4)
+        # 4 seconds of extraction done in 1 second: 4 files at once
+        progress.started_at = prog.tr.clock() - 1
+        self.assertAlmostEqual(progress.snapshot()['eta'], 1, places=0)
+
+    def test_report_json_when_not_a_terminal(self):
+        progress = prog.Progress(self.stream)
+        progress.finished('foo.txt', 100, 0.1)
+        progress.report()
+        snapshot = json.loads(self.stream.getvalue())
+        self.assertEqual(snapshot['files_done'], 1)
+
+    def test_report_line_on_terminal(self):
+        stream = TerminalStream()
+        progress = prog.Progress(stream)
+        progress.finished('foo.txt', 100, 0.1)
+        progress.report()
+        self.assertTrue(stream.getvalue().startswith('\r1 files'))
+        self.assertIn('ETA ?', stream.getvalue())
+
+    def test_report_line_during_discovery(self):
+        stream = TerminalStream()
+        progress = prog.Progress(stream)
+        progress.discovered('foo.txt', 1000)
+        progress.discovered('bar.txt', 1000)
+        progress.finished('foo.txt', 1000, 1)
+        progress.started_at = prog.tr.clock() - 1
+        progress.report()
+        # Totals and ETA are lower bounds until the walk is over
+        self.assertTrue(stream.getvalue().startswith('\r1/2+ files'))
+        self.assertIn('ETA >0:00:01', stream.getvalue())
+        progress.discovery_finished()
+        progress.report()
+        self.assertIn('\r1/2 files', stream.getvalue())
+        self.assertIn('ETA 0:00:01', stream.getvalue())
+
+    def test_reports_periodically(self):
+        progress = prog.Progress(self.stream, interval=0.01)
+        progress.start()
+        time.sleep(0.2)
+        progress.stop()
+        self.assertGreater(len(self.stream.getvalue().splitlines()), 2)
+
+class FormatDurationTest(unittest.TestCase):
+
+    def test_format_duration_hours_minutes_seconds(self):
+        self.assertEqual(prog.format_duration(0), '0:00:00')
+        self.assertEqual(prog.format_duration(3725.4), '1:02:05')
@@ -0,0 +1,63 @@
+"""Tests for utils/sharding.py.
+Tests:
+    Shard:
+        invalid_index
+        shards_are_disjoint_and_complete
+        uses_assignment
+
+    shard_of:
+        stable
+
+    balanced_assignment:
+        balances_bytes
+        independent_of_order
+"""
+
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils.sharding import Shard, shard_of, balanced_assignment
+
+class ShardingTest(unittest.TestCase):
+
+    relpaths = ['docs/file' + str(i) + '.pdf' for i in range(200)]
+
+    def test_shard_invalid_index(self):
+        self.assertRaises(ValueError, Shard, 0, 4)
+        self.assertRaises(ValueError, Shard, 5, 4)
+
+    def test_shard_shards_are_disjoint_and_complete(self):
+        shards = [Shard(index, 4) for index in range(1, 5)]
+        for relpath in self.relpaths:
+            self.assertEqual(sum(shard.contains(relpath) for shard in shards), 1)
+        # Every shard gets a share of the files
+        for shard in shards:
+            self.assertGreater(len([relpath for relpath in self.relpaths if shard.contains(relpath)]), 20)
+
+    def test_shard_uses_assignment(self):
+        shard = Shard(2, 2, {'foo.pdf': 2, 'bar.pdf': 1})
+        self.assertTrue(shard.contains('foo.pdf'))
+        self.assertFalse(shard.contains('bar.pdf'))
+        # Files missing from the assignment (e.g. created after it was made) belong to no shard
+        self.assertFalse(shard.contains('baz.pdf'))
+
+    def test_shard_of_stable(self):
+        """The shard of a path is the same in every process, platform and Python version."""
+        # Pinned to the first 64 bits of the path's SHA-1 digest, which never change
+        self.assertEqual(shard_of('foo.pdf', 8), int('190cf443ae906134', 16) % 8 + 1)
+        self.assertEqual(shard_of('foo.pdf', 1), 1)
+
+    def test_balanced_assignment_balances_bytes(self):
+        files = [('big.pdf', 100), ('medium1.pdf', 50), ('medium2.pdf', 50)] + \
+                [('small' + str(i) + '.txt', 1) for i in range(10)]
+        assignment = balanced_assignment(files, 2)
+        shard_bytes = {1: 0, 2: 0}
+        for relpath, size in files:
+            shard_bytes[assignment[relpath]] += size
+        self.assertEqual(shard_bytes, {1: 105, 2: 105})
+
+    def test_balanced_assignment_independent_of_order(self):
+        files = [(relpath, len(relpath) % 7) for relpath in self.relpaths]
+        self.assertEqual(balanced_assignment(files, 3), balanced_assignment(list(reversed(files)), 3))
@@ -6,27 +6,63 @@ Tests:
         
         empty_file
         extension_not_supported
+        extension_not_supported_raise_errors
         no_extension
+        no_extension_detected_type
+        plaintext_skips_textract
+        malformed_json_falls_back_to_textract
+        trace_plaintext
+        trace_textract
+
+    write_text:
+        same_as_get_text
+        empty_file
+
+    get_text_encoded:
+        same_as_get_text
+        textract
+
+    preload_parsers:
+        imports_parsers
+
+    needs_textract:
+        formats
+
+    _get_plaintext:
+        same_as_textract
+        strips_byte_order_mark
+        not_plaintext
+        large_file
 
     _process_text:
         utf8
         pdf
+
+    _strip_chunks:
+        same_as_strip
+
+    _process_encoded:
+        pdf
+        invalid_utf8
+
+    _strip_encoded:
+        same_as_strip
 """
 
 import unittest
 import os
 import sys
+import io
 import tempfile
+import shutil
+import textract
 
-if sys.version_info[0] < 3:
-    import StringIO as io
-    import mock
-else:
-    from unittest import mock
-    import io
+from unittest import mock
 
 sys.path.append(os.path.abspath('..'))
+from parsa.utils import filesystem as fs
 from parsa.utils import text as txt
+from parsa.utils import trace as tr
 
 class TextTest(unittest.TestCase):
     def test_get_text_empty_file(self):
@@ -49,6 +85,11 @@ class TextTest(unittest.TestCase):
         out_message = out_stringIO.getvalue()
 
         self.assertIn('Extension not supported', out_message)
+
+    def test_get_text_extension_not_supported_raise_errors(self):
+        import textract
+        infile = tempfile.NamedTemporaryFile(suffix='.abc')
+        self.assertRaises(textract.exceptions.ExtensionNotSupported, txt.get_text, infile.name, raise_errors=True)
     
     def test_get_text_no_extension(self):
         expected_text = 'test'
@@ -59,18 +100,139 @@ class TextTest(unittest.TestCase):
             encoded_text = expected_text.encode('utf-8')
             f_in.write(encoded_text)
 
-        # Python 2.x
-        if sys.version_info[0] < 3:
-            builtin_input = '__builtin__.raw_input'
-        # Python 3.x
-        else:
-            builtin_input = 'builtins.input'
-
         # Call get_text, mocking the input for _infile_extension as txt when the function prompts for it
-        with mock.patch(builtin_input, return_value='txt'):
+        with mock.patch('builtins.input', return_value='txt'):
             extracted_text = txt.get_text(infile.name)
         self.assertEqual(extracted_text, expected_text)
     
+    def test_get_text_no_extension_detected_type(self):
+        """The type of a file without an extension is detected from its content, without prompting the user."""
+        infile = tempfile.NamedTemporaryFile()
+        with open(infile.name, 'wb') as f_in:
+            f_in.write(b'%PDF-1.4\n')
+        with mock.patch('textract.process', return_value=b'test\x0c') as mock_process:
+            text = txt.get_text(infile.name)
+        mock_process.assert_called_once_with(infile.name, extension='.pdf')
+        # The text is processed as a .pdf (stripping the trailing form feed)
+        self.assertEqual(text, 'test')
+
+    def test_get_text_plaintext_skips_textract(self):
+        infile = tempfile.NamedTemporaryFile(suffix='.txt')
+        with open(infile.name, 'wb') as f_in:
+            f_in.write('test'.encode('utf-8'))
+        with mock.patch('textract.process') as mock_process:
+            text = txt.get_text(infile.name)
+        self.assertFalse(mock_process.called)
+        self.assertEqual(text, 'test')
+
+    def test_get_text_malformed_json_falls_back_to_textract(self):
+        infile = tempfile.NamedTemporaryFile(suffix='.json')
+        with open(infile.name, 'wb') as f_in:
+            f_in.write('{not json'.encode('utf-8'))
+        with mock.patch('textract.process', return_value='test'.encode('utf-8')) as mock_process:
+            text = txt.get_text(infile.name)
+        self.assertTrue(mock_process.called)
+        self.assertEqual(text, 'test')
+
+    def test_get_text_trace_plaintext(self):
+        infile = tempfile.NamedTemporaryFile(suffix='.TXT')
+        record = tr.new_record(infile.name)
+        txt.get_text(infile.name, trace=record)
+        self.assertEqual(record['type'], '.txt')
+        self.assertEqual(record['extractor'], 'plaintext')
+        self.assertEqual(sorted(record['timings']), ['decode', 'extract'])
+
+    def test_get_text_trace_textract(self):
+        """Files without an extension also record the time spent detecting their type."""
+        infile = tempfile.NamedTemporaryFile()
+        with open(infile.name, 'wb') as f_in:
+            f_in.write(b'%PDF-1.4\n')
+        record = tr.new_record(infile.name)
+        with mock.patch('textract.process', return_value=b'test'):
+            txt.get_text(infile.name, trace=record)
+        self.assertEqual(record['type'], '.pdf')
+        self.assertEqual(record['extractor'], 'textract')
+        self.assertEqual(sorted(record['timings']), ['decode', 'extract', 'sniff'])
+
+    def test_write_text_same_as_get_text(self):
+        """Text streamed in chunks is the same as the text returned whole, even if chunks split characters."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            infile = os.path.join(tmpdir, 'foo.txt')
+            with open(infile, 'wb') as f_in:
+                f_in.write(u'  résumé\r\nnaïve  '.encode('utf-8') * 10)
+            outfile = os.path.join(tmpdir, 'foo_txt.txt')
+            with mock.patch.object(txt, 'STREAM_CHUNK_SIZE', 3):
+                self.assertTrue(txt.write_text(infile, outfile))
+            # The output is the same as the one written from the whole text
+            expected_outfile = os.path.join(tmpdir, 'expected.txt')
+            fs.write_str_to_file(txt.get_text(infile), expected_outfile)
+            with open(outfile, 'rb') as f_out, open(expected_outfile, 'rb') as f_expected:
+                self.assertEqual(f_out.read(), f_expected.read())
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def test_write_text_empty_file(self):
+        infile = tempfile.NamedTemporaryFile(suffix='.txt')
+        outfile = tempfile.NamedTemporaryFile(suffix='.txt')
+        self.assertFalse(txt.write_text(infile.name, outfile.name))
+        self.assertEqual(os.path.getsize(outfile.name), 0)
+
+    def test_get_text_encoded_same_as_get_text(self):
+        infile = tempfile.NamedTemporaryFile(suffix='.csv')
+        with open(infile.name, 'wb') as f_in:
+            f_in.write(u'caf\xe9,b\r\n1,2\n'.encode('latin-1'))
+        self.assertEqual(bytes(txt.get_text_encoded(infile.name)), txt.get_text(infile.name).encode('utf-8'))
+
+    def test_get_text_encoded_textract(self):
+        """textract's output is returned without being decoded."""
+        infile = tempfile.NamedTemporaryFile(suffix='.pdf')
+        with mock.patch('textract.process', return_value=u'\x0c caf\xe9 \n\x0c'.encode('utf-8')):
+            text = txt.get_text_encoded(infile.name)
+        self.assertIsInstance(text, memoryview)
+        self.assertEqual(bytes(text), u'caf\xe9'.encode('utf-8'))
+
+    def test_preload_parsers_imports_parsers(self):
+        txt.preload_parsers()
+        self.assertIn('textract.parsers.txt_parser', sys.modules)
+
+    def test_needs_textract_formats(self):
+        self.assertFalse(any(txt.needs_textract(infile) for infile in ['foo.txt', 'foo.CSV', 'foo.json']))
+        self.assertTrue(all(txt.needs_textract(infile) for infile in ['foo.pdf', 'foo.docx', 'foo']))
+
+    def test__get_plaintext_same_as_textract(self):
+        """The fast path produces the same text as textract for each plain-text format."""
+        contents = {
+            '.txt': u'résumé\r\nfoo\n',
+            '.csv': u'a,b\r\n"c\nd",e\n',
+            '.tsv': u'a\tb\nc\td\n',
+            '.json': u'{"b": [1, "x", {"c": "y"}], "a": "z"}',
+        }
+        for extension, content in contents.items():
+            infile = tempfile.NamedTemporaryFile(suffix=extension)
+            with open(infile.name, 'wb') as f_in:
+                f_in.write(content.encode('utf-8'))
+            expected_text = txt._process_text(textract.process(infile.name), extension)
+            self.assertEqual(txt._get_plaintext(infile.name, extension), expected_text)
+
+    def test__get_plaintext_strips_byte_order_mark(self):
+        infile = tempfile.NamedTemporaryFile(suffix='.txt')
+        with open(infile.name, 'wb') as f_in:
+            f_in.write(u'\ufefftest'.encode('utf-8'))
+        self.assertEqual(txt._get_plaintext(infile.name, 'txt'), 'test')
+
+    def test__get_plaintext_not_plaintext(self):
+        self.assertRaises(NotImplementedError, txt._get_plaintext, 'foo.pdf', '.pdf')
+
+    def test__get_plaintext_large_file(self):
+        """Files above the memory-mapping threshold are extracted the same way."""
+        expected_text = u'résumé\n' * 100
+        infile = tempfile.NamedTemporaryFile(suffix='.md')
+        with open(infile.name, 'wb') as f_in:
+            f_in.write(expected_text.encode('utf-8'))
+        with mock.patch.object(txt, '_MMAP_THRESHOLD', 1):
+            self.assertEqual(txt._get_plaintext(infile.name, '.md'), expected_text)
+
     def test__process_text_utf8(self):
         """Test that utf-8 encoded text is successfully decoded."""
         expected_text = 'test'
@@ -87,4 +249,28 @@ class TextTest(unittest.TestCase):
         decoded_text1 = txt._process_text(encoded_text, 'pdf')
         decoded_text2 = txt._process_text(encoded_text, '.pdf')
         self.assertEqual(decoded_text1, expected_text)
-        self.assertEqual(decoded_text2, expected_text)
\ No newline at end of file
+        self.assertEqual(decoded_text2, expected_text)
+
+    def test__strip_chunks_same_as_strip(self):
+        """Whitespace is stripped across chunk boundaries, but kept inside the text."""
+        chunks = [u'  ', u' \nfoo ', u'', u' bar\n', u'  ', u'\t']
+        self.assertEqual(u''.join(txt._strip_chunks(chunks)), u''.join(chunks).strip())
+        self.assertEqual(u''.join(txt._strip_chunks([u'  ', u'\n'])), u'')
+
+    def test__process_encoded_pdf(self):
+        extracted_text = b'test          \x0c'
+        self.assertEqual(bytes(txt._process_encoded(extracted_text, 'pdf')), b'test')
+        self.assertEqual(bytes(txt._process_encoded(extracted_text, '.docx')), extracted_text)
+
+    def test__process_encoded_invalid_utf8(self):
+        """Invalid UTF-8 is rejected as _process_text rejects it, even if it spans chunks."""
+        extracted_text = u'caf\xe9'.encode('utf-8')[:-1] + b'!'
+        self.assertRaises(UnicodeDecodeError, txt._process_text, extracted_text, '.pdf')
+        with mock.patch.object(txt, 'STREAM_CHUNK_SIZE', 4):
+            self.assertRaises(UnicodeDecodeError, txt._process_encoded, extracted_text, '.pdf')
+
+    def test__strip_encoded_same_as_strip(self):
+        """Multi-byte whitespace (e.g. no-break and ideographic spaces) is stripped as well."""
+        for text in [u'', u' \t\n', u'\x0c caf\xe9 \xa0', u'\u3000\xe9\u3000', u'\xe9\xe9']:
+            stripped = txt._strip_encoded(memoryview(text.encode('utf-8')))
+            self.assertEqual(bytes(stripped).decode('utf-8'), text.strip())
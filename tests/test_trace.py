@@ -0,0 +1,85 @@
+"""Tests for utils/trace.py.
+Tests:
+    TraceLog:
+        one_line_per_record
+        appends_to_existing_log
+        rounds_timings
+
+    new_record:
+        fields
+
+    timed:
+        records_phase
+        accumulates
+        no_record
+"""
+
+import unittest
+import json
+import os
+import sys
+import tempfile
+import shutil
+import time
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import trace as tr
+
+class TraceLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'trace.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def read_records(self):
+        with open(self.path, 'r') as fin:
+            return [json.loads(line) for line in fin]
+
+    def test_one_line_per_record(self):
+        with tr.TraceLog(self.path) as tracelog:
+            tracelog.write(tr.new_record('foo.txt', 3))
+            tracelog.write(tr.new_record('bar.txt', 5))
+        records = self.read_records()
+        self.assertEqual([record['input'] for record in records], ['foo.txt', 'bar.txt'])
+        self.assertEqual([record['size'] for record in records], [3, 5])
+
+    def test_appends_to_existing_log(self):
+        for filename in ['foo.txt', 'bar.txt']:
+            with tr.TraceLog(self.path) as tracelog:
+                tracelog.write(tr.new_record(filename))
+        self.assertEqual(len(self.read_records()), 2)
+
+    def test_rounds_timings(self):
+        record = tr.new_record('foo.txt')
+        record['timings']['extract'] = 0.123456789
+        with tr.TraceLog(self.path) as tracelog:
+            tracelog.write(record)
+        self.assertEqual(self.read_records()[0]['timings'], {'extract': 0.123457})
+        # The record itself is left untouched
+        self.assertEqual(record['timings']['extract'], 0.123456789)
+
+class TraceRecordTest(unittest.TestCase):
+
+    def test_new_record_fields(self):
+        self.assertEqual(tr.new_record('foo.txt', 3), {'input': 'foo.txt', 'size': 3, 'timings': {}})
+
+    def test_timed_records_phase(self):
+        record = tr.new_record('foo.txt')
+        with tr.timed(record, 'extract'):
+            time.sleep(0.01)
+        self.assertGreaterEqual(record['timings']['extract'], 0.01)
+
+    def test_timed_accumulates(self):
+        record = tr.new_record('foo.txt')
+        record['timings']['extract'] = 1
+        with tr.timed(record, 'extract'):
+            pass
+        self.assertGreaterEqual(record['timings']['extract'], 1)
+
+    def test_timed_no_record(self):
+        with tr.timed(None, 'extract'):
+            value = 'foo'
+        self.assertEqual(value, 'foo')
@@ -0,0 +1,113 @@
+"""Tests for utils/watch.py.
+Tests:
+    Watcher:
+        new_file
+        modified_file
+        debounces_writes
+        new_subfolder
+        filter
+        pruned_folder_not_watched
+        timeout
+
+    Watcher, polling (every test above, without inotify):
+        polling
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import time
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils.filters import FileFilter
+from parsa.utils.watch import Watcher
+
+class WatcherTest(unittest.TestCase):
+
+    use_inotify = True
+
+    def setUp(self):
+        self.indir = tempfile.mkdtemp()
+        self.watchers = []
+
+    def tearDown(self):
+        for watcher in self.watchers:
+            watcher.close()
+        shutil.rmtree(self.indir, ignore_errors=True)
+
+    def watch(self, file_filter=None):
+        watcher = Watcher(self.indir, file_filter, settle_time=0.2, poll_interval=0.1, use_inotify=self.use_inotify)
+        if self.use_inotify and watcher.polling:
+            self.skipTest('inotify is not available')
+        self.watchers.append(watcher)
+        return watcher
+
+    def create_file(self, relpath, text='foo'):
+        """Create (or overwrite) the file at relpath inside the temporary directory, and return its path."""
+        filepath = os.path.join(self.indir, *relpath.split('/'))
+        if not os.path.isdir(os.path.dirname(filepath)):
+            os.makedirs(os.path.dirname(filepath))
+        with open(filepath, 'w') as fout:
+            fout.write(text)
+        return filepath
+
+    def test_new_file(self):
+        watcher = self.watch()
+        infile = self.create_file('foo.txt')
+        self.assertEqual(watcher.wait(timeout=5), [infile])
+
+    def test_modified_file(self):
+        infile = self.create_file('foo.txt')
+        # Existing files are not reported until they change
+        time.sleep(0.3)
+        watcher = self.watch()
+        self.assertEqual(watcher.wait(timeout=0.5), [])
+        self.create_file('foo.txt', 'bar')
+        self.assertEqual(watcher.wait(timeout=5), [infile])
+
+    def test_debounces_writes(self):
+        """A file written several times in a row is reported once, after the last write."""
+        watcher = self.watch()
+        for i in range(5):
+            infile = self.create_file('foo.txt', 'foo' * i)
+            time.sleep(0.05)
+        start = time.time()
+        self.assertEqual(watcher.wait(timeout=5), [infile])
+        self.assertGreaterEqual(time.time() - start, 0.1)
+        self.assertEqual(watcher.wait(timeout=0.5), [])
+
+    def test_new_subfolder(self):
+        """Files created in a new folder are reported, including those written before it was watched."""
+        watcher = self.watch()
+        infile = self.create_file('docs/2024/foo.txt')
+        self.assertEqual(watcher.wait(timeout=5), [infile])
+        other = self.create_file('docs/2024/bar.txt')
+        self.assertEqual(watcher.wait(timeout=5), [other])
+
+    def test_filter(self):
+        watcher = self.watch(FileFilter(self.indir, extensions=['pdf']))
+        self.create_file('foo.txt')
+        infile = self.create_file('foo.pdf')
+        self.assertEqual(watcher.wait(timeout=5), [infile])
+
+    def test_pruned_folder_not_watched(self):
+        os.makedirs(os.path.join(self.indir, 'parsaoutput'))
+        watcher = self.watch(FileFilter(self.indir, exclude=['parsaoutput']))
+        self.create_file('parsaoutput/foo.txt')
+        self.assertEqual(watcher.wait(timeout=0.5), [])
+
+    def test_timeout(self):
+        watcher = self.watch()
+        start = time.time()
+        self.assertEqual(watcher.wait(timeout=0.2), [])
+        self.assertLess(time.time() - start, 5)
+
+class PollingWatcherTest(WatcherTest):
+    """The same tests, scanning the folder instead of using inotify."""
+
+    use_inotify = False
+
+    def test_polling(self):
+        self.assertTrue(self.watch().polling)
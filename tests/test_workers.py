@@ -0,0 +1,471 @@
+"""Tests for utils/workers.py.
+Tests:
+    default_jobs:
+        positive
+
+    extract_files:
+        single_job
+        multiple_jobs_keeps_input_order
+        multiple_jobs_prompts_in_parent
+        multiple_jobs_noprompt
+        timeout
+        memory_limit
+        worker_exception
+        single_job_with_limits_uses_worker
+        max_tasks_per_worker
+        workers_are_reused
+        plaintext_files_skip_parser_preload
+        parsers_preloaded_for_textract_files
+        trace_single_job
+        trace_multiple_jobs
+        trace_timeout
+        stream_single_job
+        stream_multiple_jobs
+        stream_empty_text
+        stream_timeout_removes_textfile
+        encoded_single_job
+        encoded_multiple_jobs
+        unordered_yields_in_completion_order
+        split_pdf
+        split_pdf_failed_range_extracts_whole_file
+        split_pdf_cache
+        split_pdf_cache_hits_fill_reorder_buffer
+        split_audio
+        split_audio_cache
+        ocr_batches
+        ocr_batch_failure_ocrs_each_image
+        ocr_batch_cache
+        ocr_batch_cache_hits_fill_reorder_buffer
+
+    get_text_cached:
+        cache_hit
+        empty_text_not_cached
+        trace_cache_hit
+
+    write_text_cached:
+        cache_hit
+
+    _extract:
+        defer_no_ext
+        no_defer_detectable_type
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import time
+import multiprocessing
+
+from unittest import mock
+
+sys.path.append(os.path.abspath('..'))
+from parsa.utils import trace as tr
+from parsa.utils import workers
+from parsa.utils.cache import ExtractionCache
+
+class WorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.indir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.indir, ignore_errors=True)
+
+    def create_file(self, filename, text):
+        """Create a file named filename inside the temporary directory, and return its path."""
+        filepath = os.path.join(self.indir, filename)
+        with open(filepath, 'wb') as f_in:
+            f_in.write(text.encode('utf-8'))
+        return filepath
+
+    def test_default_jobs_positive(self):
+        self.assertGreaterEqual(workers.default_jobs(), 1)
+
+    def test_extract_files_single_job(self):
+        infile = self.create_file('foo.txt', 'foo')
+        results = list(workers.extract_files([infile], jobs=1))
+        self.assertEqual(results, [workers.ExtractionResult(infile, 'foo', None)])
+
+    def test_extract_files_multiple_jobs_keeps_input_order(self):
+        filelist = [self.create_file('foo' + str(i) + '.txt', 'text' + str(i)) for i in range(20)]
+        results = list(workers.extract_files(filelist, jobs=4))
+        expected_results = [workers.ExtractionResult(infile, 'text' + str(i), None) for i, infile in enumerate(filelist)]
+        self.assertEqual(results, expected_results)
+
+    def test_extract_files_multiple_jobs_prompts_in_parent(self):
+        """Files without an extension (and of an undetectable type) are extracted by the parent process,
+        where the prompt can be answered.
+        """
+        infile = os.path.join(self.indir, 'foo')
+        # Latin-1 text isn't valid UTF-8, so its type can't be detected
+        with open(infile, 'wb') as f_in:
+            f_in.write(u'caf\xe9 test'.encode('latin-1'))
+        with mock.patch('builtins.input', return_value='txt'):
+            results = list(workers.extract_files([infile], jobs=2))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].infile, infile)
+        self.assertIn('test', results[0].text)
+
+    def test_extract_files_multiple_jobs_noprompt(self):
+        """With the prompt disabled, files without an extension are extracted by the workers."""
+        infile = self.create_file('foo', 'test')
+        with mock.patch('parsa.utils.text.get_text', return_value='') as mock_get_text:
+            results = list(workers.extract_files([infile], jobs=2, disable_no_ext_prompt=True))
+        # The file has not been handed back to the parent process
+        self.assertFalse(mock_get_text.called)
+        self.assertEqual(len(results), 1)
+
+    # The following tests patch get_text before the workers are started, so the workers must be forked
+    requires_fork = unittest.skipUnless(multiprocessing.get_start_method() == 'fork', 'requires forked workers')
+
+    @staticmethod
+    def slow_get_text(infile, *args, **kwargs):
+        """Stand-in for txt.get_text that hangs on files named 'slow*' and fails on files named 'fail*'."""
+        filename = os.path.basename(infile)
+        if filename.startswith('slow'):
+            time.sleep(60)
+        if filename.startswith('fail'):
+            raise ValueError('malformed')
+        if filename.startswith('huge'):
+            return 'x' * (1024 ** 3)
+        return filename
+
+    @requires_fork
+    def test_extract_files_timeout(self):
+        filelist = [self.create_file(filename, '') for filename in ['foo.txt', 'slow.txt', 'bar.txt']]
+        start = time.time()
+        with mock.patch('parsa.utils.text.get_text', side_effect=self.slow_get_text):
+            results = list(workers.extract_files(filelist, jobs=2, timeout=1))
+        self.assertLess(time.time() - start, 30)
+        self.assertEqual([result.text for result in results], ['foo.txt', '', 'bar.txt'])
+        self.assertEqual([result.error for result in results], [None, 'timed out after 1 seconds', None])
+
+    @requires_fork
+    def test_extract_files_memory_limit(self):
+        filelist = [self.create_file(filename, '') for filename in ['huge.txt', 'foo.txt']]
+        with mock.patch('parsa.utils.text.get_text', side_effect=self.slow_get_text):
+            results = list(workers.extract_files(filelist, jobs=1, memory_limit=512 * 1024 ** 2))
+        self.assertEqual(results[0].error, 'memory limit exceeded')
+        # The worker has been replaced, and the next file is extracted
+        self.assertEqual(results[1], workers.ExtractionResult(filelist[1], 'foo.txt', None))
+
+    @requires_fork
+    def test_extract_files_worker_exception(self):
+        filelist = [self.create_file(filename, '') for filename in ['fail.txt', 'foo.txt']]
+        with mock.patch('parsa.utils.text.get_text', side_effect=self.slow_get_text):
+            results = list(workers.extract_files(filelist, jobs=2))
+        self.assertEqual(results[0].error, 'ValueError: malformed')
+        self.assertEqual(results[1], workers.ExtractionResult(filelist[1], 'foo.txt', None))
+
+    @requires_fork
+    def test_extract_files_single_job_with_limits_uses_worker(self):
+        infile = self.create_file('foo.txt', 'foo')
+        get_pid = lambda *args, **kwargs: str(os.getpid())
+        with mock.patch('parsa.utils.text.get_text', side_effect=get_pid):
+            results = list(workers.extract_files([infile], jobs=1, timeout=60))
+        # The file has been extracted by a worker process, not by this one
+        self.assertNotEqual(results[0].text, str(os.getpid()))
+
+    @requires_fork
+    def test_extract_files_max_tasks_per_worker(self):
+        """Each worker is replaced after extracting max_tasks_per_worker files."""
+        filelist = [self.create_file('foo' + str(i) + '.txt', '') for i in range(4)]
+        get_pid = lambda *args, **kwargs: str(os.getpid())
+        with mock.patch('parsa.utils.text.get_text', side_effect=get_pid):
+            results = list(workers.extract_files(filelist, jobs=1, timeout=60, max_tasks_per_worker=2))
+        pids = [result.text for result in results]
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pids[2], pids[3])
+        self.assertNotEqual(pids[1], pids[2])
+
+    @requires_fork
+    def test_extract_files_workers_are_reused(self):
+        filelist = [self.create_file('foo' + str(i) + '.txt', '') for i in range(10)]
+        get_pid = lambda *args, **kwargs: str(os.getpid())
+        with mock.patch('parsa.utils.text.get_text', side_effect=get_pid):
+            results = list(workers.extract_files(filelist, jobs=2))
+        self.assertLessEqual(len(set(result.text for result in results)), 2)
+
+    @requires_fork
+    def test_extract_files_plaintext_files_skip_parser_preload(self):
+        filelist = [self.create_file('foo' + str(i) + '.txt', 'foo') for i in range(3)]
+        with mock.patch('parsa.utils.text.preload_parsers') as mock_preload:
+            results = list(workers.extract_files(filelist, jobs=2))
+        self.assertEqual([result.text for result in results], ['foo'] * 3)
+        self.assertFalse(mock_preload.called)
+
+    @requires_fork
+    def test_extract_files_parsers_preloaded_for_textract_files(self):
+        """Parsers are imported once a file needs them, even if it's not the first one."""
+        filelist = [self.create_file('foo.txt', 'foo'), self.create_file('bar.docx', '')]
+        with mock.patch('parsa.utils.text.preload_parsers') as mock_preload, \
+             mock.patch('parsa.utils.text.get_text', return_value='bar'):
+            list(workers.extract_files(filelist, jobs=2))
+        self.assertTrue(mock_preload.called)
+
+    def test_extract_files_trace_single_job(self):
+        infile = self.create_file('foo.txt', 'foo')
+        result = next(workers.extract_files([infile], jobs=1, trace=True))
+        self.assertEqual(result.trace['input'], infile)
+        self.assertEqual(result.trace['type'], '.txt')
+        self.assertEqual(result.trace['extractor'], 'plaintext')
+        self.assertIn('extract', result.trace['timings'])
+
+    def test_extract_files_trace_multiple_jobs(self):
+        """Trace records are filled in by the workers and sent back with the results."""
+        filelist = [self.create_file('foo' + str(i) + '.txt', 'text' + str(i)) for i in range(4)]
+        results = list(workers.extract_files(filelist, jobs=2, trace=True))
+        self.assertEqual([result.trace['input'] for result in results], filelist)
+        self.assertTrue(all(result.trace['extractor'] == 'plaintext' for result in results))
+
+    @requires_fork
+    def test_extract_files_trace_timeout(self):
+        """Files whose worker is killed still get a trace record."""
+        infile = self.create_file('slow.txt', '')
+        with mock.patch('parsa.utils.text.get_text', side_effect=self.slow_get_text):
+            result = next(workers.extract_files([infile], jobs=1, timeout=1, trace=True))
+        self.assertEqual(result.trace['input'], infile)
+        self.assertGreaterEqual(result.trace['timings']['extract'], 1)
+
+    def read_file(self, filepath):
+        with open(filepath, 'rb') as fin:
+            return fin.read().decode('utf-8')
+
+    def test_extract_files_stream_single_job(self):
+        infile = self.create_file('foo.txt', 'foo')
+        result = next(workers.extract_files([infile], jobs=1, stream_dir=self.indir))
+        self.assertEqual(result.text, '')
+        self.assertEqual(os.path.dirname(result.textfile), self.indir)
+        self.assertEqual(self.read_file(result.textfile), 'foo')
+
+    def test_extract_files_stream_multiple_jobs(self):
+        filelist = [self.create_file('foo' + str(i) + '.txt', 'text' + str(i)) for i in range(8)]
+        results = list(workers.extract_files(filelist, jobs=2, stream_dir=self.indir))
+        self.assertEqual([result.infile for result in results], filelist)
+        self.assertEqual([self.read_file(result.textfile) for result in results],
+                         ['text' + str(i) for i in range(8)])
+        # Each file's text has a temporary file of its own
+        self.assertEqual(len(set(result.textfile for result in results)), 8)
+
+    def test_extract_files_stream_empty_text(self):
+        """Files without text don't leave an empty temporary file behind."""
+        infile = self.create_file('foo.txt', '')
+        result = next(workers.extract_files([infile], jobs=2, stream_dir=self.indir))
+        self.assertIsNone(result.textfile)
+        self.assertEqual(os.listdir(self.indir), ['foo.txt'])
+
+    @requires_fork
+    def test_extract_files_stream_timeout_removes_textfile(self):
+        infile = self.create_file('slow.txt', '')
+        def slow_write_text(infile, outfile, *args, **kwargs):
+            with open(outfile, 'w') as fout:
+                fout.write('partial')
+            time.sleep(60)
+        with mock.patch('parsa.utils.text.write_text', side_effect=slow_write_text):
+            result = next(workers.extract_files([infile], jobs=1, timeout=1, stream_dir=self.indir))
+        self.assertEqual(result.error, 'timed out after 1 seconds')
+        self.assertIsNone(result.textfile)
+        self.assertEqual(os.listdir(self.indir), ['slow.txt'])
+
+    def test_extract_files_encoded_single_job(self):
+        infile = self.create_file('foo.txt', u'caf\xe9')
+        result = next(workers.extract_files([infile], jobs=1, encoded=True))
+        self.assertEqual(bytes(result.text), u'caf\xe9'.encode('utf-8'))
+
+    def test_extract_files_encoded_multiple_jobs(self):
+        filelist = [self.create_file('foo' + str(i) + '.txt', 'text' + str(i)) for i in range(4)]
+        results = list(workers.extract_files(filelist, jobs=2, encoded=True))
+        self.assertEqual([bytes(result.text) for result in results],
+                         [('text' + str(i)).encode('utf-8') for i in range(4)])
+
+    @requires_fork
+    def test_extract_files_unordered_yields_in_completion_order(self):
+        filelist = [self.create_file(filename, '') for filename in ['slow.txt', 'foo.txt']]
+        with mock.patch('parsa.utils.text.get_text', side_effect=self.slow_get_text):
+            results = list(workers.extract_files(filelist, jobs=2, timeout=1, ordered=False))
+        # foo.txt isn't held back by slow.txt, which times out after it's done
+        self.assertEqual([result.infile for result in results], [filelist[1], filelist[0]])
+        self.assertEqual(results[1].error, 'timed out after 1 seconds')
+
+    def pages_text(self, infile, first, last):
+        """Stand-in for pdf.extract_pages, returning the text of pages first to last as pdftotext would."""
+        if first == 99:
+            raise ValueError('malformed')
+        return u''.join(u'page {}\n\x0c'.format(page) for page in range(first, last + 1))
+
+    @requires_fork
+    def test_extract_files_split_pdf(self):
+        infile = self.create_file('foo.pdf', '')
+        with mock.patch('parsa.utils.pdf.page_ranges', return_value=[(1, 2), (3, 4), (5, 5)]), \
+             mock.patch('parsa.utils.pdf.extract_pages', side_effect=self.pages_text):
+            results = list(workers.extract_files([infile], jobs=3, pdf_pages_per_job=2, trace=True))
+        self.assertEqual(results[0].text, u'\x0c'.join(u'page {}\n'.format(page) for page in range(1, 6)).strip())
+        self.assertEqual(results[0].trace['pages'], 5)
+
+    @requires_fork
+    def test_extract_files_split_pdf_failed_range_extracts_whole_file(self):
+        filelist = [self.create_file('foo.pdf', ''), self.create_file('bar.txt', 'bar')]
+        with mock.patch('parsa.utils.pdf.page_ranges', side_effect=[[(1, 2), (99, 100)], None]), \
+             mock.patch('parsa.utils.pdf.extract_pages', side_effect=self.pages_text), \
+             mock.patch('parsa.utils.text.get_text', return_value='whole'):
+            results = list(workers.extract_files(filelist, jobs=2, pdf_pages_per_job=2))
+        self.assertEqual([result.text for result in results], ['whole', 'whole'])
+        self.assertEqual([result.error for result in results], [None, None])
+
+    @requires_fork
+    def test_extract_files_split_pdf_cache(self):
+        cache = ExtractionCache(os.path.join(self.indir, 'cache'))
+        infile = self.create_file('foo.pdf', 'not really a PDF')
+        with mock.patch('parsa.utils.pdf.page_ranges', return_value=[(1, 2), (3, 3)]), \
+             mock.patch('parsa.utils.pdf.extract_pages', side_effect=self.pages_text):
+            first = next(workers.extract_files([infile], jobs=2, cache=cache, pdf_pages_per_job=2))
+            second = next(workers.extract_files([infile], jobs=2, cache=cache, pdf_pages_per_job=2, trace=True,
+                                                stream_dir=self.indir))
+        self.assertEqual(second.trace['extractor'], 'cache')
+        with open(second.textfile) as fin:
+            self.assertEqual(fin.read(), first.text)
+
+    @requires_fork
+    def test_extract_files_split_pdf_cache_hits_fill_reorder_buffer(self):
+        """More cache hits than the reorder buffer holds, with every worker idle, don't end the run early."""
+        cache = ExtractionCache(os.path.join(self.indir, 'cache'))
+        filelist = [self.create_file('foo' + str(i) + '.pdf', 'pdf ' + str(i)) for i in range(5)]
+        page_ranges = lambda infile, pages_per_range: [(1, 2), (3, 3)] if infile.endswith('.pdf') else None
+        with mock.patch('parsa.utils.pdf.page_ranges', side_effect=page_ranges), \
+             mock.patch('parsa.utils.pdf.extract_pages', side_effect=self.pages_text), \
+             mock.patch.object(workers, '_REORDER_BUFFER_PER_JOB', 2):
+            list(workers.extract_files(filelist, jobs=1, timeout=30, cache=cache, pdf_pages_per_job=2))
+            filelist.append(self.create_file('bar.txt', 'bar'))
+            results = list(workers.extract_files(filelist, jobs=1, timeout=30, cache=cache, pdf_pages_per_job=2))
+        self.assertEqual([result.infile for result in results], filelist)
+        self.assertEqual(results[-1].text, 'bar')
+
+    def segment_text(self, infile, start, end):
+        """Stand-in for audio.transcribe_segment, returning the words of seconds start to end (one per second)."""
+        return u' '.join(u'w{}'.format(second) for second in range(int(start), int(end))).encode('utf-8') + b'\n'
+
+    @requires_fork
+    def test_extract_files_split_audio(self):
+        """Segments are transcribed by several workers and joined in order, without the words of their overlaps."""
+        infile = self.create_file('foo.wav', '')
+        with mock.patch('parsa.utils.audio.segments', return_value=[(0, 4), (3, 8), (8, 10)]), \
+             mock.patch('parsa.utils.audio.transcribe_segment', side_effect=self.segment_text):
+            results = list(workers.extract_files([infile], jobs=3, audio_seconds_per_job=4, trace=True))
+        self.assertEqual(results[0].text, u' '.join(u'w{}'.format(second) for second in range(10)) + u'\n')
+        self.assertEqual(results[0].trace['duration'], 10)
+
+    @requires_fork
+    def test_extract_files_split_audio_cache(self):
+        cache = ExtractionCache(os.path.join(self.indir, 'cache'))
+        infile = self.create_file('foo.wav', 'not really audio')
+        with mock.patch('parsa.utils.audio.segments', return_value=[(0, 2), (2, 3)]), \
+             mock.patch('parsa.utils.audio.transcribe_segment', side_effect=self.segment_text):
+            first = next(workers.extract_files([infile], jobs=2, cache=cache, audio_seconds_per_job=2))
+            second = next(workers.extract_files([infile], jobs=2, cache=cache, audio_seconds_per_job=2, trace=True))
+        self.assertEqual(first.text, u'w0 w1 w2\n')
+        self.assertEqual(second.text, first.text)
+        self.assertEqual(second.trace['extractor'], 'cache')
+
+    def batch_text(self, images):
+        """Stand-in for ocr.ocr_batch, returning the name of each image as its text (failing for bad.png)."""
+        if any(os.path.basename(image) == 'bad.png' for image in images):
+            raise ValueError('tesseract returned 1 pages for 2 images')
+        return [os.path.basename(image).encode('utf-8') + b'\n\x0c' for image in images]
+
+    @requires_fork
+    def test_extract_files_ocr_batches(self):
+        filelist = [self.create_file(filename, 'text') for filename in ['a.png', 'b.txt', 'c.jpg', 'd.png', 'e.png']]
+        with mock.patch('parsa.utils.ocr.ocr_batch', side_effect=self.batch_text):
+            results = list(workers.extract_files(filelist, jobs=2, ocr_batch_size=2, trace=True, stream_dir=self.indir))
+        # Results keep their input order, and images are written to their own text files
+        self.assertEqual([result.infile for result in results], filelist)
+        texts = []
+        for result in results:
+            with open(result.textfile) as fin:
+                texts.append(fin.read())
+        self.assertEqual(texts, ['a.png\n\x0c', 'text', 'c.jpg\n\x0c', 'd.png\n\x0c', 'e.png\n\x0c'])
+        self.assertEqual([result.trace.get('batch') for result in results], [2, None, 2, 2, 2])
+
+    @requires_fork
+    def test_extract_files_ocr_batch_failure_ocrs_each_image(self):
+        filelist = [self.create_file(filename, '') for filename in ['a.png', 'bad.png', 'c.png']]
+        with mock.patch('parsa.utils.ocr.ocr_batch', side_effect=self.batch_text), \
+             mock.patch('parsa.utils.text.get_text', return_value='alone'):
+            results = list(workers.extract_files(filelist, jobs=2, ocr_batch_size=2))
+        self.assertEqual([result.text for result in results], ['alone', 'alone', 'c.png\n\x0c'])
+        self.assertEqual([result.error for result in results], [None, None, None])
+
+    @requires_fork
+    def test_extract_files_ocr_batch_cache(self):
+        cache = ExtractionCache(os.path.join(self.indir, 'cache'))
+        filelist = [self.create_file(filename, filename) for filename in ['a.png', 'b.png']]
+        with mock.patch('parsa.utils.ocr.ocr_batch', side_effect=self.batch_text):
+            first = list(workers.extract_files(filelist, jobs=2, cache=cache, ocr_batch_size=2))
+            second = list(workers.extract_files(filelist, jobs=2, cache=cache, ocr_batch_size=2, trace=True))
+        self.assertEqual([result.text for result in second], [result.text for result in first])
+        self.assertEqual([result.trace['extractor'] for result in second], ['cache', 'cache'])
+
+    @requires_fork
+    def test_extract_files_ocr_batch_cache_hits_fill_reorder_buffer(self):
+        """More cached images than the reorder buffer holds don't end the run early."""
+        cache = ExtractionCache(os.path.join(self.indir, 'cache'))
+        jobs = 1
+        filelist = [self.create_file('foo' + str(i) + '.png', str(i))
+                    for i in range(workers._REORDER_BUFFER_PER_JOB * jobs + 6)]
+        with mock.patch('parsa.utils.ocr.ocr_batch', side_effect=self.batch_text):
+            list(workers.extract_files(filelist, jobs, timeout=30, cache=cache, ocr_batch_size=4))
+            filelist.append(self.create_file('z.txt', 'z'))
+            results = list(workers.extract_files(filelist, jobs, timeout=30, cache=cache, ocr_batch_size=4))
+        self.assertEqual([result.infile for result in results], filelist)
+        self.assertEqual(results[-1].text, 'z')
+
+    def test_get_text_cached_cache_hit(self):
+        cache = ExtractionCache(os.path.join(self.indir, 'cache'))
+        infile = self.create_file('foo.txt', 'foo')
+        self.assertEqual(workers.get_text_cached(infile, cache=cache), 'foo')
+        # The second extraction of the same content is served by the cache
+        duplicate = self.create_file('bar.txt', 'foo')
+        with mock.patch('parsa.utils.text.get_text') as mock_get_text:
+            text = workers.get_text_cached(duplicate, cache=cache)
+        self.assertFalse(mock_get_text.called)
+        self.assertEqual(text, 'foo')
+
+    def test_get_text_cached_empty_text_not_cached(self):
+        cache = ExtractionCache(os.path.join(self.indir, 'cache'))
+        infile = self.create_file('foo.txt', '')
+        self.assertEqual(workers.get_text_cached(infile, cache=cache), '')
+        self.assertIsNone(cache.get(cache.key(infile)))
+
+    def test_get_text_cached_trace_cache_hit(self):
+        cache = ExtractionCache(os.path.join(self.indir, 'cache'))
+        infile = self.create_file('foo.txt', 'foo')
+        workers.get_text_cached(infile, cache=cache)
+        record = tr.new_record(infile)
+        workers.get_text_cached(infile, cache=cache, trace=record)
+        self.assertEqual(record['extractor'], 'cache')
+        self.assertEqual(record['type'], '.txt')
+        self.assertIn('cache', record['timings'])
+
+    def test_write_text_cached_cache_hit(self):
+        cache = ExtractionCache(os.path.join(self.indir, 'cache'))
+        infile = self.create_file('foo.txt', 'foo')
+        outfile = os.path.join(self.indir, 'foo_txt.txt')
+        self.assertTrue(workers.write_text_cached(infile, outfile, cache=cache))
+        # The text written to the first output has been cached
+        duplicate = self.create_file('bar.txt', 'foo')
+        duplicate_outfile = os.path.join(self.indir, 'bar_txt.txt')
+        with mock.patch('parsa.utils.text.write_text') as mock_write_text:
+            self.assertTrue(workers.write_text_cached(duplicate, duplicate_outfile, cache=cache))
+        self.assertFalse(mock_write_text.called)
+        self.assertEqual(self.read_file(duplicate_outfile), 'foo')
+
+    def test__extract_defer_no_ext(self):
+        infile = self.create_file('foo', '\x00test')
+        self.assertEqual(workers._extract(infile, defer_no_ext=True), (infile, None))
+
+    def test__extract_no_defer_detectable_type(self):
+        """Files without an extension whose type is detected from their content are extracted by the worker."""
+        infile = self.create_file('foo', 'test')
+        self.assertEqual(workers._extract(infile, defer_no_ext=True), (infile, 'test'))